@@ -0,0 +1,249 @@
+"""
+The compact wire protocol, shared by the engine and the runners.
+A message is sent as a length prefixed frame, "<length>:<payload>\\n". The payload is a JSON array starting with the
+integer tag of the message type. The state records are sent as arrays with a fixed field order instead of dicts, so the
+field names are never sent, and the fields of changed records are sent by their integer tags.
+Frames never hold a newline, so they pass through the line based pipes of the sandboxes, and since a JSON message
+starts with '{' a receiver can tell the two protocols apart by the first character.
+"""
+import json
+
+# the name of the protocol, offered by the engine in the setup data and accepted by the runner in its reply
+COMPACT_PROTOCOL = 'compact'
+
+# the message types, the index of a type is its tag
+MESSAGE_TYPES = ('setup', 'turn', 'delta', 'bot_orders')
+
+# the keys of a turn's state, in the order they are sent
+STATE_KEYS = ('game_scores', 'last_turn_points', 'num_of_scripts', 'treasures', 'bermuda_zones', 'powerups', 'scripts',
+              'anti_scripts', 'pirates', 'dead_pirates', 'players')
+
+# the type and fields of the records of each list in the state, the index of a field is its tag
+RECORD_SCHEMAS = {
+    'treasures': ('treasure', ('id', 'initial_location', 'value')),
+    'bermuda_zones': ('bermuda_zone', ('center', 'radius', 'owner', 'active_turns')),
+    'powerups': ('powerup', ('id', 'powerup_type', 'location', 'active_turns', 'end_turn', 'value')),
+    'scripts': ('script', ('id', 'location', 'end_turn')),
+    'anti_scripts': ('anti_script', ('id', 'location', 'end_turn')),
+    'pirates': ('pirate', ('id', 'location', 'owner', 'initial_location', 'turns_to_sober',
+                           'treasure_initial_location', 'treasure_id', 'treasure_value', 'reload_turns',
+                           'defense_reload_turns', 'defense_expiration_turns', 'carry_treasure_speed',
+                           'attack_radius', 'powerups')),
+    'dead_pirates': ('dead_pirate', ('id', 'location', 'owner', 'initial_location', 'turns_to_revive',
+                                     'attack_radius')),
+    'players': ('player', ('id',))}
+
+# the parts of a list's delta, see StateDelta.make_delta, in the order they are sent
+DELTA_PARTS = ('added', 'changed', 'removed', 'order', 'replaced')
+
+
+def encode_records(list_name, records):
+    """
+    Encodes the records of a list in the state as arrays in the schema's field order.
+
+    :param list_name: the name of the list
+    :type list_name: str
+    :param records: the records
+    :type records: list[dict[str, any]]
+    :return: the encoded records
+    :rtype: list[list]
+    """
+    fields = RECORD_SCHEMAS[list_name][1]
+    return [[record[field] for field in fields] for record in records]
+
+
+def decode_records(list_name, records):
+    """
+    Decodes the records of a list in the state back into dicts.
+
+    :param list_name: the name of the list
+    :type list_name: str
+    :param records: the encoded records
+    :type records: list[list]
+    :return: the records
+    :rtype: list[dict[str, any]]
+    """
+    record_type, fields = RECORD_SCHEMAS[list_name]
+    decoded = []
+    for values in records:
+        record = dict(zip(fields, values))
+        record['type'] = record_type
+        decoded.append(record)
+    return decoded
+
+
+def encode_value(key, value):
+    """
+    Encodes a value of the state, only the lists of records are changed.
+
+    :param key: the key of the value in the state
+    :type key: str
+    :param value: the value
+    :type value: any
+    :return: the encoded value
+    :rtype: any
+    """
+    if key not in RECORD_SCHEMAS:
+        return value
+    return encode_records(key, value)
+
+
+def decode_value(key, value):
+    """
+    Decodes a value of the state encoded by encode_value.
+
+    :param key: the key of the value in the state
+    :type key: str
+    :param value: the encoded value
+    :type value: any
+    :return: the value
+    :rtype: any
+    """
+    if key not in RECORD_SCHEMAS:
+        return value
+    return decode_records(key, value)
+
+
+def encode_list_delta(list_name, list_delta):
+    """
+    Encodes the delta of a list in the state as an array of its parts, with None for a missing part.
+    The changed fields are sent as a flat array of field tags and values.
+
+    :param list_name: the name of the list
+    :type list_name: str
+    :param list_delta: the delta of the list
+    :type list_delta: dict[str, any]
+    :return: the encoded delta
+    :rtype: list
+    """
+    fields = RECORD_SCHEMAS[list_name][1]
+    encoded = []
+    for part in DELTA_PARTS:
+        value = list_delta.get(part)
+        if value is not None:
+            if part in ('added', 'replaced'):
+                value = encode_records(list_name, value)
+            elif part == 'changed':
+                value = [[key, [item for field, field_value in changed_fields.iteritems()
+                                for item in (fields.index(field), field_value)]]
+                         for key, changed_fields in value]
+        encoded.append(value)
+    return encoded
+
+
+def decode_list_delta(list_name, encoded):
+    """
+    Decodes the delta of a list encoded by encode_list_delta.
+
+    :param list_name: the name of the list
+    :type list_name: str
+    :param encoded: the encoded delta
+    :type encoded: list
+    :return: the delta of the list
+    :rtype: dict[str, any]
+    """
+    fields = RECORD_SCHEMAS[list_name][1]
+    list_delta = {}
+    for part, value in zip(DELTA_PARTS, encoded):
+        if value is None:
+            continue
+        if part in ('added', 'replaced'):
+            value = decode_records(list_name, value)
+        elif part == 'changed':
+            value = [[key, dict((fields[tag], field_value) for tag, field_value in zip(items[::2], items[1::2]))]
+                     for key, items in value]
+        list_delta[part] = value
+    return list_delta
+
+
+def encode_data(message_type, data):
+    """
+    Encodes the data of a message. A turn's state is sent as an array in the order of STATE_KEYS, and a delta as a
+    flat array of key tags and values. Other messages are sent as they are.
+
+    :param message_type: the type of the message
+    :type message_type: str
+    :param data: the data of the message
+    :type data: any
+    :return: the encoded data
+    :rtype: any
+    """
+    if message_type == 'turn':
+        return [encode_value(key, data[key]) for key in STATE_KEYS]
+    if message_type == 'delta':
+        encoded = []
+        for tag, key in enumerate(STATE_KEYS):
+            if key in data:
+                value = encode_list_delta(key, data[key]) if key in RECORD_SCHEMAS else data[key]
+                encoded.extend((tag, value))
+        return encoded
+    return data
+
+
+def decode_data(message_type, data):
+    """
+    Decodes the data of a message encoded by encode_data.
+
+    :param message_type: the type of the message
+    :type message_type: str
+    :param data: the encoded data
+    :type data: any
+    :return: the data of the message
+    :rtype: any
+    """
+    if message_type == 'turn':
+        return dict((key, decode_value(key, value)) for key, value in zip(STATE_KEYS, data))
+    if message_type == 'delta':
+        decoded = {}
+        for tag, value in zip(data[::2], data[1::2]):
+            key = STATE_KEYS[tag]
+            decoded[key] = decode_list_delta(key, value) if key in RECORD_SCHEMAS else value
+        return decoded
+    return data
+
+
+def format_compact(message):
+    """
+    Formats a message as a compact frame.
+
+    :param message: the message, a dict with the message's type and data
+    :type message: dict[str, any]
+    :return: the frame, ending with a newline
+    :rtype: str
+    """
+    message_type = message['type']
+    payload = json.dumps([MESSAGE_TYPES.index(message_type), encode_data(message_type, message['data'])],
+                         separators=(',', ':'))
+    return '%d:%s\n' % (len(payload), payload)
+
+
+def is_compact(data_str):
+    """
+    Returns whether the received data is a compact frame and not a JSON message.
+
+    :param data_str: the received data
+    :type data_str: str
+    :rtype: bool
+    """
+    return bool(data_str) and data_str[0].isdigit()
+
+
+def parse_compact(data_str):
+    """
+    Parses a compact frame back into a message.
+    Raises ValueError if the frame is broken.
+
+    :param data_str: the frame
+    :type data_str: str
+    :return: the message, a dict with the message's type and data
+    :rtype: dict[str, any]
+    """
+    length, _, payload = data_str.rstrip('\r\n').partition(':')
+    if not length.isdigit() or int(length) != len(payload):
+        raise ValueError('Broken compact frame.')
+    try:
+        type_tag, data = json.loads(payload)
+        message_type = MESSAGE_TYPES[type_tag]
+        return {'type': message_type, 'data': decode_data(message_type, data)}
+    except (TypeError, IndexError, KeyError) as e:
+        raise ValueError('Broken compact frame: %s' % e)
@@ -0,0 +1,138 @@
+"""
+The step by step directions of a move, shared by the engine and the runners.
+A move walks along the rows first and then along the columns. On a cyclic map a gap of half the map or more is walked
+the other way around the map, and the move keeps going that way until its steps run out. The directions are computed
+as runs of the same letter instead of step by step, so the cost doesn't grow with the length of the move.
+"""
+
+
+def get_distance(row1, col1, row2, col2, height, width, cyclic):
+    """
+    Returns the manhattan distance between two squares.
+
+    :param row1: the row of the first square
+    :type row1: int
+    :param col1: the col of the first square
+    :type col1: int
+    :param row2: the row of the second square
+    :type row2: int
+    :param col2: the col of the second square
+    :type col2: int
+    :param height: the height of the map
+    :type height: int
+    :param width: the width of the map
+    :type width: int
+    :param cyclic: whether the map is cyclic
+    :type cyclic: bool
+    :rtype: int
+    """
+    d_row = abs(row1 - row2)
+    d_col = abs(col1 - col2)
+    if cyclic:
+        d_row = min(d_row, height - d_row)
+        d_col = min(d_col, width - d_col)
+    return d_row + d_col
+
+
+def get_direction_runs(row1, col1, row2, col2, height, width, cyclic):
+    """
+    Returns the directions from (row1, col1) to (row2, col2) as runs of the same direction.
+
+    :param row1: the row to start from
+    :type row1: int
+    :param col1: the col to start from
+    :type col1: int
+    :param row2: the row of the destination
+    :type row2: int
+    :param col2: the col of the destination
+    :type col2: int
+    :param height: the height of the map
+    :type height: int
+    :param width: the width of the map
+    :type width: int
+    :param cyclic: whether the map is cyclic
+    :type cyclic: bool
+    :return: the direction letter and the amount of steps of each run, at most two runs. A move to the same square is
+    a single '-'
+    :rtype: list[(str, int)]
+    """
+    if row1 == row2 and col1 == col2:
+        # a single move of 'do nothing'
+        return [('-', 1)]
+
+    distance = get_distance(row1, col1, row2, col2, height, width, cyclic)
+    d_row = row2 - row1
+    d_col = col2 - col1
+    if d_row and cyclic and abs(d_row) >= height // 2:
+        # going the other way never reaches the row, so all of the steps go that way
+        runs = [('n' if d_row > 0 else 's', distance)]
+    else:
+        runs = []
+        if d_row:
+            runs.append(('s' if d_row > 0 else 'n', abs(d_row)))
+        if d_col and cyclic and abs(d_col) >= width // 2:
+            runs.append(('w' if d_col > 0 else 'e', distance))
+        elif d_col:
+            runs.append(('e' if d_col > 0 else 'w', abs(d_col)))
+
+    # the move never takes more steps than the distance
+    steps_left = max(distance, 0)
+    limited_runs = []
+    for direction, steps in runs:
+        steps = min(steps, steps_left)
+        if steps > 0:
+            limited_runs.append((direction, steps))
+        steps_left -= steps
+    return limited_runs
+
+
+def get_direction_letters(row1, col1, row2, col2, height, width, cyclic):
+    """
+    Returns the step by step directions from (row1, col1) to (row2, col2), see get_direction_runs.
+
+    :param row1: the row to start from
+    :type row1: int
+    :param col1: the col to start from
+    :type col1: int
+    :param row2: the row of the destination
+    :type row2: int
+    :param col2: the col of the destination
+    :type col2: int
+    :param height: the height of the map
+    :type height: int
+    :param width: the width of the map
+    :type width: int
+    :param cyclic: whether the map is cyclic
+    :type cyclic: bool
+    :return: the direction of each step, 'n', 's', 'e' or 'w', or a single '-' for a move to the same square
+    :rtype: list[str]
+    """
+    letters = []
+    for direction, steps in get_direction_runs(row1, col1, row2, col2, height, width, cyclic):
+        letters += [direction] * steps
+    return letters
+
+
+def walk_axis(position, step, steps, size):
+    """
+    Walks steps single steps along one axis of a non cyclic map. A step off the edge of the map ends the walk.
+
+    :param position: the position on the axis to start from
+    :type position: int
+    :param step: the change of a single step, -1, 0 or 1
+    :type step: int
+    :param steps: the amount of steps
+    :type steps: int
+    :param size: the size of the map along the axis
+    :type size: int
+    :return: the position the walk ended on, and whether the walk ended by stepping off the map from there
+    :rtype: (int, bool)
+    """
+    if step == 0:
+        return position, False
+    # the steps left before the edge, a step past the edge wraps around the map, which only is a single step when the
+    # map is no more than 2 squares wide
+    room = size - 1 - position if step > 0 else position
+    if steps > room and size > 2:
+        return position + step * room, True
+    return (position + step * steps) % size, False
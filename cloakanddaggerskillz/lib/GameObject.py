@@ -8,6 +8,8 @@ class GameObject(MapObject.MapObject):
     """
     This is a base class for all interactable objects with a location in the game map
     """
+    __slots__ = ('location', 'owner', 'id')
+
     def __init__(self, location, owner, object_id):
         """
         :param location: the object's location
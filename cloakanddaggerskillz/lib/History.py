@@ -0,0 +1,149 @@
+"""
+This is the compact history of a value that is recorded every turn, like the treasure a pirate carries.
+Such values rarely change from one turn to the next, so only the changes are kept, and the history is expanded back to
+a value per turn when the replay is written.
+"""
+from array import array
+from bisect import bisect_left
+
+
+class ChangeHistory(object):
+    """
+    The history of an int or bool value, kept as runs of the same value. A run is kept as the index it starts at and
+    its value, in two arrays, so a run costs a few bytes instead of a python object per turn.
+    Bools are kept as 1 and 0.
+    """
+    __slots__ = ('starts', 'values', 'length')
+
+    def __init__(self, values=()):
+        """
+        Creates a new history.
+
+        :param values: the values to start the history with
+        :type values: list[int]
+        """
+        # the index each run starts at
+        self.starts = array('l')
+        """:type : array"""
+        # the value of each run
+        self.values = array('l')
+        """:type : array"""
+        # the amount of values in the history
+        self.length = 0
+        """:type : int"""
+
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        """
+        Adds a value to the end of the history
+
+        :param value: the value
+        :type value: int
+        """
+        if not self.values or self.values[-1] != value:
+            self.starts.append(self.length)
+            self.values.append(value)
+        self.length += 1
+
+    def append_many(self, value, count):
+        """
+        Adds a value to the end of the history count times
+
+        :param value: the value
+        :type value: int
+        :param count: the amount of times to add the value
+        :type count: int
+        """
+        if count <= 0:
+            return
+        if not self.values or self.values[-1] != value:
+            self.starts.append(self.length)
+            self.values.append(value)
+        self.length += count
+
+    def truncate(self, length):
+        """
+        Drops the values after the first length values.
+
+        :param length: the amount of values to keep
+        :type length: int
+        """
+        if length >= self.length:
+            return
+        length = max(length, 0)
+        # the runs that start at length or after it are dropped, the run before them ends at length
+        index = bisect_left(self.starts, length)
+        del self.starts[index:]
+        del self.values[index:]
+        self.length = length
+
+    def get_runs(self):
+        """
+        Returns the runs of the history.
+
+        :return: the value and the length of each run
+        :rtype: list[(int, int)]
+        """
+        ends = self.starts[1:].tolist() + [self.length]
+        return [(value, end - start) for start, end, value in zip(self.starts, ends, self.values)]
+
+    def to_list(self):
+        """
+        Expands the history to a value per turn
+
+        :rtype: list[int]
+        """
+        expanded = []
+        for value, count in self.get_runs():
+            expanded += [value] * count
+        return expanded
+
+    def to_string(self):
+        """
+        Expands the history to a string holding the value of each turn, the format of the replay
+
+        :rtype: str
+        """
+        return ''.join([str(value) * count for value, count in self.get_runs()])
+
+    def __len__(self):
+        """
+        :return: the amount of values in the history
+        :rtype: int
+        """
+        return self.length
+
+    def __iter__(self):
+        """
+        Iterates over the value of each turn
+        """
+        return iter(self.to_list())
+
+    def __delitem__(self, key):
+        """
+        Supports del history[length:], the way a list is truncated.
+
+        :param key: a slice with just a start
+        :type key: slice
+        """
+        if not isinstance(key, slice) or key.stop is not None or key.step is not None:
+            raise TypeError('only a history tail can be deleted')
+        self.truncate(key.start or 0)
+
+    def __getstate__(self):
+        """
+        :return: the state of the history, used by pickle and copy
+        :rtype: (list[int], list[int], int)
+        """
+        return self.starts.tolist(), self.values.tolist(), self.length
+
+    def __setstate__(self, state):
+        """
+        :param state: the state returned by __getstate__
+        :type state: (list[int], list[int], int)
+        """
+        starts, values, self.length = state
+        self.starts = array('l', starts)
+        self.values = array('l', values)
@@ -7,32 +7,69 @@ import MapObject
 class Location(MapObject.MapObject):
     """
     This is the most basic Location class, both the engine and the runner use it.
+    Locations are immutable, so they can be safely shared and used as dictionary keys.
     """
-    def __init__(self, row, col):
+    __slots__ = ('row', 'col', 'as_tuple', '_hash')
+    # the location of each (row, col), there is a single location object for each square
+    _locations = {}
+
+    def __new__(cls, row, col):
         """
-        Creates a new instance of the Location class.
+        Returns the location of the given square, the same location object is returned for the same square.
 
         :param row: the row of the location
         :type row: int
         :param col: the col of the location
         :type col: int
         """
-        self.row = row
-        self.col = col
+        location = cls._locations.get((row, col))
+        if location is None:
+            location = cls._locations.setdefault((row, col), cls.create_unshared(row, col))
+        return location
 
-        super(Location, self).__init__()
+    @classmethod
+    def create_unshared(cls, row, col):
+        """
+        Returns a new location object of the given square, that isn't kept for later use. Used for coordinates that
+        come from the bots, which may be anywhere, so only the squares of the map are kept.
 
-    @property
-    def as_tuple(self):
+        :param row: the row of the location
+        :type row: int
+        :param col: the col of the location
+        :type col: int
+        :rtype: Location
         """
-        Gets the location as a (row, col) tuple
+        location = object.__new__(cls)
+        object.__setattr__(location, 'row', row)
+        object.__setattr__(location, 'col', col)
+        # the location as a (row, col) tuple
+        object.__setattr__(location, 'as_tuple', (row, col))
+        object.__setattr__(location, '_hash', cls.calculate_hash(row, col))
+        return location
 
-        :return: the location as a (row, col) tuple
-        :type: (int, int)
+    @staticmethod
+    def calculate_hash(row, col):
         """
-        return self.row, self.col
+        Calculates a hash code for the given coordinates. Every pair of ints gets a different hash code, on maps of
+        any size and for locations outside of the map (negative coordinates are used as offsets).
+
+        :param row: the row of the location
+        :type row: int
+        :param col: the col of the location
+        :type col: int
+        :return: A hash code for the coordinates
+        :rtype: int
+        """
+        # map the ints to non negative ints (0, -1, 1, -2, 2... -> 0, 1, 2, 3, 4...)
+        row_key = row * 2 if row >= 0 else -row * 2 - 1
+        col_key = col * 2 if col >= 0 else -col * 2 - 1
+        # Cantor pairing function
+        key_sum = row_key + col_key
+        return key_sum * (key_sum + 1) // 2 + col_key
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, self.__class__):
             if self.row == other.row and self.col == other.col:
                 return True
@@ -45,14 +82,26 @@ class Location(MapObject.MapObject):
     def __repr__(self):
         return '<Location :%s>' % str(self)
 
+    def __setattr__(self, name, value):
+        raise AttributeError('Location is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Location is immutable')
+
+    def __reduce__(self):
+        # unpickled and copied locations are the location object of their square too, unless they weren't kept
+        if self._locations.get(self.as_tuple) is not self:
+            return _create_unshared_location, self.as_tuple
+        return Location, self.as_tuple
+
     def __hash__(self):
         """
-        Returns a hash code for the location.
-        WARNING: this forces the map to be smaller than 100 rows.
+        Returns a hash code for the location, different locations never share a hash code.
+
         :return: A hash code for the location
         :rtype: int
         """
-        return self.col * 100 + self.row
+        return self._hash
 
     def __str__(self):
         return str(self.as_tuple)
@@ -65,3 +114,12 @@ class Location(MapObject.MapObject):
         :rtype: Location
         """
         return self
+
+
+def _create_unshared_location(row, col):
+    """
+    Unpickles a location that wasn't kept by Location, a bound class method can't be pickled
+
+    :rtype: Location
+    """
+    return Location.create_unshared(row, col)
@@ -0,0 +1,101 @@
+"""
+This is the grid the game uses to keep track of what is on each square of the map
+"""
+from array import array
+
+
+class MapGrid(object):
+    """
+    A flat, row-major grid holding a small int for each square of the map.
+    Squares are accessed by Location, e.g. grid[location] = value. Squares outside the map are ignored.
+    """
+    def __init__(self, height, width, value):
+        """
+        Creates a new grid where every square holds value.
+
+        :param height: the amount of rows in the grid
+        :type height: int
+        :param width: the amount of cols in the grid
+        :type width: int
+        :param value: the initial value of every square, must fit in a signed byte
+        :type value: int
+        """
+        self.height = height
+        """:type : int"""
+        self.width = width
+        """:type : int"""
+        self.cells = array('b', [value]) * (height * width)
+        """:type : array"""
+
+    def get(self, row, col):
+        """
+        Gets the value of a square.
+
+        :param row: the row of the square
+        :type row: int
+        :param col: the col of the square
+        :type col: int
+        :return: the value of the square
+        :rtype: int
+        """
+        return self.cells[row * self.width + col]
+
+    def set(self, row, col, value):
+        """
+        Sets the value of a square, does nothing if the square is outside the grid.
+
+        :param row: the row of the square
+        :type row: int
+        :param col: the col of the square
+        :type col: int
+        :param value: the new value of the square
+        :type value: int
+        """
+        if 0 <= row < self.height and 0 <= col < self.width:
+            self.cells[row * self.width + col] = value
+
+    def __getitem__(self, location):
+        return self.get(location.row, location.col)
+
+    def __setitem__(self, location, value):
+        self.set(location.row, location.col, value)
+
+    def tolist(self):
+        """
+        Gets the grid as a list of rows.
+
+        :return: a list that holds a list of ints for each row
+        :rtype: list[list[int]]
+        """
+        cells = self.cells
+        width = self.width
+        return [cells[start:start + width].tolist() for start in xrange(0, len(cells), width)]
+
+    def render(self, characters):
+        """
+        Renders the grid as text, every value v is rendered as characters[v] (negative values count from the end).
+
+        :param characters: the characters to render the values with
+        :type characters: str
+        :return: a string for each row
+        :rtype: list[str]
+        """
+        table = ['?'] * 256
+        for value in xrange(-len(characters), len(characters)):
+            table[value & 0xff] = characters[value]
+        text = self.cells.tostring().translate(''.join(table))
+        width = self.width
+        return [text[start:start + width] for start in xrange(0, len(text), width)]
+
+    def copy(self):
+        """
+        Returns a copy of the grid.
+
+        :return: a copy of the grid
+        :rtype: MapGrid
+        """
+        grid = MapGrid.__new__(MapGrid)
+        grid.height = self.height
+        grid.width = self.width
+        grid.cells = array('b', self.cells)
+        return grid
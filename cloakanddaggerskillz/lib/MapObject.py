@@ -3,12 +3,37 @@ This module holds the base classes for any object with a location on the map, an
 """
 from abc import ABCMeta, abstractmethod
 
+# the slots of each class, by class, see get_slots
+_class_slots = {}
+
+
+def get_slots(cls):
+    """
+    Returns the slots of a class and of its base classes.
+
+    :param cls: the class
+    :type cls: type
+    :return: the name and the descriptor of each slot
+    :rtype: list[(str, member_descriptor)]
+    """
+    slots = _class_slots.get(cls)
+    if slots is None:
+        slots = []
+        for base in cls.__mro__:
+            for name in base.__dict__.get('__slots__', ()):
+                if name not in ('__dict__', '__weakref__'):
+                    slots.append((name, base.__dict__[name]))
+        _class_slots[cls] = slots
+    return slots
+
 
 class MapObject(object):
     """
-    This is a base class for all objects with a location in the game map
+    This is a base class for all objects with a location in the game map.
+    The map objects keep their attributes in __slots__, there are a lot of them and they are created all of the time.
     """
     __metaclass__ = ABCMeta
+    __slots__ = ()
 
     @abstractmethod
     def get_location(self):
@@ -19,3 +44,32 @@ class MapObject(object):
         :rtype: LocationClass.Location
         """
         raise NotImplemented('must implement get_location method')
+
+    def __getstate__(self):
+        """
+        Returns the object's attributes, used by pickle and copy since objects with slots have no __dict__ of their own
+
+        :return: the value of each attribute that is set
+        :rtype: dict[str, any]
+        """
+        state = dict(getattr(self, '__dict__', ()))
+        for name, slot in get_slots(type(self)):
+            try:
+                state[name] = slot.__get__(self)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        """
+        Sets the object's attributes from the state returned by __getstate__
+
+        :param state: the value of each attribute
+        :type state: dict[str, any]
+        """
+        slots = dict(get_slots(type(self)))
+        for name, value in state.iteritems():
+            if name in slots:
+                slots[name].__set__(self, value)
+            else:
+                self.__dict__[name] = value
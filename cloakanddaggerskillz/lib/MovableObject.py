@@ -8,6 +8,8 @@ class MovableObject(GameObject.GameObject):
     """
     This is a base class for all moving objects in the game
     """
+    __slots__ = ('max_speed', 'powerups')
+
     def __init__(self, location, owner, object_id, max_speed):
         """
         :param location: the object's location
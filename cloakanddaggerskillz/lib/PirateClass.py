@@ -9,6 +9,10 @@ class BasePirate(MovableObject.MovableObject):
     """
     This is the most basic Pirate class, both the engine Pirate class and the PythonRunner Pirate class inherit from it.
     """
+    __slots__ = ('initial_location', 'is_lost', 'turns_to_revive', 'reload_turns', 'defense_reload_turns',
+                 'defense_expiration_turns', 'max_defense_turns', 'turns_to_sober', 'cloak_turns', 'treasure',
+                 'attack_radius', 'carry_treasure_speed')
+
     def __init__(self, location, owner, pirate_id, max_speed, initial_location, attack_radius, max_defense_turns=0):
         """
         :param location: the location of the pirate
@@ -78,4 +82,6 @@ class BasePirate(MovableObject.MovableObject):
         return "<Pirate ID:%d Owner:%d Loc:%s>" % (self.id, self.owner.id, self.location.as_tuple)
 
     def __hash__(self):
-        return self.id * 10 + self.owner.id
+        # Cantor pairing of (id, owner id), different pirates never share a hash code
+        key_sum = self.id + self.owner.id
+        return key_sum * (key_sum + 1) // 2 + self.owner.id
@@ -1,6 +1,7 @@
 """
 This is the base player class which the runner and game use
 """
+from collections import OrderedDict
 
 
 class BasePlayer(object):
@@ -33,14 +34,38 @@ class BasePlayer(object):
         self.turns_to_cloak = 0
         """:type : int"""
 
-        self.living_pirates = []  # pirates that are currently alive
+        # the pirates that are currently alive, by their id, in the order of living_pirates
+        self.living_pirates_by_id = OrderedDict()
+        """:type : OrderedDict[int, Pirate]"""
+        # the living pirates list, built from living_pirates_by_id when it is asked for. None until it is built
+        self.living_pirates_list = None
         """:type : list[Pirate]"""
         self.dead_pirates = []  # pirates that are currently dead
         """:type : list[Pirate]"""
         self.drunk_pirates = []  # pirates that are currently drunk
         """:type : list[Pirate]"""
-        self.all_pirates = []  # all pirates that have been created
+        self.drunk_pirates_count = {}  # how many times each pirate appears in drunk_pirates, for fast membership tests
+        """:type : dict[Pirate, int]"""
+        self.all_pirates = []  # all pirates that have been created, a pirate keeps its object when it respawns
         """:type : list[Pirate]"""
+        # the amount of times the player's pirates spawned, counting respawns
+        self.spawns_count = 0
+        """:type : int"""
+        # incremented whenever one of the pirate lists changes, so views over the lists know when to refresh
+        self.pirates_version = 0
+        """:type : int"""
+
+    @property
+    def living_pirates(self):
+        """
+        The pirates that are currently alive. The list is shared until the living pirates change, so it must not be
+        modified.
+
+        :rtype: list[Pirate]
+        """
+        if self.living_pirates_list is None:
+            self.living_pirates_list = self.living_pirates_by_id.values()
+        return self.living_pirates_list
 
     def get_living_pirate(self, pirate_id):
         """
@@ -51,10 +76,29 @@ class BasePlayer(object):
         :return: The found pirate or None if no pirate is found.
         :rtype: Pirate
         """
-        for pirate in self.living_pirates:
-            if pirate.id == pirate_id:
-                return pirate
-        return None
+        return self.living_pirates_by_id.get(pirate_id)
+
+    def add_living_pirate(self, pirate):
+        """
+        This function adds a pirate to the end of the living pirates.
+
+        :param pirate: The pirate to add.
+        :type pirate: Pirate
+        """
+        self.living_pirates_by_id[pirate.id] = pirate
+        self.living_pirates_list = None
+        self.pirates_version += 1
+
+    def set_living_pirates(self, pirates):
+        """
+        This function replaces the living pirates with the given pirates.
+
+        :param pirates: The pirates that are alive, in order.
+        :type pirates: list[Pirate]
+        """
+        self.living_pirates_by_id = OrderedDict((pirate.id, pirate) for pirate in pirates)
+        self.living_pirates_list = None
+        self.pirates_version += 1
 
     def remove_living_pirate(self, pirate_id):
         """
@@ -65,9 +109,87 @@ class BasePlayer(object):
         :return: The found pirate or None if no pirate is found.
         :rtype: Pirate
         """
-        for index, pirate in enumerate(self.living_pirates):
-            if pirate.id == pirate_id:
-                return self.living_pirates.pop(index)
+        pirate = self.living_pirates_by_id.pop(pirate_id, None)
+        if pirate is not None:
+            self.living_pirates_list = None
+            self.pirates_version += 1
+        return pirate
+
+    def add_pirate(self, pirate):
+        """
+        This function adds a newly created pirate to all of the pirates.
+
+        :param pirate: The new pirate.
+        :type pirate: Pirate
+        """
+        self.all_pirates.append(pirate)
+        self.number_spawn(pirate)
+        self.pirates_version += 1
+
+    def number_spawn(self, pirate):
+        """
+        This function numbers the current life of a pirate by the order of the spawns of the player's pirates.
+
+        :param pirate: The pirate that spawned.
+        :type pirate: Pirate
+        """
+        pirate.spawn_index = self.spawns_count
+        self.spawns_count += 1
+
+    def add_dead_pirate(self, pirate):
+        """
+        This function adds a pirate to the end of the dead pirates.
+
+        :param pirate: The pirate that died.
+        :type pirate: Pirate
+        """
+        self.dead_pirates.append(pirate)
+        self.pirates_version += 1
+
+    def remove_dead_pirate(self, pirate):
+        """
+        This function removes a pirate from the dead pirates.
+
+        :param pirate: The pirate to remove.
+        :type pirate: Pirate
+        """
+        self.dead_pirates.remove(pirate)
+        self.pirates_version += 1
+
+    def add_drunk_pirate(self, pirate):
+        """
+        This function adds a pirate to the end of the drunk pirates.
+
+        :param pirate: The pirate that got drunk.
+        :type pirate: Pirate
+        """
+        self.drunk_pirates.append(pirate)
+        self.drunk_pirates_count[pirate] = self.drunk_pirates_count.get(pirate, 0) + 1
+        self.pirates_version += 1
+
+    def remove_drunk_pirate(self, pirate):
+        """
+        This function removes a single appearance of a pirate from the drunk pirates.
+
+        :param pirate: The pirate to remove.
+        :type pirate: Pirate
+        """
+        self.drunk_pirates.remove(pirate)
+        count = self.drunk_pirates_count.pop(pirate)
+        if count > 1:
+            self.drunk_pirates_count[pirate] = count - 1
+        self.pirates_version += 1
+
+    def is_drunk(self, pirate):
+        """
+        This function returns whether a pirate is in the drunk pirates.
+
+        :param pirate: The pirate to check.
+        :type pirate: Pirate
+        :return: True if the pirate is in the drunk pirates, False otherwise.
+        :rtype: bool
+        """
+        return pirate in self.drunk_pirates_count
 
     def kill_player(self):
         """
@@ -0,0 +1,117 @@
+"""
+This is the schedule of the map objects that come and go on given turns - powerups, scripts and anti scripts - and of
+the treasures that wait to respawn. It lets the game work on the objects that are on the map this turn, instead of
+checking the turns of every object the map will ever have.
+"""
+from operator import itemgetter
+
+
+class TurnSchedule(object):
+    """
+    The schedule of a game. The map objects are ordered by the turn they appear on, and each kind of map object has
+    the set of objects that are on the map, which is brought up to date when it is asked for. An object goes away once
+    its end turn is reached, even when its end turn changed because a pirate collected it.
+    The treasures that wait to respawn are bucketed by the turn they respawn on.
+    """
+    def __init__(self, map_objects):
+        """
+        Creates a schedule that starts before the first turn.
+
+        :param map_objects: the map objects of each kind, by kind. Each object has a start_turn and an end_turn
+        :type map_objects: dict[str, list[Powerup | Script]]
+        """
+        # the objects that appear during the game, as (start turn, kind, index of the object in its kind)
+        self.pending = sorted([(map_object.start_turn, kind, index)
+                               for kind, objects in map_objects.iteritems()
+                               for index, map_object in enumerate(objects)], key=itemgetter(0))
+        """:type : list[(int, str, int)]"""
+        self.map_objects = map_objects
+        """:type : dict[str, list[Powerup | Script]]"""
+        # the turn the active objects are up to date with, and the index of the first pending object that didn't appear
+        self.turn = None
+        """:type : int"""
+        self.next_pending = 0
+        """:type : int"""
+        # the objects of each kind that are on the map, by their index in their kind
+        self.active = dict((kind, {}) for kind in map_objects)
+        """:type : dict[str, dict[int, Powerup | Script]]"""
+        # the treasures that respawn on each turn
+        self.respawns = {}
+        """:type : dict[int, list[Treasure]]"""
+
+    def reset(self):
+        """
+        Starts the schedule over, used when the game went back to an earlier turn. The respawns are dropped as well,
+        the game adds them again.
+
+        """
+        self.reset_active()
+        self.respawns.clear()
+
+    def advance(self, turn):
+        """
+        Brings the active objects up to date with turn.
+
+        :param turn: the current turn
+        :type turn: int
+        """
+        if self.turn is not None and turn < self.turn:
+            self.reset_active()
+        pending = self.pending
+        map_objects = self.map_objects
+        while self.next_pending < len(pending) and pending[self.next_pending][0] <= turn:
+            _, kind, index = pending[self.next_pending]
+            self.active[kind][index] = map_objects[kind][index]
+            self.next_pending += 1
+        # the end turns change when objects are collected, so they are checked every time
+        for active in self.active.itervalues():
+            for index in [index for index, map_object in active.iteritems() if map_object.end_turn <= turn]:
+                del active[index]
+        self.turn = turn
+
+    def reset_active(self):
+        """
+        Drops the active objects, so they are collected again from the first turn.
+
+        """
+        self.turn = None
+        self.next_pending = 0
+        for active in self.active.itervalues():
+            active.clear()
+
+    def get_active(self, kind, turn):
+        """
+        Returns the objects of a kind that are on the map on a turn.
+
+        :param kind: the kind of the objects, e.g. 'powerups'
+        :type kind: str
+        :param turn: the current turn
+        :type turn: int
+        :return: the objects on the map, in the order of their kind's list
+        :rtype: list[Powerup | Script]
+        """
+        self.advance(turn)
+        active = self.active[kind]
+        return [active[index] for index in sorted(active)]
+
+    def add_respawn(self, turn, treasure):
+        """
+        Schedules a treasure to respawn.
+
+        :param turn: the turn the treasure respawns on
+        :type turn: int
+        :param treasure: the treasure
+        :type treasure: Treasure
+        """
+        self.respawns.setdefault(turn, []).append(treasure)
+
+    def pop_respawns(self, turn):
+        """
+        Removes and returns the treasures that respawn on a turn.
+
+        :param turn: the turn
+        :type turn: int
+        :return: the treasures, in the order they were scheduled
+        :rtype: list[Treasure]
+        """
+        return self.respawns.pop(turn, [])
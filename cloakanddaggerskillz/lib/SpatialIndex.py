@@ -0,0 +1,139 @@
+"""
+This is a uniform grid spatial index, used by the game to find the objects standing on a certain square
+"""
+
+
+class SpatialIndex(object):
+    """
+    A uniform grid spatial index. Every square on the map is a bucket holding the objects standing on it, in the order
+    they were added, so a lookup returns the same object a scan over the original list would.
+    """
+    def __init__(self, objects=()):
+        """
+        Creates a new spatial index.
+
+        :param objects: objects to index by their current location
+        :type objects: list[MapObject]
+        """
+        self.cells = {}
+        """:type : dict[(int, int), list[MapObject]]"""
+
+        for obj in objects:
+            self.add(obj)
+
+    def add(self, obj, location=None):
+        """
+        Adds an object to the index.
+
+        :param obj: the object to add
+        :type obj: MapObject
+        :param location: the location to add the object at, defaults to the object's location
+        :type location: Location
+        """
+        if location is None:
+            location = obj.get_location()
+        key = location.as_tuple
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [obj]
+        else:
+            cell.append(obj)
+
+    def remove(self, obj, location=None):
+        """
+        Removes an object from the index. Does nothing if the object isn't indexed at the location.
+
+        :param obj: the object to remove
+        :type obj: MapObject
+        :param location: the location the object was indexed at, defaults to the object's location
+        :type location: Location
+        """
+        if location is None:
+            location = obj.get_location()
+        key = location.as_tuple
+        cell = self.cells.get(key)
+        if cell is None:
+            return
+        for index, cell_obj in enumerate(cell):
+            if cell_obj is obj:
+                del cell[index]
+                break
+        if not cell:
+            del self.cells[key]
+
+    def move(self, obj, old_location, new_location):
+        """
+        Moves an object from one location to another.
+
+        :param obj: the object to move
+        :type obj: MapObject
+        :param old_location: the location the object was indexed at
+        :type old_location: Location
+        :param new_location: the new location of the object
+        :type new_location: Location
+        """
+        self.remove(obj, old_location)
+        self.add(obj, new_location)
+
+    def get_objects(self, location):
+        """
+        Gets all of the objects on the given location.
+
+        :param location: the location to look at
+        :type location: Location
+        :return: the objects on location, in the order they were added
+        :rtype: list[MapObject]
+        """
+        return self.cells.get(location.as_tuple, [])
+
+    def get_first(self, location, predicate=None):
+        """
+        Gets the first object on the given location that matches predicate, or None if there is no such object.
+
+        :param location: the location to look at
+        :type location: Location
+        :param predicate: a function that gets an object and returns whether it matches, matches all if None
+        :type predicate: (MapObject) -> bool
+        :return: the first matching object or None
+        :rtype: MapObject
+        """
+        for obj in self.cells.get(location.as_tuple, ()):
+            if predicate is None or predicate(obj):
+                return obj
+        return None
+
+    def get_objects_in_offsets(self, location, offsets):
+        """
+        Gets all of the objects on the squares offset from location by the given offsets.
+
+        :param location: the location the offsets are relative to
+        :type location: Location
+        :param offsets: the (row, col) offsets to look at
+        :type offsets: list[(int, int)]
+        :return: the objects found
+        :rtype: list[MapObject]
+        """
+        row, col = location.as_tuple
+        cells = self.cells
+        result = []
+        # only visit the occupied squares if there are fewer of them than squares in the area
+        if len(cells) < len(offsets):
+            offsets_set = set(offsets)
+            for (cell_row, cell_col), cell in cells.iteritems():
+                if (cell_row - row, cell_col - col) in offsets_set:
+                    result.extend(cell)
+        else:
+            for d_row, d_col in offsets:
+                cell = cells.get((row + d_row, col + d_col))
+                if cell:
+                    result.extend(cell)
+        return result
+
+    def __len__(self):
+        """
+        Gets the amount of objects in the index.
+
+        :return: the amount of objects in the index
+        :rtype: int
+        """
+        return sum(len(cell) for cell in self.cells.itervalues())
@@ -0,0 +1,135 @@
+"""
+The delta state protocol, shared by the engine and the runners.
+With the delta protocol the engine sends the full state on the first turn and whenever a runner asks for a resync,
+and on any other turn sends only the entities and fields that changed since the state it sent before.
+"""
+
+# the name of the protocol, offered by the engine in the setup data and accepted by the runner in its reply
+DELTA_PROTOCOL = 'delta'
+
+# the fields that identify the entities of each list in the state
+ENTITY_KEYS = {'treasures': ('id',),
+               'pirates': ('owner', 'id'),
+               'dead_pirates': ('owner', 'id'),
+               'powerups': ('id',),
+               'scripts': ('id',),
+               'anti_scripts': ('id',),
+               'bermuda_zones': ('owner', 'center'),
+               'players': ('id',)}
+
+
+def entity_key(list_name, entity):
+    """
+    Returns the key identifying an entity in its list, locations are flattened so the key is the same on both sides of
+    the pipe.
+
+    :param list_name: the name of the list holding the entity
+    :type list_name: str
+    :param entity: the entity's dict
+    :type entity: dict[str, any]
+    :return: the entity's key
+    :rtype: tuple
+    """
+    key = []
+    for field in ENTITY_KEYS[list_name]:
+        value = entity[field]
+        if isinstance(value, (list, tuple)):
+            key.extend(value)
+        else:
+            key.append(value)
+    return tuple(key)
+
+
+def make_delta(previous, current):
+    """
+    Creates the delta that turns the previous state into the current state.
+    Every list in the delta holds the added entities, the changed fields of the changed entities, the keys of the
+    removed entities, and the new order of the keys if it isn't the previous order followed by the added entities.
+    A list whose entities can't be told apart by their keys is replaced as a whole.
+    Other values are only included if they changed.
+
+    :param previous: the state that was sent before
+    :type previous: dict[str, any]
+    :param current: the current state
+    :type current: dict[str, any]
+    :return: the delta
+    :rtype: dict[str, any]
+    """
+    delta = {}
+    for name, value in current.iteritems():
+        previous_value = previous.get(name)
+        if name not in ENTITY_KEYS:
+            if previous_value != value:
+                delta[name] = value
+            continue
+
+        previous_keys = [entity_key(name, entity) for entity in previous_value]
+        previous_entities = dict(zip(previous_keys, previous_value))
+        keys = [entity_key(name, entity) for entity in value]
+        if len(previous_entities) != len(previous_keys) or len(set(keys)) != len(keys):
+            # the keys don't identify the entities, send the whole list
+            delta[name] = {'replaced': value}
+            continue
+
+        added_keys = []
+        added = []
+        changed = []
+        for key, entity in zip(keys, value):
+            previous_entity = previous_entities.pop(key, None)
+            if previous_entity is None:
+                added_keys.append(key)
+                added.append(entity)
+            elif previous_entity != entity:
+                changed.append([key, dict((field, field_value) for field, field_value in entity.iteritems()
+                                          if previous_entity.get(field) != field_value)])
+
+        list_delta = {}
+        if added:
+            list_delta['added'] = added
+        if changed:
+            list_delta['changed'] = changed
+        if previous_entities:
+            list_delta['removed'] = [key for key in previous_keys if key in previous_entities]
+        kept_keys = [key for key in previous_keys if key not in previous_entities]
+        if kept_keys + added_keys != keys:
+            list_delta['order'] = keys
+        if list_delta:
+            delta[name] = list_delta
+    return delta
+
+
+def apply_delta(state, delta):
+    """
+    Applies a delta made by make_delta to the state it was made from, the state is updated in place.
+    Raises KeyError if the delta doesn't fit the state, in which case a resync is needed.
+
+    :param state: the state the delta was made from
+    :type state: dict[str, any]
+    :param delta: the delta
+    :type delta: dict[str, any]
+    :return: the updated state
+    :rtype: dict[str, any]
+    """
+    for name, value in delta.iteritems():
+        if name not in ENTITY_KEYS:
+            state[name] = value
+            continue
+
+        if 'replaced' in value:
+            state[name] = value['replaced']
+            continue
+        entities = state[name]
+        entities_by_key = dict((entity_key(name, entity), entity) for entity in entities)
+        for key in value.get('removed', ()):
+            del entities_by_key[tuple(key)]
+        for key, fields in value.get('changed', ()):
+            entities_by_key[tuple(key)].update(fields)
+        keys = [key for key in (entity_key(name, entity) for entity in entities) if key in entities_by_key]
+        for entity in value.get('added', ()):
+            key = entity_key(name, entity)
+            entities_by_key[key] = entity
+            keys.append(key)
+        if 'order' in value:
+            keys = [tuple(key) for key in value['order']]
+        state[name] = [entities_by_key[key] for key in keys]
+    return state
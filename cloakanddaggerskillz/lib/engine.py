@@ -9,10 +9,16 @@ import sys
 from os import walk
 from os.path import splitext, join
 import cPickle
+from threading import Event
 from sandbox import get_sandbox
+from StateDelta import DELTA_PROTOCOL, make_delta
+from CompactProtocol import COMPACT_PROTOCOL, format_compact, parse_compact, is_compact
 
 import json  # Used for serializing the data communication.
 
+# the longest time to wait for the bots' output before checking if a bot crashed, in seconds
+CRASH_CHECK_INTERVAL = 0.1
+
 if sys.version_info >= (3,):
     # noinspection PyShadowingBuiltins
     def unicode(s):
@@ -221,11 +227,21 @@ class Runner(object):
         self.error_lines = []
         self.actions = {}
 
+        # the state protocol the bot agreed to during setup, None for the full state protocol
+        self.protocol = None
+        # the wire protocol the bot agreed to during setup, None for JSON
+        self.wire_protocol = None
+        # the last state sent to the bot with the delta protocol, None when the next state must be sent in full
+        self.sent_state = None
+
     def send(self, data):
         """
         send a data to the runner
         """
-        data_str = Runner.format_data(data)
+        if self.wire_protocol == COMPACT_PROTOCOL:
+            data_str = format_compact(data)
+        else:
+            data_str = Runner.format_data(data)
 
         self._runner.write(data_str)
         self.logger.input(data_str)
@@ -234,10 +250,12 @@ class Runner(object):
         """
         receive the data using the protocol and log it to the
 
-        :return: data from the runner
+        :return: data from the runner, or None if no data is available
         :rtype: dict
         """
         data = self._runner.read_line()
+        if data is None:
+            return None
 
         self.logger.output(data)
         return Runner.parse_data(data)
@@ -310,7 +328,8 @@ class Runner(object):
     @staticmethod
     def parse_data(data_str):
         """
-        This turns the received data into a dictionary or list using json.
+        This turns the received data into a dictionary or list using json, or using the compact protocol if the data is
+        a compact frame.
 
         :param data_str: The input data to un format.
         :type data_str: str
@@ -321,6 +340,8 @@ class Runner(object):
         """
         # Json data might be incorrect so try and catch is used.
         try:
+            if is_compact(data_str):
+                return parse_compact(data_str)
             return json.loads(data_str)
         except (ValueError, TypeError):
             return dict()
@@ -581,6 +602,11 @@ class Engine(object):
 
         self.dump_pickled_game = options.get('dump_pickled_game', None)
 
+        # the state protocol offered to the bots, None to always send the full state
+        self.state_protocol = options.get('state_protocol', None)
+        # the wire protocol offered to the bots, None to always use JSON
+        self.wire_protocol = options.get('wire_protocol', None)
+
         # TODO : check if those are needed
         self.bots = []
         self.bot_status = []
@@ -597,6 +623,8 @@ class Engine(object):
         self.logger = EngineLogger(self.debug_log, EngineLogger.LEVEL_DEBUG)  # TODO : Change the level and log buffer
 
         self.runners = []
+        # set by the runners' sandboxes whenever a bot's output is available
+        self.ready_event = Event()
         self.game = game
         self.turn_num = self.game.init_turn
 
@@ -612,28 +640,63 @@ class Engine(object):
             self.handle_game_logic()
 
         except Exception as e:
-            error = traceback.format_exc()
-            sys.stderr.write('Error Occurred\n')
-            if self.show_traceback:
-                error_desc = str(error)
-            else:
-                error_desc = type(e).__name__ + ': ' + str(e)
-            sys.stderr.write(error_desc + '\n')
-            if self.verbose_log:  # TODO - Figure out the new log system
-                self.verbose_log.write(error)
-                # error = str(e)
+            error = self.report_error(e)
         finally:
             if self.end_wait:
-                for runner in self.runners:
-                    runner.resume()
-                if self.verbose_log and self.end_wait > 1:
-                    self.verbose_log.write('waiting {0} seconds for bots to process end turn\n'.format(self.end_wait))
+                self.resume_runners_for_end()
                 time.sleep(self.end_wait)
-            for runner in self.runners:
-                if runner.is_alive:
-                    runner.kill()
-                runner.release()
+            self.release_runners()
+
+        return self.write_game_results(error)
+
+    def report_error(self, e):
+        """
+        Reports an error that stopped the game
+
+        :param e: the error
+        :type e: Exception
+        :return: the traceback of the error
+        :rtype: str
+        """
+        error = traceback.format_exc()
+        sys.stderr.write('Error Occurred\n')
+        if self.show_traceback:
+            error_desc = str(error)
+        else:
+            error_desc = type(e).__name__ + ': ' + str(e)
+        sys.stderr.write(error_desc + '\n')
+        if self.verbose_log:  # TODO - Figure out the new log system
+            self.verbose_log.write(error)
+            # error = str(e)
+        return error
+
+    def resume_runners_for_end(self):
+        """
+        Resumes all of the bots so they can process the end of the game
+        """
+        for runner in self.runners:
+            runner.resume()
+        if self.verbose_log and self.end_wait > 1:
+            self.verbose_log.write('waiting {0} seconds for bots to process end turn\n'.format(self.end_wait))
+
+    def release_runners(self):
+        """
+        Kills the bots that are still alive and releases their sandboxes
+        """
+        for runner in self.runners:
+            if runner.is_alive:
+                runner.kill()
+            runner.release()
+
+    def write_game_results(self, error=None):
+        """
+        Gets the game results and writes them to the replay log if there is one
 
+        :param error: a traceback
+        :type error: str
+        :return: the game results
+        :rtype: dict
+        """
         game_result = self.get_game_results(error)
 
         if self.replay_log:
@@ -688,16 +751,7 @@ class Engine(object):
 
             self.recv_runners_actions()
 
-            if self.debug_log:
-                self.print_debug_msgs()
-
-            self.handle_error_logs()
-
-            alive_bots = filter(lambda runner: self.game.is_alive(runner.game_id), self.runners)
-            if self.turn_num > self.game.init_turn:
-                if not self.game.game_over():
-                    self.process_orders()
-                self.end_turn()
+            alive_bots = self.resolve_turn()
 
             self.handle_eliminated_runners(alive_bots)
             self.handle_verbose_logs()
@@ -707,6 +761,27 @@ class Engine(object):
 
         self.end_game()
 
+    def resolve_turn(self):
+        """
+        Handles the actions the bots sent this turn and plays the turn
+
+        :return: the bots that were alive at the beginning of the turn
+        :rtype: list[Runner]
+        """
+        if self.debug_log:
+            self.print_debug_msgs()
+
+        self.handle_error_logs()
+
+        alive_bots = filter(lambda runner: self.game.is_alive(runner.game_id), self.runners)
+        if self.turn_num > self.game.init_turn:
+            if not self.game.game_over():
+                self.process_orders()
+            self.end_turn()
+        else:
+            self.accept_protocols()
+        return alive_bots
+
     def create_runners(self):
         """
         Creates runner and remembers them
@@ -723,6 +798,7 @@ class Engine(object):
                                                   error_logs=self.error_logs[bot_id],
                                                   secure=self.secure_flag)
 
+                runner.set_ready_event(self.ready_event)
                 self.runners.append(runner)
                 id_counter += 1
 
@@ -817,6 +893,18 @@ class Engine(object):
 
                 if self.turn_num == self.game.init_turn:
                     state_dict = {'type': 'setup', 'data': self.game.get_player_start(runner.game_id)}
+                    protocols = [protocol for protocol in (self.state_protocol, self.wire_protocol) if protocol]
+                    if protocols:
+                        state_dict['data']['protocols'] = protocols
+
+                elif runner.protocol == DELTA_PROTOCOL:
+                    state = self.game.get_player_state(runner.game_id)
+                    if runner.sent_state is None:
+                        state_dict = {'type': 'turn', 'data': state}
+                    else:
+                        state_dict = {'type': 'delta', 'data': make_delta(runner.sent_state, state)}
+                    runner.sent_state = state
+                    runner.turn = self.turn_num
 
                 else:
                     state_dict = {'type': 'turn', 'data': self.game.get_player_state(runner.game_id)}
@@ -825,6 +913,21 @@ class Engine(object):
 
                 runner.send(state_dict)
 
+    def accept_protocols(self):
+        """
+        Sets the protocols of each bot to the offered protocols it accepted in its reply to the setup
+        """
+        for runner in self.runners:
+            if not isinstance(runner.actions, dict) or not isinstance(runner.actions.get('data'), dict):
+                continue
+            accepted_protocols = runner.actions['data'].get('protocols')
+            if not isinstance(accepted_protocols, list):
+                continue
+            if self.state_protocol and self.state_protocol in accepted_protocols:
+                runner.protocol = self.state_protocol
+            if self.wire_protocol and self.wire_protocol in accepted_protocols:
+                runner.wire_protocol = self.wire_protocol
+
     def handle_eliminated_runners(self, live_bots):
         """
         send ending info to eliminated bots
@@ -833,6 +936,22 @@ class Engine(object):
         :param live_bots: The bots that were alive at the beginning of the turn
         :type live_bots: [Runner]
         """
+        bots_eliminated = self.eliminate_runners(live_bots)
+        if bots_eliminated and self.end_wait:
+            time.sleep(self.end_wait)
+        for runner in bots_eliminated:
+            runner.kill()
+
+    def eliminate_runners(self, live_bots):
+        """
+        Marks the bots that were eliminated this turn as defeated, and resumes them to process the end of the game if
+        the engine waits for them
+
+        :param live_bots: The bots that were alive at the beginning of the turn
+        :type live_bots: [Runner]
+        :return: the eliminated bots, they should be killed once the engine is done waiting for them
+        :rtype: list[Runner]
+        """
         bots_eliminated = filter(lambda runner: not self.game.is_alive(runner.game_id), live_bots)
 
         for runner in bots_eliminated:
@@ -847,9 +966,7 @@ class Engine(object):
         if bots_eliminated and self.end_wait:
             if self.verbose_log:
                 self.verbose_log.write('waiting {0} seconds for bots to process end turn\n'.format(self.end_wait))
-            time.sleep(self.end_wait)
-        for runner in bots_eliminated:
-            runner.kill()
+        return bots_eliminated
 
     def handle_error_logs(self):
         """
@@ -868,6 +985,18 @@ class Engine(object):
         gets the changes/actions from the bots
         """
 
+        time_limit = self.get_time_limit()
+        for runners_in_action in self.get_runner_groups():
+            # get the moves from each bot
+            self.get_moves(runners_in_action, time_limit)
+
+    def get_time_limit(self):
+        """
+        Returns the time the bots have to send their moves this turn
+
+        :return: the time limit, in seconds
+        :rtype: float
+        """
         # get moves from each player
         if self.turn_num == self.game.init_turn:
             time_limit = self.load_time
@@ -877,8 +1006,15 @@ class Engine(object):
             time_limit = self.turn_time
 
         # here is our safe zone, we take factor of 3 for our running more than we show to players
-        time_limit *= 3
+        return time_limit * 3
 
+    def get_runner_groups(self):
+        """
+        Returns the groups of live bots that run at the same time, a single group unless the game is serial
+
+        :return: the groups of bots
+        :rtype: list[list[Runner]]
+        """
         if self.is_serial:
             simultaneous_running = 1
         else:
@@ -886,10 +1022,8 @@ class Engine(object):
 
         alive_bots = [runner for runner in self.runners if self.game.is_alive(runner.game_id)]
 
-        for group_num in range(0, len(alive_bots), simultaneous_running):
-            runners_in_action = alive_bots[group_num: group_num+simultaneous_running]
-            # get the moves from each bot
-            self.get_moves(runners_in_action, time_limit)
+        return [alive_bots[group_num: group_num + simultaneous_running]
+                for group_num in range(0, len(alive_bots), simultaneous_running)]
 
     def print_debug_msgs(self):
         """
@@ -974,6 +1108,9 @@ class Engine(object):
                 extracted_bot_moves = {}
             if 'orders' not in extracted_bot_moves.keys():
                 extracted_bot_moves['orders'] = []
+            if extracted_bot_moves.get('resync'):
+                # the bot lost track of the state, send it the full state next turn
+                runner.sent_state = None
 
             valid, ignored, invalid = self.game.do_moves(runner.game_id, extracted_bot_moves['orders'])
 
@@ -1022,36 +1159,22 @@ class Engine(object):
         start_time = time.time()
 
         # loop until received all bots send moves or are dead
-        #   or when time is up
-        while not all(bot_finished) and time.time() - start_time < time_limit:
-            time.sleep(0.003)
+        #   or when time is up, waiting for the bots' output in between
+        ready_event = self.ready_event
+        while not all(bot_finished):
+            remaining_time = time_limit - (time.time() - start_time)
+            if remaining_time <= 0:
+                break
+            # clear before reading, so output that arrives while reading wakes the wait below
+            ready_event.clear()
             for bot_number, runner in enumerate(runners):
                 if bot_finished[bot_number]:
                     continue  # already got bot moves
-                if not runner.is_alive:
-                    msg = unicode('turn %4d bot %s crashed') % (self.turn_num, runner.game_id)
-                    runner.add_error_msg([msg], turn=self.turn_num)
-                    runner.status = 'crashed'
-                    for x in range(100):  # Reads up to 100 lines of the error
-                        line = runner.read_error()
-                        if line is None:
-                            break
-                        runner.add_error_msg([line], turn=self.turn_num)
-                    bot_finished[bot_number] = True
-                    self.game.kill_player(runner.game_id)
-                    continue  # bot is dead
-
-                data = runner.recv()
-                if data:
-                    runner.actions = data
-                    bot_finished[bot_number] = True
+                bot_finished[bot_number] = self.poll_runner(runner)
 
-                for x in range(100):  # Reads up to 100 lines of the error
-                    line = runner.read_error()
-                    # TODO - THIS ALSO READS ERRORS WHEN WE DEBUG!!!FIX!!!
-                    if line is None:
-                        break
-                    runner.add_error_msg([line], turn=self.turn_num)
+            if not all(bot_finished):
+                # a crashed bot's output ends before it can be seen dead, so wake up now and then to check on it
+                ready_event.wait(min(time_limit - (time.time() - start_time), CRASH_CHECK_INTERVAL))
 
         moves_time = time.time() - start_time
 
@@ -1063,21 +1186,291 @@ class Engine(object):
         # kill timed out bots
         for bot_number, finished in enumerate(bot_finished):
             if not finished:
-                runner = runners[bot_number]
-                error_msg = unicode('turn %4d bot %s timed out') % (self.turn_num, runner.game_id)
-                runner.add_error_msg([error_msg],
-                                     turn=self.turn_num)
-                runner.status = 'timeout'
-                for x in range(100):
-                    line = runner.read_error()
-                    if line is None:
-                        break
-                    runner.add_error_msg([line], turn=self.turn_num)
-                self.game.kill_player(runner.game_id)
-                runner.kill()
+                self.time_out_runner(runners[bot_number])
 
         return moves_time
 
+    def poll_runner(self, runner):
+        """
+        Reads the available output of a bot that didn't send its moves yet
+
+        :param runner: the bot
+        :type runner: Runner
+        :return: whether the bot is done with the turn, either it sent its moves or it crashed
+        :rtype: bool
+        """
+        if not runner.is_alive:
+            msg = unicode('turn %4d bot %s crashed') % (self.turn_num, runner.game_id)
+            runner.add_error_msg([msg], turn=self.turn_num)
+            runner.status = 'crashed'
+            self.read_runner_errors(runner)
+            self.game.kill_player(runner.game_id)
+            return True  # bot is dead
+
+        # read all of the available lines until the bot's moves are found
+        finished = False
+        data = runner.recv()
+        while data is not None:
+            if data:
+                runner.actions = data
+                finished = True
+                break
+            data = runner.recv()
+
+        # TODO - THIS ALSO READS ERRORS WHEN WE DEBUG!!!FIX!!!
+        self.read_runner_errors(runner)
+        return finished
+
+    def time_out_runner(self, runner):
+        """
+        Kills a bot that didn't send its moves in time
+
+        :param runner: the bot
+        :type runner: Runner
+        """
+        error_msg = unicode('turn %4d bot %s timed out') % (self.turn_num, runner.game_id)
+        runner.add_error_msg([error_msg],
+                             turn=self.turn_num)
+        runner.status = 'timeout'
+        self.read_runner_errors(runner)
+        self.game.kill_player(runner.game_id)
+        runner.kill()
+
+    def read_runner_errors(self, runner):
+        """
+        Moves up to 100 lines of a bot's error output to its error messages
+
+        :param runner: the bot
+        :type runner: Runner
+        """
+        for x in range(100):  # Reads up to 100 lines of the error
+            line = runner.read_error()
+            if line is None:
+                break
+            runner.add_error_msg([line], turn=self.turn_num)
+
+
+class AsyncEngine(Engine):
+    def __init__(self, bot_paths, options, game):
+        """
+        An engine that runs the same game loop as Engine as a coroutine, so a single thread can run many games at once
+        with run_games. While the bots think the game yields instead of blocking, and every bot has a deadline of its
+        own - a bot is paused as soon as it sends its moves and times out as soon as its own time is up.
+
+        :param bot_paths: the paths of the bots
+        :type bot_paths: list[tuple(file)]
+        :param options: the options for the engine
+        :type options: dict
+        :param game: the game object
+        :type game: Game.game
+        """
+        super(AsyncEngine, self).__init__(bot_paths, options, game)
+        # the results of the game, once it's over
+        self.result = None
+
+    def run_game(self):
+        """
+        runs the game
+
+        :return: the replay data
+        :rtype: dict
+        """
+        return run_games([self])[0]
+
+    def play(self):
+        """
+        The coroutine of the game, plays the game like Engine.run_game and keeps its results in result.
+        Yields the latest time it should be resumed at, it should also be resumed whenever its ready event is set.
+        """
+        error = ''
+        try:
+            for wake_time in self.play_game_logic():
+                yield wake_time
+
+        except Exception as e:
+            error = self.report_error(e)
+        except BaseException:
+            # the game was stopped, don't wait for the bots
+            self.release_runners()
+            raise
+
+        if self.end_wait:
+            self.resume_runners_for_end()
+            for wake_time in self.sleep(self.end_wait):
+                yield wake_time
+        self.release_runners()
+
+        self.result = self.write_game_results(error)
+
+    def play_game_logic(self):
+        """
+        The coroutine of the game main loop logic, see Engine.handle_game_logic
+        """
+        self.create_runners()
+
+        self.start_game()
+
+        for self.turn_num in range(self.game.init_turn, self.turns + 1):
+
+            self.start_turn()
+
+            self.send_turn_data_to_runners()
+
+            for wake_time in self.wait_for_runners_actions():
+                yield wake_time
+
+            alive_bots = self.resolve_turn()
+
+            bots_eliminated = self.eliminate_runners(alive_bots)
+            if bots_eliminated and self.end_wait:
+                for wake_time in self.sleep(self.end_wait):
+                    yield wake_time
+            for runner in bots_eliminated:
+                runner.kill()
+            self.handle_verbose_logs()
+
+            if self.game.game_over():
+                break
+
+        self.end_game()
+
+    def wait_for_runners_actions(self):
+        """
+        The coroutine that gets the changes/actions from the bots, see Engine.recv_runners_actions
+        """
+        time_limit = self.get_time_limit()
+        for runners_in_action in self.get_runner_groups():
+            for wake_time in self.wait_for_moves(runners_in_action, time_limit):
+                yield wake_time
+
+    def wait_for_moves(self, runners, time_limit):
+        """
+        The coroutine that gets the moves of the runners in a single turn, see Engine.get_moves.
+        Every bot is paused as soon as it's done with the turn, and timed out once its own deadline passes.
+
+        :param runners: the live runners in the turn
+        :type runners: list[Runner]
+        :param time_limit: the time limit for the runners
+        :type: int
+        """
+        waiting = []
+        for runner in runners:
+            if self.game.is_alive(runner.game_id):
+                if runner.is_alive:
+                    runner.resume()
+                # don't start timing until the bot is started
+                waiting.append((runner, time.time() + time_limit))
+
+        while waiting:
+            now = time.time()
+            still_waiting = []
+            for runner, deadline in waiting:
+                if self.poll_runner(runner):
+                    if runner.is_alive:
+                        runner.pause()
+                elif now >= deadline:
+                    if runner.is_alive:
+                        runner.pause()
+                    self.time_out_runner(runner)
+                else:
+                    still_waiting.append((runner, deadline))
+            waiting = still_waiting
+
+            if waiting:
+                # a crashed bot's output ends before it can be seen dead, so wake up now and then to check on it
+                yield min(min(deadline for runner, deadline in waiting), time.time() + CRASH_CHECK_INTERVAL)
+
+    @staticmethod
+    def sleep(seconds):
+        """
+        The coroutine that waits for some time without blocking the other games
+
+        :param seconds: the time to wait
+        :type seconds: float
+        """
+        wake_time = time.time() + seconds
+        while time.time() < wake_time:
+            yield wake_time
+
+
+class GameScheduler(object):
+    def __init__(self, max_concurrent_games=None):
+        """
+        Runs the games of many AsyncEngines at the same time in this thread. Whenever a bot of any of the games sends
+        output, or the wake time of a game passes, the games are resumed until they wait for their bots again, so the
+        rules of one game are played while the bots of the other games think.
+        Every game keeps its own logs and replay, as given in the options of its engine.
+
+        :param max_concurrent_games: the most games to run at the same time, None for no limit
+        :type max_concurrent_games: int
+        """
+        self.max_concurrent_games = max_concurrent_games
+        # one event for all of the bots, so output of any bot wakes the scheduler up
+        self.ready_event = Event()
+
+    def run(self, engines, on_game_over=None):
+        """
+        Runs the games. A game is only started once there's room for it, so the engines may be created lazily.
+
+        :param engines: the engines of the games
+        :type engines: collections.Iterable[AsyncEngine]
+        :param on_game_over: called with the number of each game, in the order of the engines, and its replay data
+                             once the game is over
+        :type on_game_over: (int, dict) -> None
+        :return: the replay data of each game, in the order of the engines
+        :rtype: list[dict]
+        """
+        ready_event = self.ready_event
+        pending_engines = iter(engines)
+        results = []
+        # the number, engine, coroutine and wake time of each running game
+        running = []
+        while True:
+            while self.max_concurrent_games is None or len(running) < self.max_concurrent_games:
+                engine = next(pending_engines, None)
+                if engine is None:
+                    break
+                engine.ready_event = ready_event
+                running.append([len(results), engine, engine.play(), 0.0])
+                results.append(None)
+            if not running:
+                break
+
+            # clear before resuming, so output that arrives while the games run wakes the wait below
+            ready_event.clear()
+            still_running = []
+            for game in running:
+                game_number, engine, coroutine, wake_time = game
+                try:
+                    game[3] = next(coroutine)
+                    still_running.append(game)
+                except StopIteration:
+                    results[game_number] = engine.result
+                    if on_game_over:
+                        on_game_over(game_number, engine.result)
+            # if a game is over, start the next games right away
+            game_over = len(still_running) < len(running)
+            running = still_running
+
+            if running and not game_over:
+                ready_event.wait(max(0.0, min(wake_time for _, _, _, wake_time in running) - time.time()))
+
+        return results
+
+
+def run_games(engines, max_concurrent_games=None):
+    """
+    Runs the games of many engines at the same time in this thread, see GameScheduler
+
+    :param engines: the engines of the games
+    :type engines: list[AsyncEngine]
+    :param max_concurrent_games: the most games to run at the same time, None for no limit
+    :type max_concurrent_games: int
+    :return: the replay data of each game
+    :rtype: list[dict]
+    """
+    return GameScheduler(max_concurrent_games).run(engines)
+
 
 def run_game(game, bot_paths, options):
     """
@@ -0,0 +1,369 @@
+"""
+A reset/step environment around PiratesGame, for training learning bots on the engine itself. One player is controlled
+with a discrete action per pirate, the other players are played by opponent functions, and the observations are NumPy
+planes that are updated with the changes of each turn.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from operator import attrgetter
+
+from pirates import PiratesGame
+
+# the observation planes, the pirate planes come first
+PIRATE_PLANES = ('my_pirates', 'enemy_pirates', 'carried_treasures', 'turns_to_sober', 'reload_turns',
+                 'defense_reload_turns', 'defense_expiration_turns', 'cloak_turns', 'attack_powerup_turns',
+                 'rob_powerup_turns', 'speed_powerup_turns')
+MAP_OBJECT_PLANES = ('treasures', 'attack_powerups', 'rob_powerups', 'speed_powerups', 'scripts', 'anti_scripts',
+                     'my_bermuda_zones', 'enemy_bermuda_zones')
+OBSERVATION_PLANES = PIRATE_PLANES + MAP_OBJECT_PLANES
+
+# the actions a pirate can take, move actions go a single step
+ACTIONS = ('stay', 'north', 'east', 'south', 'west', 'attack', 'defense', 'cloak', 'bermuda')
+MOVE_ACTIONS = {'north': (-1, 0), 'east': (0, 1), 'south': (1, 0), 'west': (0, -1)}
+
+# the plane of each powerup type
+POWERUP_PLANES = {'AttackPowerup': 'attack_powerups', 'RobPowerup': 'rob_powerups', 'SpeedPowerup': 'speed_powerups'}
+
+get_pirate_timers = attrgetter('turns_to_sober', 'reload_turns', 'defense_reload_turns', 'defense_expiration_turns',
+                               'cloak_turns', 'attack_powerup_active_turns', 'rob_powerup_active_turns',
+                               'speed_powerup_active_turns')
+
+# the other players' pirates are drawn only with what get_player_state tells the player about them: their cloak turns
+# aren't sent, and their powerups are sent without the turns left, so they are drawn as 1 while active
+HIDDEN_ENEMY_PLANES = [PIRATE_PLANES.index('cloak_turns')]
+ACTIVE_ENEMY_PLANES = [PIRATE_PLANES.index(plane) for plane in ('attack_powerup_turns', 'rob_powerup_turns',
+                                                                  'speed_powerup_turns')]
+
+
+class ObservationEncoder(object):
+    """
+    Encodes a player's view of a game as planes of shape (len(OBSERVATION_PLANES), rows, cols).
+    The encoder remembers what it drew: each update only erases and redraws the squares of the living pirates, draws
+    the map objects that appeared and erases the map objects that went away.
+    """
+    def __init__(self, game, player_id):
+        """
+        :param game: the game to encode
+        :type game: PiratesGame
+        :param player_id: the id of the player whose view is encoded
+        :type player_id: int
+        """
+        if numpy is None:
+            raise ImportError('NumPy is required for the environment')
+        self.game = game
+        """:type : PiratesGame"""
+        self.player_id = player_id
+        """:type : int"""
+        self.planes = numpy.zeros((len(OBSERVATION_PLANES), game.height, game.width), dtype=numpy.float32)
+        """:type : numpy.ndarray"""
+        # the squares of the pirates drawn by the last update
+        self.pirate_rows = None
+        """:type : numpy.ndarray"""
+        self.pirate_cols = None
+        """:type : numpy.ndarray"""
+        # whether each treasure is drawn
+        self.drawn_treasures = []
+        """:type : list[bool]"""
+        # the drawn powerups, scripts and anti scripts with their planes
+        self.drawn_objects = {}
+        """:type : dict[MapObject, int]"""
+        # the amount of the game's bermuda zones that were looked at, and the drawn zones
+        self.seen_bermuda_zones = 0
+        """:type : int"""
+        self.drawn_bermuda_zones = []
+        """:type : list[BermudaZone]"""
+
+    def reset(self):
+        """
+        Encodes the game from scratch, used when the game was restored or started over.
+
+        :return: the planes
+        :rtype: numpy.ndarray
+        """
+        game = self.game
+        self.planes[:] = 0
+        self.pirate_rows = self.pirate_cols = None
+        self.drawn_treasures = [False] * len(game.treasures)
+        self.drawn_objects = {}
+        self.seen_bermuda_zones = 0
+        self.drawn_bermuda_zones = []
+        return self.update()
+
+    def update(self):
+        """
+        Updates the planes with the changes since the last update.
+
+        :return: the planes
+        :rtype: numpy.ndarray
+        """
+        self.update_pirates()
+        self.update_treasures()
+        self.update_map_objects()
+        self.update_bermuda_zones()
+        return self.planes
+
+    def update_pirates(self):
+        """
+        Erases the pirates drawn by the last update and draws the living pirates.
+
+        """
+        pirate_planes = self.planes[:len(PIRATE_PLANES)]
+        if self.pirate_rows is not None:
+            pirate_planes[:, self.pirate_rows, self.pirate_cols] = 0
+
+        player_id = self.player_id
+        values = numpy.array([(pirate.location.row, pirate.location.col, pirate.owner.id == player_id,
+                               pirate.owner.id != player_id, pirate.treasure.value if pirate.treasure else 0) +
+                              get_pirate_timers(pirate) for pirate in self.game.living_pirates],
+                             dtype=numpy.int64).reshape(-1, len(PIRATE_PLANES) + 2)
+        self.pirate_rows = values[:, 0]
+        self.pirate_cols = values[:, 1]
+        # the values of the planes start at column 2
+        enemy_rows = numpy.flatnonzero(values[:, 3])
+        values[numpy.ix_(enemy_rows, [plane + 2 for plane in HIDDEN_ENEMY_PLANES])] = 0
+        active = numpy.ix_(enemy_rows, [plane + 2 for plane in ACTIVE_ENEMY_PLANES])
+        values[active] = numpy.minimum(values[active], 1)
+        # pirates may share a square, so their values are added up
+        numpy.add.at(pirate_planes, (slice(None), self.pirate_rows, self.pirate_cols), values[:, 2:].T)
+
+    def update_treasures(self):
+        """
+        Draws the treasures that became available and erases the treasures that were taken.
+
+        """
+        plane = self.planes[OBSERVATION_PLANES.index('treasures')]
+        drawn_treasures = self.drawn_treasures
+        for index, treasure in enumerate(self.game.treasures):
+            if treasure.is_available != drawn_treasures[index]:
+                drawn_treasures[index] = treasure.is_available
+                location = treasure.initial_location
+                plane[location.row, location.col] += treasure.value if treasure.is_available else -treasure.value
+
+    def update_map_objects(self):
+        """
+        Draws the powerups, scripts and anti scripts that appeared on the map and erases the ones that went away.
+
+        """
+        game = self.game
+        planes = self.planes
+        schedule = game.schedule
+        on_map = {}
+        for powerup in schedule.get_active('powerups', game.turn):
+            on_map[powerup] = OBSERVATION_PLANES.index(POWERUP_PLANES[powerup.__class__.__name__])
+        for kind in ('scripts', 'anti_scripts'):
+            plane = OBSERVATION_PLANES.index(kind)
+            for script in schedule.get_active(kind, game.turn):
+                on_map[script] = plane
+
+        drawn_objects = self.drawn_objects
+        for map_object, plane in drawn_objects.items():
+            if map_object not in on_map:
+                planes[plane, map_object.location.row, map_object.location.col] -= 1
+                del drawn_objects[map_object]
+        for map_object, plane in on_map.iteritems():
+            if map_object not in drawn_objects:
+                planes[plane, map_object.location.row, map_object.location.col] += 1
+                drawn_objects[map_object] = plane
+
+    def update_bermuda_zones(self):
+        """
+        Draws the bermuda zones that were summoned and erases the ones that ran out.
+
+        """
+        bermuda_zones = self.game.bermuda_zones
+        still_drawn = []
+        for bermuda_zone in self.drawn_bermuda_zones:
+            if bermuda_zone.active_turns > 0:
+                still_drawn.append(bermuda_zone)
+            else:
+                self.draw_bermuda_zone(bermuda_zone, -1)
+        for bermuda_zone in bermuda_zones[self.seen_bermuda_zones:]:
+            if bermuda_zone.active_turns > 0:
+                self.draw_bermuda_zone(bermuda_zone, 1)
+                still_drawn.append(bermuda_zone)
+        self.seen_bermuda_zones = len(bermuda_zones)
+        self.drawn_bermuda_zones = still_drawn
+
+    def draw_bermuda_zone(self, bermuda_zone, value):
+        """
+        Adds value to the squares of a bermuda zone.
+
+        :param bermuda_zone: the zone to draw
+        :type bermuda_zone: BermudaZone
+        :param value: the value to add, 1 to draw the zone and -1 to erase it
+        :type value: int
+        """
+        game = self.game
+        offsets = numpy.array(game.neighbourhood_offsets(bermuda_zone.radius), dtype=numpy.int64).reshape(-1, 2)
+        rows = bermuda_zone.center.row + offsets[:, 0]
+        cols = bermuda_zone.center.col + offsets[:, 1]
+        if game.cyclic:
+            rows %= game.height
+            cols %= game.width
+        else:
+            on_map = (rows >= 0) & (rows < game.height) & (cols >= 0) & (cols < game.width)
+            rows = rows[on_map]
+            cols = cols[on_map]
+        plane = 'my_bermuda_zones' if bermuda_zone.owner == self.player_id else 'enemy_bermuda_zones'
+        self.planes[OBSERVATION_PLANES.index(plane), rows, cols] += value
+
+
+class PiratesEnvironment(object):
+    """
+    A reset/step environment for one player of a PiratesGame. The other players are played by opponent functions, that
+    get the game and their player id and return the orders of their turn like PiratesGame.do_moves takes them.
+    """
+    def __init__(self, options, player_id=0, opponents=None, game_class=PiratesGame):
+        """
+        :param options: the game options
+        :type options: dict
+        :param player_id: the id of the player that the actions control
+        :type player_id: int
+        :param opponents: the function that plays each of the other players, by player id. Players without one give no
+        orders
+        :type opponents: dict[int, (PiratesGame, int) -> list[dict[str, any]]]
+        :param game_class: the game class, e.g. VectorizedPiratesGame
+        :type game_class: type
+        """
+        self.game = game_class(dict(options))
+        """:type : PiratesGame"""
+        self.game.start_game()
+        self.initial_snapshot = self.game.snapshot()
+        """:type : GameSnapshot"""
+        self.player_id = player_id
+        """:type : int"""
+        self.opponents = opponents or {}
+        """:type : dict[int, function]"""
+        self.encoder = ObservationEncoder(self.game, player_id)
+        """:type : ObservationEncoder"""
+        # the amount of pirates each player has, there is an action for each of them
+        self.num_pirates = len(self.game.players[player_id].all_pirates)
+        """:type : int"""
+        # the score lead of the player after the last step, the reward is the change of the lead
+        self.lead = 0
+        """:type : int"""
+        self.done = True
+        """:type : bool"""
+
+    @property
+    def observation_shape(self):
+        """The shape of the observations"""
+        return self.encoder.planes.shape
+
+    @property
+    def num_actions(self):
+        """The amount of actions each pirate has"""
+        return len(ACTIONS)
+
+    def reset(self):
+        """
+        Starts a new game.
+
+        :return: the first observation. The observation array is updated in place by the following steps, so copy it to
+        keep it
+        :rtype: numpy.ndarray
+        """
+        self.game.restore(self.initial_snapshot)
+        self.game.start_turn()
+        self.lead = self.get_lead()
+        self.done = False
+        return self.encoder.reset()
+
+    def step(self, actions):
+        """
+        Plays a turn.
+
+        :param actions: the index in ACTIONS of the action of each of the player's pirates, by pirate id
+        :type actions: list[int] | numpy.ndarray
+        :return: the observation, the reward, whether the game ended and a dict with the turn, the scores and the reason
+        the game ended
+        :rtype: (numpy.ndarray, float, bool, dict[str, any])
+        """
+        if self.done:
+            raise RuntimeError('the game ended, reset the environment to start a new one')
+        game = self.game
+        for player in game.players:
+            if player.id == self.player_id:
+                orders = self.get_orders(actions)
+            elif player.id in self.opponents:
+                orders = self.opponents[player.id](game, player.id)
+            else:
+                orders = []
+            game.do_moves(player.id, orders)
+        game.finish_turn()
+
+        if game.game_over() or game.turn >= game.max_turns:
+            game.finish_game()
+            self.done = True
+        else:
+            game.start_turn()
+        lead = self.get_lead()
+        reward = float(lead - self.lead)
+        self.lead = lead
+        info = {'turn': game.turn, 'scores': game.score, 'end_of_game_reason': game.end_of_game_reason}
+        return self.encoder.update(), reward, self.done, info
+
+    def get_lead(self):
+        """
+        Returns the player's score lead over the best of the other players.
+
+        :rtype: int
+        """
+        scores = self.game.score
+        return scores[self.player_id] - max(score for player_id, score in enumerate(scores)
+                                            if player_id != self.player_id)
+
+    def get_orders(self, actions):
+        """
+        Turns the actions of the player's pirates into orders. Moves out of a non cyclic map and attacks without an
+        enemy in range are left out.
+
+        :param actions: the index in ACTIONS of the action of each of the player's pirates, by pirate id
+        :type actions: list[int] | numpy.ndarray
+        :return: the orders, like PiratesGame.do_moves takes them
+        :rtype: list[dict[str, any]]
+        """
+        game = self.game
+        orders = []
+        for pirate_id, action_index in enumerate(actions):
+            action = ACTIONS[int(action_index)]
+            pirate = game.get_living_pirate(self.player_id, pirate_id)
+            if pirate is None or action == 'stay':
+                continue
+            order_args = {}
+            if action in MOVE_ACTIONS:
+                d_row, d_col = MOVE_ACTIONS[action]
+                row, col = pirate.location.row + d_row, pirate.location.col + d_col
+                if game.cyclic:
+                    row, col = row % game.height, col % game.width
+                elif not (0 <= row < game.height and 0 <= col < game.width):
+                    continue
+                action = 'move'
+                order_args = {'destination': [row, col]}
+            elif action == 'attack':
+                target = self.get_attack_target(pirate)
+                if target is None:
+                    continue
+                order_args = {'target': target.id}
+            orders.append({'type': 'order', 'order_type': action, 'acting_pirate': pirate_id,
+                           'order_args': order_args})
+        return orders
+
+    def get_attack_target(self, pirate):
+        """
+        Returns the closest enemy pirate in the pirate's attack radius.
+
+        :param pirate: the attacking pirate
+        :type pirate: Pirate
+        :return: the target, or None if no enemy is in range
+        :rtype: Pirate
+        """
+        in_range = [game_pirate for game_pirate in self.game.living_pirates if game_pirate.owner.id != self.player_id
+                    and self.game.in_circle(pirate.location, pirate.attack_radius, game_pirate.location)]
+        if not in_range:
+            return None
+        return min(in_range, key=lambda target: ((target.location.row - pirate.location.row) ** 2 +
+                                                 (target.location.col - pirate.location.col) ** 2, target.id))
@@ -0,0 +1,288 @@
+"""
+The headless match mode, runs trusted Python bots inside the engine's process.
+The bots are loaded with the python runner's BotController and get a Pirates object that is updated straight from the
+game's state, without sandboxes, pipes or JSON. The turn time is enforced with a timer, and there are no logs or replay
+files.
+"""
+import os
+import random
+import signal
+import sys
+import threading
+import time
+import traceback
+
+from engine import Engine, Runner, RunnerFactory
+from pythonRunner import Pirates, BotController, DEFAULT_BOT_FILE
+
+
+class TurnTimeout(Exception):
+    """
+    Raised in a bot's code when its turn time is up.
+    """
+    pass
+
+
+def _raise_turn_timeout(signum, frame):
+    raise TurnTimeout()
+
+
+class TurnTimer(object):
+    """
+    Interrupts the code it guards with a TurnTimeout once the time is up. The timer uses SIGALRM, so it only interrupts
+    the code in the main thread on platforms that have it, elsewhere the time is only checked once the code is done.
+    Bots may catch the TurnTimeout, so the timer also remembers whether the time ran out.
+    """
+    def __init__(self, time_limit):
+        """
+        :param time_limit: the time the code has, in seconds
+        :type time_limit: float
+        """
+        self.time_limit = time_limit
+        """:type : float"""
+        self.start_time = None
+        """:type : float"""
+        self.expired = False
+        """:type : bool"""
+        self._previous_handler = None
+
+    @staticmethod
+    def can_interrupt():
+        """
+        Returns whether the timer can interrupt the code in the current thread.
+
+        :rtype: bool
+        """
+        return hasattr(signal, 'setitimer') and isinstance(threading.current_thread(), threading._MainThread)
+
+    def __enter__(self):
+        self.start_time = time.time()
+        if self.can_interrupt():
+            self._previous_handler = signal.signal(signal.SIGALRM, _raise_turn_timeout)
+            signal.setitimer(signal.ITIMER_REAL, max(self.time_limit, 1e-6))
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self._previous_handler is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, self._previous_handler)
+            self._previous_handler = None
+        if exc_type is TurnTimeout or time.time() - self.start_time > self.time_limit:
+            self.expired = True
+        # the timeout is reported through expired
+        return exc_type is TurnTimeout
+
+
+class InProcessRunner(Runner):
+    def __init__(self, bot, name, game_id, max_debug_length, max_debug_count):
+        """
+        A runner for a Python bot that runs in the engine's process
+
+        :param bot: the bot
+        :type bot: BotController
+        :param name: the name of the bot
+        :type name: str
+        :param game_id: the id of the runner
+        :type game_id: int
+        :param max_debug_length: the max length of the debug messages amount
+        :type max_debug_length: int
+        :param max_debug_count: the max size of the memory the debug msgs takes
+        :type max_debug_count: int
+        """
+        super(InProcessRunner, self).__init__(None, name, game_id, max_debug_length, max_debug_count)
+        self.bot = bot
+        """:type : BotController"""
+        self.pirates = Pirates()
+        """:type : Pirates"""
+        # the last message sent to the bot, that it didn't handle yet
+        self.message = None
+        """:type : dict[str, any]"""
+        # the bot's reply to the last message, until it's received
+        self.reply = None
+        """:type : dict[str, any]"""
+        # the lines of the errors the bot raised, until they're read
+        self.errors = []
+        """:type : list[str]"""
+        # the state of the random module as the bot left it. The bots share the engine's random module, so each bot's
+        # state is put in place for its turns, the way the module of the bot's own process would be
+        self.random_state = None
+        """:type : tuple"""
+        self._is_alive = True
+
+    @property
+    def is_alive(self):
+        """Whether the bot is still running, a bot stops running once it raises an error out of a turn"""
+        return self._is_alive
+
+    def send(self, data):
+        """
+        Sends a message to the bot, it's handled by the next call to play
+        """
+        self.message = data
+
+    def recv(self):
+        """
+        Receives the bot's reply to the last message
+
+        :return: the reply, or None if there is none
+        :rtype: dict
+        """
+        reply = self.reply
+        self.reply = None
+        return reply
+
+    def play(self, time_limit):
+        """
+        Lets the bot handle the last message sent to it
+
+        :param time_limit: the time the bot has to handle the message, in seconds
+        :type time_limit: float
+        :return: whether the bot handled the message in time
+        :rtype: bool
+        """
+        message = self.message
+        self.message = None
+        if message is None or not self._is_alive:
+            return False
+        timer = TurnTimer(time_limit)
+        engine_random_state = random.getstate()
+        try:
+            if self.random_state is not None:
+                random.setstate(self.random_state)
+            with timer:
+                self.pirates._handle_message(message, self.bot)
+            if message['type'] == 'setup':
+                # seeded like the python runner seeds the random module of the bot's process
+                random.seed(self.pirates.player_seed)
+        except TurnTimeout:
+            # the time ran out just as the bot was done
+            return False
+        except Exception:
+            self.errors.extend(traceback.format_exc().splitlines())
+            self._is_alive = False
+            return False
+        finally:
+            self.random_state = random.getstate()
+            random.setstate(engine_random_state)
+        if timer.expired:
+            return False
+        self.reply = {'type': 'bot_orders', 'data': self.pirates._get_reply()}
+        return True
+
+    def read_error(self):
+        """
+        Reads a line of the bot's errors
+
+        :return: the line, or None if there are no errors
+        :rtype: str
+        """
+        if not self.errors:
+            return None
+        return self.errors.pop(0)
+
+    def read_line(self):
+        return None
+
+    def set_ready_event(self, event):
+        pass
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    def kill(self):
+        self._is_alive = False
+
+    def release(self):
+        pass
+
+
+def load_bot(bot_path, module_name):
+    """
+    Loads a Python bot like the python runner does, but under a module name of its own
+
+    :param bot_path: the path to the bot file or directory
+    :type bot_path: str
+    :param module_name: the name to load the bot's module as
+    :type module_name: str
+    :return: the bot
+    :rtype: BotController
+    """
+    if os.path.isdir(bot_path):
+        bot_directory = bot_path
+        bot_path = os.path.join(bot_path, DEFAULT_BOT_FILE)
+    else:
+        bot_directory = os.path.dirname(bot_path)
+    if bot_directory not in sys.path:
+        sys.path.append(bot_directory)
+    return BotController(bot_path, module_name=module_name)
+
+
+class HeadlessEngine(Engine):
+    # numbers the loaded bots, so every bot gets a module of its own
+    bots_loaded = 0
+
+    def __init__(self, bot_paths, options, game):
+        """
+        An engine that runs trusted Python bots in its own process, with no logs and no replay file.
+        The bots run one after the other, each one interrupted once its turn time is up.
+
+        :param bot_paths: the paths of the bots
+        :type bot_paths: list[tuple(file)]
+        :param options: the options for the engine
+        :type options: dict
+        :param game: the game object
+        :type game: Game.game
+        """
+        options = dict(options)
+        for log_option in ('replay_log', 'stream_log', 'verbose_log', 'debug_log', 'regression_output_path'):
+            options[log_option] = None
+        for logs_option in ('input_logs', 'output_logs', 'error_logs'):
+            options.pop(logs_option, None)
+        options['end_wait'] = 0.0
+        # the bots get the state as it is, so there's nothing to gain from the other protocols
+        options['state_protocol'] = None
+        options['wire_protocol'] = None
+        super(HeadlessEngine, self).__init__(bot_paths, options, game)
+
+    def create_runners(self):
+        """
+        Loads the bots and creates their runners
+        """
+        id_counter = 0
+        for bot_id, (bot_cwd, bot_path, bot_name) in enumerate(self.bot_paths):
+            try:
+                if RunnerFactory.recognize_language(bot_path) != 'python':
+                    raise RuntimeError('bot %s is not a Python bot, only Python bots can run headless' % bot_name)
+                HeadlessEngine.bots_loaded += 1
+                bot = load_bot(bot_path, 'headless_bot_%d' % HeadlessEngine.bots_loaded)
+                runner = InProcessRunner(bot, bot_name, id_counter,
+                                         max_debug_length=self.debug_max_length,
+                                         max_debug_count=self.debug_max_count)
+                self.runners.append(runner)
+                id_counter += 1
+
+            # if loading the bot failed
+            except Exception as e:
+                self.game.kill_player(bot_id)
+                sys.stderr.write('Failed to load bot %s: %s\n' % (bot_name, e))
+
+    def get_moves(self, runners, time_limit):
+        """
+        Runs the turns of the bots, one after the other.
+
+        :param runners: the live runners in the turn
+        :type runners: list[InProcessRunner]
+        :param time_limit: the time limit for each runner
+        :type: int
+        """
+        start_time = time.time()
+        for runner in runners:
+            if not self.game.is_alive(runner.game_id):
+                continue
+            runner.play(time_limit)
+            if not self.poll_runner(runner):
+                self.time_out_runner(runner)
+        return time.time() - start_time
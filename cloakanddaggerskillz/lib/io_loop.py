@@ -0,0 +1,320 @@
+"""
+A single poll based I/O loop, used by the sandboxes to multiplex the pipes of all of the bots in one thread
+instead of starting reader and writer threads for every bot.
+"""
+import errno
+import os
+import select
+import sys
+import traceback
+from threading import Thread, Lock
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+READ_SIZE = 65536
+
+_io_loop = None
+_io_loop_lock = Lock()
+
+
+def get_io_loop():
+    """
+    Returns the I/O loop of the process, starting it on the first call.
+
+    :return: the I/O loop, or None if the platform can't poll pipes (Windows)
+    :rtype: IOLoop
+    """
+    global _io_loop
+    if not hasattr(select, 'poll') or fcntl is None:
+        return None
+    with _io_loop_lock:
+        if _io_loop is None:
+            _io_loop = IOLoop()
+        return _io_loop
+
+
+def set_nonblocking(fd):
+    """
+    Makes reads and writes of a file descriptor return immediately instead of blocking.
+
+    :param fd: the file descriptor
+    :type fd: int
+    """
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+
+class Channel(object):
+    """
+    A file descriptor watched by the loop, either read line by line or written from a buffer.
+    """
+    def __init__(self, fd, on_line=None, on_close=None, on_error=None):
+        """
+        :param fd: the file descriptor
+        :type fd: int
+        :param on_line: called with each line read, without the newline. None for a channel that is written
+        :type on_line: (str) -> None
+        :param on_close: called once the end of the input is reached
+        :type on_close: () -> None
+        :param on_error: called if writing fails
+        :type on_error: () -> None
+        """
+        self.fd = fd
+        """:type : int"""
+        self.on_line = on_line
+        """:type : (str) -> None"""
+        self.on_close = on_close
+        """:type : () -> None"""
+        self.on_error = on_error
+        """:type : () -> None"""
+        # the start of a line that hasn't ended yet
+        self.partial_line = ''
+        """:type : str"""
+        # the data waiting to be written
+        self.pending = []
+        """:type : list[str]"""
+        self.lock = Lock()
+        """:type : Lock"""
+        self.closed = False
+        """:type : bool"""
+
+
+class IOLoop(object):
+    """
+    Polls every registered file descriptor in one thread. Lines read are passed to the reader's callback in the loop's
+    thread, and writes never block - data that doesn't fit in a pipe is kept in the channel's buffer and written once
+    the pipe can take it.
+    """
+    def __init__(self):
+        self.channels = {}
+        """:type : dict[int, Channel]"""
+        self.lock = Lock()
+        """:type : Lock"""
+        # the file descriptors whose polling has to be updated by the loop's thread
+        self.changed_fds = set()
+        """:type : set[int]"""
+        # a pipe used to wake the loop up when the registrations change
+        self.wake_read, self.wake_write = os.pipe()
+        set_nonblocking(self.wake_read)
+        set_nonblocking(self.wake_write)
+        self.poller = select.poll()
+        self.poller.register(self.wake_read, select.POLLIN)
+        self.registered = {}
+        """:type : dict[int, int]"""
+
+        thread = Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    def add_reader(self, fd, on_line, on_close):
+        """
+        Starts reading a file descriptor line by line.
+
+        :param fd: the file descriptor
+        :type fd: int
+        :param on_line: called in the loop's thread with each line read, without the newline
+        :type on_line: (str) -> None
+        :param on_close: called in the loop's thread once the end of the input is reached
+        :type on_close: () -> None
+        """
+        set_nonblocking(fd)
+        self._add(Channel(fd, on_line=on_line, on_close=on_close))
+
+    def add_writer(self, fd, on_error):
+        """
+        Registers a file descriptor to be written with write.
+
+        :param fd: the file descriptor
+        :type fd: int
+        :param on_error: called if writing fails, e.g. the reading side was closed
+        :type on_error: () -> None
+        """
+        set_nonblocking(fd)
+        self._add(Channel(fd, on_error=on_error))
+
+    def remove(self, fd):
+        """
+        Stops watching a file descriptor, data that wasn't written yet is dropped.
+
+        :param fd: the file descriptor
+        :type fd: int
+        """
+        with self.lock:
+            channel = self.channels.pop(fd, None)
+            if channel is None:
+                return
+            channel.closed = True
+            self.changed_fds.add(fd)
+        self._wake()
+
+    def write(self, fd, data):
+        """
+        Writes data to a file descriptor registered with add_writer without blocking.
+
+        :param fd: the file descriptor
+        :type fd: int
+        :param data: the data to write
+        :type data: str
+        :return: whether the file descriptor is still registered
+        :rtype: bool
+        """
+        channel = self.channels.get(fd)
+        if channel is None or channel.closed:
+            return False
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        with channel.lock:
+            channel.pending.append(data)
+            was_pending = len(channel.pending) > 1
+        if not was_pending:
+            # try to write right away, the loop only polls for the rest
+            self._flush(channel)
+        return True
+
+    def _add(self, channel):
+        with self.lock:
+            self.channels[channel.fd] = channel
+            self.changed_fds.add(channel.fd)
+        self._wake()
+
+    def _wake(self):
+        try:
+            os.write(self.wake_write, 'x')
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def _update_registrations(self):
+        with self.lock:
+            changed_fds = self.changed_fds
+            self.changed_fds = set()
+            channels = [(fd, self.channels.get(fd)) for fd in changed_fds]
+        for fd, channel in channels:
+            if channel is None:
+                mask = 0
+            elif channel.on_line is not None:
+                mask = select.POLLIN
+            else:
+                with channel.lock:
+                    mask = select.POLLOUT if channel.pending else 0
+            if mask == self.registered.get(fd, 0):
+                continue
+            if mask:
+                self.poller.register(fd, mask)
+                self.registered[fd] = mask
+            else:
+                try:
+                    self.poller.unregister(fd)
+                except KeyError:
+                    pass
+                del self.registered[fd]
+
+    def _run(self):
+        while True:
+            self._update_registrations()
+            try:
+                events = self.poller.poll()
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+            for fd, event in events:
+                if fd == self.wake_read:
+                    self._drain_wake_pipe()
+                    continue
+                channel = self.channels.get(fd)
+                if channel is None:
+                    continue
+                # the loop serves every sandbox in the process, so a callback that raises only stops its own channel
+                try:
+                    if channel.on_line is not None:
+                        self._read(channel)
+                    elif event & (select.POLLERR | select.POLLHUP | select.POLLNVAL):
+                        self._fail(channel)
+                    else:
+                        self._flush(channel)
+                except Exception:
+                    self._abort(channel)
+
+    def _drain_wake_pipe(self):
+        try:
+            while os.read(self.wake_read, READ_SIZE):
+                pass
+        except OSError as e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+
+    def _read(self, channel):
+        try:
+            data = os.read(channel.fd, READ_SIZE)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            data = ''
+        if not data:
+            # end of input, pass on the last line even if it didn't end
+            if channel.partial_line:
+                channel.on_line(channel.partial_line)
+            self.remove(channel.fd)
+            channel.on_close()
+            return
+        lines = (channel.partial_line + data).split('\n')
+        channel.partial_line = lines.pop()
+        for line in lines:
+            channel.on_line(line)
+
+    def _flush(self, channel):
+        failed = False
+        with channel.lock:
+            while channel.pending and not channel.closed:
+                data = channel.pending[0]
+                try:
+                    written = os.write(channel.fd, data)
+                except OSError as e:
+                    if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                        break
+                    failed = True
+                    break
+                if written < len(data):
+                    channel.pending[0] = data[written:]
+                else:
+                    channel.pending.pop(0)
+            is_pending = bool(channel.pending)
+        if failed:
+            self._fail(channel)
+            return
+        # poll for the rest, or stop polling once everything was written
+        if is_pending != (channel.fd in self.registered):
+            with self.lock:
+                self.changed_fds.add(channel.fd)
+            self._wake()
+
+    def _fail(self, channel):
+        with channel.lock:
+            channel.pending = []
+        self.remove(channel.fd)
+        channel.on_error()
+
+    def _abort(self, channel):
+        """
+        Stops a channel whose handling raised an exception, after printing the exception. The channel is closed the
+        way its end of input or a failed write would close it, unless it was already closed.
+
+        :param channel: the channel
+        :type channel: Channel
+        """
+        sys.stderr.write('I/O loop error on file descriptor %d\n%s' % (channel.fd, traceback.format_exc()))
+        if channel.closed:
+            # the callback that raised was the channel's on_close or on_error
+            return
+        try:
+            if channel.on_line is not None:
+                self.remove(channel.fd)
+                channel.on_close()
+            else:
+                self._fail(channel)
+        except Exception:
+            sys.stderr.write('I/O loop error on file descriptor %d\n%s' % (channel.fd, traceback.format_exc()))
@@ -3,8 +3,9 @@ This is the main game file, holding practically all of the in-game logic and rul
 """
 # !/usr/bin/env python
 from __future__ import print_function
-from random import randint, seed
+from random import Random
 from collections import defaultdict
+from operator import attrgetter, itemgetter
 
 from MyExceptions import InvalidOrderFormatException, PirateAlreadyActedException, IgnoredOrderException, \
     InvalidOrderException, StepLimitExceededException
@@ -12,9 +13,16 @@ from PirateClass import BasePirate
 from PlayerClass import BasePlayer
 from MapObject import MapObject
 from LocationClass import Location
+from SpatialIndex import SpatialIndex
+from History import ChangeHistory
+from Schedule import TurnSchedule
+from MapGrid import MapGrid
+import Directions
 from game import Game
 MAX_RAND = 2147483647
 
+is_treasure_available = attrgetter('is_available')
+
 
 PIRATES = 0
 LAND = -1
@@ -35,6 +43,44 @@ AIM = {'n': Location(-1, 0),
        'd': Location(0, 0),
        'f': Location(0, 0)}
 
+# the values of a pirate that change during the game, saved by PiratesGame.snapshot
+PIRATE_STATE_FIELDS = ('location', 'is_lost', 'turns_to_revive', 'reload_turns', 'defense_reload_turns',
+                       'defense_expiration_turns', 'turns_to_sober', 'cloak_turns', 'treasure', 'attack_radius',
+                       'carry_treasure_speed', 'attack_powerup_active_turns', 'rob_powerup_active_turns',
+                       'speed_powerup_active_turns', 'die_turn', 'reason_of_death')
+# the histories of a pirate, they are only appended to during the game so a snapshot only keeps their lengths
+PIRATE_HISTORY_FIELDS = ('attack_turns', 'defense_turns', 'drink_turns', 'orders', 'drink_history',
+                         'treasure_history', 'attack_radius_history', 'rob_powerup_history', 'speed_powerup_history')
+
+# the values of a single life of a pirate, a pirate keeps those of its previous lives in Pirate.incarnations
+PIRATE_LIFE_FIELDS = ('spawn_index', 'spawn_turn', 'die_turn', 'reason_of_death', 'orders', 'attack_turns',
+                      'defense_turns', 'drink_turns', 'treasure_history', 'drink_history', 'attack_radius_history',
+                      'rob_powerup_history', 'speed_powerup_history')
+
+# the countdowns and powerup values of a living pirate that the players are sent every turn
+PIRATE_COUNTER_FIELDS = ('turns_to_sober', 'reload_turns', 'defense_reload_turns', 'defense_expiration_turns',
+                         'carry_treasure_speed', 'attack_radius')
+
+# the phases that play the orders at the end of a turn, in order. Each one is a method of PiratesGame
+TURN_PHASES = ('do_orders',  # moves the pirates on the map
+               'do_sober',  # handles drunk history and removes drunk pirates who are sober
+               'do_attack',  # handles attacking pirates
+               'do_defense',  # handles defending pirates
+               'do_cloak',  # handles cloaking pirates
+               # kills all pirates in bermuda zone if they do not belong to the player who summoned it, and updates
+               # bermuda zone counter
+               'do_bermuda_effect',
+               'do_treasures',  # handles treasure - collecting and unloading
+               'do_powerups',  # handles powerups
+               'do_scripts',  # handles scripts
+               'do_spawn',  # spawns new pirates
+               'record_turn_scores')
+
+get_pirate_state = attrgetter(*PIRATE_STATE_FIELDS)
+get_pirate_histories = attrgetter(*PIRATE_HISTORY_FIELDS)
+get_pirate_life = attrgetter(*PIRATE_LIFE_FIELDS)
+get_pirate_counters = attrgetter(*PIRATE_COUNTER_FIELDS)
+
 
 class PiratesGame(Game):
     """
@@ -83,10 +129,12 @@ class PiratesGame(Game):
         # Randomization settings
         self.randomize_sail_options = int(options.get('randomize_sail_options'))
         """:type : int"""
-        self.engine_seed = options.get('engine_seed', randint(-MAX_RAND - 1, MAX_RAND))
+        self.engine_seed = options.get('engine_seed', Random().randint(-MAX_RAND - 1, MAX_RAND))
         """:type : int"""
-        seed(self.engine_seed)
-        self.player_seed = options.get('player_seed', randint(-MAX_RAND - 1, MAX_RAND))
+        # the game's own random generator, so games in the same process don't change each other's random streams
+        self.random = Random(self.engine_seed)
+        """:type : Random"""
+        self.player_seed = options.get('player_seed', self.random.randint(-MAX_RAND - 1, MAX_RAND))
         """:type : int"""
 
         # Attack and Defense related settings
@@ -135,6 +183,17 @@ class PiratesGame(Game):
         # used to cutoff games early
         self.end_of_game_reason = ''
         """:type : str"""
+        # the game ends once a player held cutoff_percent of the score or of the living pirates for cutoff_turn turns
+        # in a row, a cutoff_turn of 0 turns the cutoff off
+        self.cutoff_turn = int(options.get('cutoff_turn', 0))
+        """:type : int"""
+        self.cutoff_percent = float(options.get('cutoff_percent', 1.0))
+        """:type : float"""
+        # the player holding the cutoff share and what the share is of, and the amount of turns it was held
+        self.cutoff_leader = None
+        """:type : (int, str)"""
+        self.cutoff_turns = 0
+        """:type : int"""
 
         # used to calculate the turn when the winner took the lead
         self.winning_bot = []
@@ -162,17 +221,20 @@ class PiratesGame(Game):
         """:type : int"""
 
         # initialize map
-        self.map = dict()
-        for row in xrange(0, self.height):
-            for col in xrange(0, self.width):
-                self.map[Location(row, col)] = LAND
-        """:type : list[list[int]]"""
+        self.map = MapGrid(self.height, self.width, LAND)
+        """:type : MapGrid"""
 
         bot_names = options['bot_names']
         self.players = [Player(player_id, bot_names[player_id])
                         for player_id in range(self.num_players)]
         # cache used by neighbourhood_offsets() to determine nearby squares
         self.offsets_cache = {}
+        # cache used by get_pirates_view() to hold the pirate lists of all players
+        self.pirates_views = {}
+        """:type : dict[str, (list[int], list[Pirate])]"""
+        # spatial index of the living pirates, kept up to date as pirates move, die and spawn
+        self.pirate_index = SpatialIndex()
+        """:type : SpatialIndex"""
 
         for treasure_data in map_data['treasures']:
             treasure_id = treasure_data[0]
@@ -220,6 +282,20 @@ class PiratesGame(Game):
             anti_script = Script(anti_script_id, anti_script_location, anti_script_start_turn, anti_script_end_turn)
             self.anti_scripts.append(anti_script)
 
+        # spatial indexes of the static map objects, availability is checked on lookup
+        self.treasure_index = SpatialIndex(self.treasures)
+        """:type : SpatialIndex"""
+        self.powerup_index = SpatialIndex(self.powerups)
+        """:type : SpatialIndex"""
+        self.script_index = SpatialIndex(self.scripts)
+        """:type : SpatialIndex"""
+        self.anti_script_index = SpatialIndex(self.anti_scripts)
+        """:type : SpatialIndex"""
+        # the turns the powerups, scripts and anti scripts are on the map, and the treasures waiting to respawn
+        self.schedule = TurnSchedule({'powerups': self.powerups, 'scripts': self.scripts,
+                                      'anti_scripts': self.anti_scripts})
+        """:type : TurnSchedule"""
+
         # initialize pirates
         for player_id, player_pirates in map_data['pirate_locations'].items():
             for pirate_id, pirate_loc in enumerate(player_pirates):
@@ -235,58 +311,70 @@ class PiratesGame(Game):
             self.perspectives_key.append([(key + self.num_players - player_id) % self.num_players for key in
                                           range(self.num_players)])
 
+        # the state of the current turn, shared by the views of all of the players. None until it is built
+        self.turn_state = None
+        """:type : dict[str, any]"""
+
     @property
     def living_pirates(self):
         """
-        Get the living_pirates list.
+        Get the living_pirates list. The list is shared until the living pirates change, so it must not be modified.
 
         :return: The living_pirates list.
         :rtype: list[Pirate]
         """
-        living_pirates = []
-        for player in self.players:
-            for pirate in player.living_pirates:
-                living_pirates.append(pirate)
-        return living_pirates
+        return self.get_pirates_view('living_pirates')
 
     @property
     def dead_pirates(self):
         """
-        Get the dead_pirates list.
+        Get the dead_pirates list. The list is shared until the dead pirates change, so it must not be modified.
 
         :return: The dead_pirates list.
         :rtype: list[Pirate]
         """
-        dead_pirates = []
-        for player in self.players:
-            dead_pirates += player.dead_pirates
-        return dead_pirates
+        return self.get_pirates_view('dead_pirates')
 
     @property
     def drunk_pirates(self):
         """
-        Get the drunk_pirates list.
+        Get the drunk_pirates list. The list is shared until the drunk pirates change, so it must not be modified.
+        Use Player.is_drunk to check if a pirate is drunk.
 
         :return: The drunk_pirates  list.
         :rtype: list[Pirate]
         """
-        drunk_pirates = []
-        for player in self.players:
-            drunk_pirates += player.drunk_pirates
-        return drunk_pirates
+        return self.get_pirates_view('drunk_pirates')
 
     @property
     def all_pirates(self):
         """
-        Get the all pirates list.
+        Get the all pirates list. The list is shared until a pirate is created, so it must not be modified.
 
         :return: The all pirates list.
         :rtype: list[Pirate]
         """
-        all_pirates = []
+        return self.get_pirates_view('all_pirates')
+
+    def get_pirates_view(self, list_name):
+        """
+        Get the concatenation of the given pirate list of all players.
+        The concatenation is cached, and is only built again after one of the players' pirate lists changes.
+
+        :param list_name: the name of the player's list, e.g. 'living_pirates'
+        :type list_name: str
+        :return: the pirates in the list of all players, ordered by player
+        :rtype: list[Pirate]
+        """
+        versions = [player.pirates_version for player in self.players]
+        cached = self.pirates_views.get(list_name)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+        pirates = []
         for player in self.players:
-            all_pirates += player.all_pirates
-        return all_pirates
+            pirates += getattr(player, list_name)
+        self.pirates_views[list_name] = (versions, pirates)
+        return pirates
 
     @property
     def score(self):
@@ -486,7 +574,7 @@ class PiratesGame(Game):
                     # A treasure
                     elif char == MAP_OBJECTS[TREASURE]:
                         treasure_value = 1
-                        if current_treasure_id in treasures_data.keys():
+                        if current_treasure_id in treasures_data:
                             treasure_value = treasures_data[current_treasure_id]
                         treasures.append((current_treasure_id, Location(row, col), treasure_value))
                         current_treasure_id += 1
@@ -529,11 +617,7 @@ class PiratesGame(Game):
         -1: empty spot, -2: treasure
         :rtype: list[list[int]]
         """
-
-        result = [[LAND] * self.width for _ in range(self.height)]
-        for location in self.map.keys():
-            result[location.row][location.col] = self.map[location]
-        return result
+        return self.map.tolist()
 
     def get_state_changes(self):
         """
@@ -565,22 +649,25 @@ class PiratesGame(Game):
 
         # living pirates
         pirates_list = []
-        for pirate in self.living_pirates:
+        living_pirates = self.living_pirates
+        for pirate, (turns_to_sober, reload_turns, defense_reload_turns, defense_expiration_turns,
+                     carry_treasure_speed, attack_radius) in zip(living_pirates,
+                                                                 self.get_pirates_counters(living_pirates)):
             pirate_dict = {'type': 'pirate',
                            'id': pirate.id,
                            'location': pirate.location.as_tuple,
                            'owner': pirate.owner.id,
                            'initial_location': pirate.initial_location.as_tuple,
-                           'turns_to_sober': int(pirate.turns_to_sober),
+                           'turns_to_sober': int(turns_to_sober),
                            'treasure_initial_location': pirate.treasure.initial_location.as_tuple if
                            pirate.has_treasure() else (-1, -1),
                            'treasure_id': (int(pirate.treasure.id) if pirate.has_treasure() else -1),
                            'treasure_value': int(pirate.treasure.value if pirate.has_treasure() else 0),
-                           'reload_turns': pirate.reload_turns,
-                           'defense_reload_turns': pirate.defense_reload_turns,
-                           'defense_expiration_turns': pirate.defense_expiration_turns,
-                           'carry_treasure_speed': pirate.carry_treasure_speed,
-                           'attack_radius': pirate.attack_radius,
+                           'reload_turns': reload_turns,
+                           'defense_reload_turns': defense_reload_turns,
+                           'defense_expiration_turns': defense_expiration_turns,
+                           'carry_treasure_speed': carry_treasure_speed,
+                           'attack_radius': attack_radius,
                            'powerups': [powerup for powerup in pirate.powerups]}
             pirates_list.append(pirate_dict)
         changes['pirates'] = pirates_list
@@ -600,38 +687,35 @@ class PiratesGame(Game):
 
         # powerups
         powerups_list = []
-        for powerup in self.powerups:
-            if powerup.end_turn > self.turn >= powerup.start_turn:
-                powerup_dict = {'type': 'powerup',
-                                'id': powerup.id,
-                                'powerup_type': powerup.__class__.__name__,
-                                'location': powerup.location.as_tuple,
-                                'active_turns': powerup.active_turns,
-                                'end_turn': powerup.end_turn,
-                                'value': powerup.get_value()}
-                powerups_list.append(powerup_dict)
+        for powerup in self.schedule.get_active('powerups', self.turn):
+            powerup_dict = {'type': 'powerup',
+                            'id': powerup.id,
+                            'powerup_type': powerup.__class__.__name__,
+                            'location': powerup.location.as_tuple,
+                            'active_turns': powerup.active_turns,
+                            'end_turn': powerup.end_turn,
+                            'value': powerup.get_value()}
+            powerups_list.append(powerup_dict)
         changes['powerups'] = powerups_list
 
         # scripts
         scripts_list = []
-        for script in self.scripts:
-            if script.end_turn > self.turn >= script.start_turn:
-                script_dict = {'type': 'script',
-                               'id': script.id,
-                               'location': script.location.as_tuple,
-                               'end_turn': script.end_turn}
-                scripts_list.append(script_dict)
+        for script in self.schedule.get_active('scripts', self.turn):
+            script_dict = {'type': 'script',
+                           'id': script.id,
+                           'location': script.location.as_tuple,
+                           'end_turn': script.end_turn}
+            scripts_list.append(script_dict)
         changes['scripts'] = scripts_list
 
         # anti_scripts
         anti_scripts_list = []
-        for anti_script in self.anti_scripts:
-            if anti_script.start_turn <= self.turn < anti_script.end_turn:
-                anti_script_dict = {'type': 'anti_script',
-                                    'id': anti_script.id,
-                                    'location': anti_script.location.as_tuple,
-                                    'end_turn': anti_script.end_turn}
-                anti_scripts_list.append(anti_script_dict)
+        for anti_script in self.schedule.get_active('anti_scripts', self.turn):
+            anti_script_dict = {'type': 'anti_script',
+                                'id': anti_script.id,
+                                'location': anti_script.location.as_tuple,
+                                'end_turn': anti_script.end_turn}
+            anti_scripts_list.append(anti_script_dict)
         changes['anti_scripts'] = anti_scripts_list
 
         # bermuda zones
@@ -648,6 +732,17 @@ class PiratesGame(Game):
 
         return changes
 
+    def get_pirates_counters(self, pirates):
+        """
+        Returns the countdowns and powerup values of pirates, that the players are sent every turn.
+
+        :param pirates: the pirates
+        :type pirates: list[Pirate]
+        :return: the values of each pirate, in the order of PIRATE_COUNTER_FIELDS
+        :rtype: list[tuple[int]]
+        """
+        return map(get_pirate_counters, pirates)
+
     def get_map_output(self):
         """
         Renders the map from the perspective of the given player.
@@ -657,10 +752,7 @@ class PiratesGame(Game):
         :rtype: list[str]
         """
         # TODO: get this function working (need to check if this todo is still relevant)
-        result = []
-        for row in self.get_map():
-            result.append(''.join([MAP_RENDER[col] for col in row]))
-        return result
+        return self.map.render(MAP_RENDER)
 
     @staticmethod
     def parse_order(order):
@@ -709,6 +801,26 @@ class PiratesGame(Game):
         square_dist = (center.row - location.row) ** 2 + (center.col - location.col) ** 2
         return square_dist <= radius2
 
+    def neighbourhood_offsets(self, radius2):
+        """
+        Returns a list of (row, col) offsets of all the squares within radius2 of a square.
+        The offsets are cached since the same few radii are used during the whole game.
+
+        :param radius2: the squared radius of the neighbourhood
+        :type radius2: int
+        :return: the offsets of all the squares within radius2 of a square
+        :rtype: list[(int, int)]
+        """
+        if radius2 not in self.offsets_cache:
+            offsets = []
+            max_offset = int(max(radius2, 0) ** 0.5) + 1
+            for d_row in xrange(-max_offset, max_offset + 1):
+                for d_col in xrange(-max_offset, max_offset + 1):
+                    if d_row ** 2 + d_col ** 2 <= radius2:
+                        offsets.append((d_row, d_col))
+            self.offsets_cache[radius2] = offsets
+        return self.offsets_cache[radius2]
+
     def initial_location_in_circle(self, center, player_id):
         """
         Returns whether one of the player's pirates' initial locations is within bermuda zone radius of center.
@@ -809,7 +921,7 @@ class PiratesGame(Game):
             if self.initial_location_in_circle(pirate.location, player_id):
                 raise IgnoredOrderException('bermuda zone cannot overlap enemy initial locations', order)
 
-            if self.num_scripts[player_id] < self.required_scripts_num:
+            if self.players[player_id].num_scripts < self.required_scripts_num:
                 raise InvalidOrderException('not enough scripts to summon bermuda zone', order)
 
             if player_id in [bermuda_zone.owner for bermuda_zone in self.bermuda_zones
@@ -836,8 +948,12 @@ class PiratesGame(Game):
                     or not isinstance(destination[0], int) or not isinstance(destination[1], int):
                 raise InvalidOrderException('invalid args', order)
 
-            #  locations are sent as lists over the json, this turns them back
-            order['order_args']['destination'] = Location(destination[0], destination[1])
+            #  locations are sent as lists over the json, this turns them back. Only the squares of the map are kept
+            #  by Location, so a bot can't fill the memory with destinations that are far off the map
+            if 0 <= destination[0] < self.height and 0 <= destination[1] < self.width:
+                order['order_args']['destination'] = Location(destination[0], destination[1])
+            else:
+                order['order_args']['destination'] = Location.create_unshared(destination[0], destination[1])
             destination = order['order_args']['destination']
 
             distance_from = self.manhattan_distance(pirate.location, destination)
@@ -845,7 +961,7 @@ class PiratesGame(Game):
             if pirate.treasure is not None and distance_from > pirate.carry_treasure_speed:
                 raise InvalidOrderException('cannot move than 1 step if carrying a treasure', order)
 
-            if not self.is_move_valid(pirate.location, self.get_direction_letters(pirate.location, destination)):
+            if not self.is_move_valid(pirate.location, self.get_direction_runs(pirate.location, destination)):
                 raise IgnoredOrderException('order ignored - can\'t move out of map', order)
 
             if counter_dict['action_counter'] + distance_from > self.actions_per_turn:  # counts movement steps
@@ -876,77 +992,49 @@ class PiratesGame(Game):
         :return: Returns the step by step directions from loc_a to loc_b in string format.
         :rtype: str
         """
-        row1, col1 = loc_a.as_tuple
-        row2, col2 = loc_b.as_tuple
-        height2 = self.height // 2
-        width2 = self.width // 2
-        distance = self.manhattan_distance(loc_a, loc_b)
-
-        if row1 == row2 and col1 == col2:
-            # return a single move of 'do nothing'
-            return ['-']
-
-        direction_letters = []
-        for i in range(distance):
-            if row1 < row2:
-                if row2 - row1 >= height2 and self.cyclic:
-                    direction_letters.append('n')
-                    row1 -= 1
-                    continue
-                if row2 - row1 <= height2 or not self.cyclic:
-                    direction_letters.append('s')
-                    row1 += 1
-                    continue
-            if row2 < row1:
-                if row1 - row2 >= height2 and self.cyclic:
-                    direction_letters.append('s')
-                    row1 += 1
-                    continue
-                if row1 - row2 <= height2 or not self.cyclic:
-                    direction_letters.append('n')
-                    row1 -= 1
-                    continue
-            if col1 < col2:
-                if col2 - col1 >= width2 and self.cyclic:
-                    direction_letters.append('w')
-                    col1 -= 1
-                    continue
-                if col2 - col1 <= width2 or not self.cyclic:
-                    direction_letters.append('e')
-                    col1 += 1
-                    continue
-            if col2 < col1:
-                if col1 - col2 >= width2 and self.cyclic:
-                    direction_letters.append('e')
-                    col1 += 1
-                    continue
-                if col1 - col2 <= width2 or not self.cyclic:
-                    direction_letters.append('w')
-                    col1 -= 1
-                    continue
-        return direction_letters
-
-    def is_move_valid(self, location, directions):
+        return Directions.get_direction_letters(loc_a.row, loc_a.col, loc_b.row, loc_b.col, self.height, self.width,
+                                                self.cyclic)
+
+    def get_direction_runs(self, loc_a, loc_b):
+        """
+        Returns the directions from loc_a to loc_b as runs of the same direction, the runs of get_direction_letters.
+
+        :param loc_a: the starting location.
+        :type loc_a: Location
+        :param loc_b: the destination location.
+        :type loc_b: Location
+        :return: the direction letter and the amount of steps of each run
+        :rtype: list[(str, int)]
+        """
+        return Directions.get_direction_runs(loc_a.row, loc_a.col, loc_b.row, loc_b.col, self.height, self.width,
+                                             self.cyclic)
+
+    def is_move_valid(self, location, direction_runs):
         """
         Makes sure current location + all moves of current pirate (iteratively!) are valid.
         e.g.: 'n,n,w,w' - going n once is allowed, location updates. going n for the second time is not allowed.
         So the entire order will be ignored.
+        Each run of the same direction is checked at once.
 
         :param location: the location to start the movement from
         :type location: Location
-        :param directions: a string describing the directions to go.
-        :type directions: string
+        :param direction_runs: the directions to go, as runs of the same direction, see get_direction_runs
+        :type direction_runs: list[(str, int)]
         :return: whether the order is valid or ignored, as well as a string describing the reason
             of the order category.
         :rtype: bool
         """
-        current_loc = location
-        for direction in directions:
-            future_loc = self.destination(current_loc, AIM[direction])
-            if self.manhattan_distance(current_loc, future_loc) > 1 and not self.cyclic:
-                self.rejected_moves.append([self.turn, current_loc.row, current_loc.col, direction])
+        row, col = location.row, location.col
+        for direction, steps in direction_runs:
+            aim = AIM[direction]
+            if self.cyclic:
+                continue
+            row, off_map = Directions.walk_axis(row, aim.row, steps, self.height)
+            if not off_map:
+                col, off_map = Directions.walk_axis(col, aim.col, steps, self.width)
+            if off_map:
+                self.rejected_moves.append([self.turn, row, col, direction])
                 return False
-            current_loc = future_loc
         return True
 
     def do_orders(self):
@@ -957,9 +1045,9 @@ class PiratesGame(Game):
 
         """
 
-        # set old pirate locations to land
-        for pirate in self.living_pirates:
-            self.map[pirate.location] = LAND
+        # pirates that changed their location, they are taken out of the map and the pirate index until collisions
+        # are resolved
+        moved_pirates = []
 
         # determine the direction that each pirate moves (holding any pirates that don't have orders)
         pirate_orders = {}
@@ -971,14 +1059,11 @@ class PiratesGame(Game):
 
                 pirate_orders[pirate] = (order['order_type'], order['order_args'])
 
-        for pirate in self.living_pirates:
-            if pirate not in pirate_orders:
-                pirate_orders[pirate] = ('-', {})
-
-        # move all the pirates
+        # move all the pirates, pirates without orders stay in place
         next_pirate_locations = defaultdict(list)
 
-        for pirate, (order_type, order_args) in pirate_orders.iteritems():
+        for pirate in self.living_pirates:
+            order_type, order_args = pirate_orders.get(pirate, ('-', {}))
             new_location = pirate.location
             direction = '-'
 
@@ -1001,6 +1086,11 @@ class PiratesGame(Game):
                 new_location = order_args['destination']
                 direction = self.get_direction_letters(pirate.location, new_location)
 
+            if new_location != pirate.location:
+                # set old pirate location to land
+                self.map[pirate.location] = LAND
+                self.pirate_index.remove(pirate)
+                moved_pirates.append(pirate)
             pirate.location = new_location
             pirate.orders.append(direction)
             next_pirate_locations[pirate.location].append(pirate)
@@ -1010,21 +1100,24 @@ class PiratesGame(Game):
                 pirate.defense_turns.append(self.turn)
 
         # if pirate is sole occupy of a new square then it survives
+        # the pirates are visited in their previous order so the living pirates keep a stable order
+        previous_living_pirates = self.living_pirates
         for player in self.players:
-            player.living_pirates = []
+            player.set_living_pirates([])
         colliding_pirates = []
 
-        for location, pirates in next_pirate_locations.iteritems():
-            if len(pirates) == 1:
-                self.players[pirates[0].owner.id].living_pirates.append(pirates[0])
+        for pirate in previous_living_pirates:
+            if len(next_pirate_locations[pirate.location]) == 1:
+                pirate.owner.add_living_pirate(pirate)
             else:
-                for pirate in pirates:
-                    self.kill_pirate(pirate, True)
-                    colliding_pirates.append(pirate)
+                self.kill_pirate(pirate, True)
+                colliding_pirates.append(pirate)
 
-        # set new pirate locations
-        for pirate in self.living_pirates:
-            self.map[pirate.location] = pirate.owner.id
+        # set new locations of the pirates that moved and survived
+        for pirate in moved_pirates:
+            if not pirate.is_lost:
+                self.map[pirate.location] = pirate.owner.id
+                self.pirate_index.add(pirate)
 
     def do_defense(self):
         """
@@ -1056,14 +1149,18 @@ class PiratesGame(Game):
         Kills all of the pirates who are inside a bermuda zone of the opposing team
 
         """
+        pirates_in_zones = set()
+        for bermuda_zone in self.bermuda_zones:
+            if bermuda_zone.active_turns > 0:
+                offsets = self.neighbourhood_offsets(bermuda_zone.radius)
+                for pirate in self.pirate_index.get_objects_in_offsets(bermuda_zone.center, offsets):
+                    if pirate.owner.id != bermuda_zone.owner:
+                        pirates_in_zones.add(pirate)
+
+        # kill in the order of the living pirates, so the dead pirates are ordered as before
         pirates_to_kill = []
-        for pirate in self.living_pirates:
-            enemy_bermuda_zone_list = [bermuda_zone for bermuda_zone in self.bermuda_zones if
-                                       bermuda_zone.owner != pirate.owner.id and bermuda_zone.active_turns > 0]
-            for bermuda_zone in enemy_bermuda_zone_list:
-                if self.in_circle(bermuda_zone.center, bermuda_zone.radius, pirate.location):
-                    pirates_to_kill.append(pirate)
-                    break  # continue to next pirate
+        if pirates_in_zones:
+            pirates_to_kill = [pirate for pirate in self.living_pirates if pirate in pirates_in_zones]
 
         for pirate in pirates_to_kill:
             self.kill_pirate(pirate)
@@ -1081,7 +1178,7 @@ class PiratesGame(Game):
         """
         pirates_to_sober = []
         for pirate in self.living_pirates:
-            if pirate in self.drunk_pirates:
+            if pirate.owner.is_drunk(pirate):
                 pirate.drink_history.append(True)
                 if pirate.turns_to_sober > 0:
                     pirate.turns_to_sober -= 1
@@ -1092,7 +1189,7 @@ class PiratesGame(Game):
                 pirate.drink_history.append(False)
 
         for pirate in pirates_to_sober:
-            pirate.owner.drunk_pirates.remove(pirate)
+            pirate.owner.remove_drunk_pirate(pirate)
 
     def do_spawn(self):
         """
@@ -1104,8 +1201,7 @@ class PiratesGame(Game):
             # calculate if the turn has come to revive
             if pirate.turns_to_revive <= 0:
                 # verify no one standing in the pirate's location
-                occupier = next((next_pirate for next_pirate in self.living_pirates
-                                 if next_pirate.location == pirate.initial_location), None)
+                occupier = self.pirate_index.get_first(pirate.initial_location)
                 if occupier is not None:
                     self.kill_pirate(occupier)
                 else:
@@ -1113,15 +1209,14 @@ class PiratesGame(Game):
             else:
                 pirate.turns_to_revive -= 1
 
-        # remove pirate from dead list and make new one in the alive
+        # move the pirate from the dead list to the alive, as a new incarnation of the same pirate
         for pirate in pirates_to_revive:
-            pirate.owner.dead_pirates.remove(pirate)
             owner = pirate.owner
-            location = pirate.initial_location
-            new_pirate = Pirate(location, owner, pirate.id, self.attack_radius, self.max_defense_turns, self.turn)
-            self.map[location] = owner.id
-            owner.all_pirates.append(new_pirate)
-            owner.living_pirates.append(new_pirate)
+            owner.remove_dead_pirate(pirate)
+            self.revive_pirate(pirate)
+            self.map[pirate.location] = owner.id
+            self.pirate_index.add(pirate)
+            owner.add_living_pirate(pirate)
 
     def get_last_turn_points(self):
         """
@@ -1130,10 +1225,36 @@ class PiratesGame(Game):
         :return: a list of the points earned by each player last turn
         :rtype: list[int]
         """
-        if len(self.score_history[0]) < 2:
+        if len(self.players[0].score_history) < 2:
             return self.score
         return [player.score_history[-1] - player.score_history[-2] for player in self.players]
 
+    def create_pirate(self, location, owner, pirate_id):
+        """
+        Creates a new pirate object, spawning on the current turn. Pirates that respawn don't get a new object, see
+        revive_pirate.
+
+        :param location: The location of the new pirate
+        :type location: Location
+        :param owner: The owner of the pirate
+        :type owner: Player
+        :param pirate_id: The id of the new pirate
+        :type pirate_id: int
+        :return: Returns the new pirate
+        :rtype: Pirate
+        """
+        return Pirate(location, owner, pirate_id, self.attack_radius, self.max_defense_turns, self.turn)
+
+    def revive_pirate(self, pirate):
+        """
+        Brings a dead pirate back to life at its initial location, spawning on the current turn.
+
+        :param pirate: The pirate to revive
+        :type pirate: Pirate
+        """
+        pirate.reincarnate(self.attack_radius, self.turn)
+        pirate.owner.number_spawn(pirate)
+
     def add_initial_pirate(self, location, owner, pirate_id):
         """
         Creates a pirate in location for player owner with id, then appends it to the necessary lists,
@@ -1148,10 +1269,11 @@ class PiratesGame(Game):
         :return: Returns the new pirate
         :rtype: Pirate
         """
-        pirate = Pirate(location, self.players[owner], pirate_id, self.attack_radius, self.max_defense_turns, self.turn)
+        pirate = self.create_pirate(location, self.players[owner], pirate_id)
         self.map[location] = owner
-        self.players[owner].all_pirates.append(pirate)
-        self.players[owner].living_pirates.append(pirate)
+        self.pirate_index.add(pirate)
+        self.players[owner].add_pirate(pirate)
+        self.players[owner].add_living_pirate(pirate)
         return pirate
 
     def get_living_pirate(self, player_id, pirate_id):
@@ -1177,7 +1299,7 @@ class PiratesGame(Game):
         :param pirate: The pirate to make drunk
         :type pirate: Pirate
         """
-        pirate.owner.drunk_pirates.append(pirate)
+        pirate.owner.add_drunk_pirate(pirate)
         pirate.drink_turns.append(self.turn + 1)
         pirate.turns_to_sober = self.turns_to_sober
 
@@ -1201,7 +1323,8 @@ class PiratesGame(Game):
                 pirate.treasure = None
 
             self.map[location] = LAND
-            pirate.owner.dead_pirates.append(pirate)
+            self.pirate_index.remove(pirate)
+            pirate.owner.add_dead_pirate(pirate)
             pirate.die_turn = self.turn
             pirate.turns_to_revive = self.pirate_spawn_turns
             pirate.is_lost = True
@@ -1277,6 +1400,17 @@ class PiratesGame(Game):
         for pirate in pirates_to_drunk:
             self.drunk_pirate(pirate)
 
+    def is_on_map(self, map_object):
+        """
+        Returns whether a powerup, script or anti script is on the map this turn.
+
+        :param map_object: the powerup, script or anti script
+        :type map_object: Powerup | Script
+        :return: whether the object is on the map this turn
+        :rtype: bool
+        """
+        return map_object.start_turn <= self.turn < map_object.end_turn
+
     def do_treasures(self):
         """
         Handles the treasure logic:
@@ -1286,8 +1420,6 @@ class PiratesGame(Game):
         loads treasures on sober pirates that stand on a treasure
 
         """
-        available_treasures = [treasure for treasure in self.treasures if treasure.is_available]
-
         # if pirate already has a treasure, update treasure history and ignore the rest
         # check if pirate location is an existing treasure location
         # if yes, pick it up and update treasure history
@@ -1298,19 +1430,23 @@ class PiratesGame(Game):
                     pirate.treasure_history.append(pirate.treasure.value)
                 else:
                     pirate.treasure_history.append(0)
-                    # when ship unloads treasure, start counting spawn turns for the treasure
+                    # when ship unloads treasure, schedule the treasure's respawn. The spawn turns count this turn,
+                    # so 0 or 1 spawn turns respawn it at the end of this turn, and negative spawn turns never do
                     # TODO: this is an unused feature, should we still support it?
-                    pirate.treasure.spawn_turns = self.treasure_spawn_turns
+                    if self.treasure_spawn_turns >= 0:
+                        pirate.treasure.respawn_turn = self.turn + max(self.treasure_spawn_turns, 1) - 1
+                        self.schedule.add_respawn(pirate.treasure.respawn_turn, pirate.treasure)
                     # update score
                     pirate.owner.score += pirate.treasure.value
                     # release it
                     pirate.treasure = None
             else:
                 # if pirate doesnt hold a treasure AND is in an available treasure location, pick it up
-                pirate.treasure = next((treasure for treasure in available_treasures if
-                                        pirate.location == treasure.location and
-                                        pirate not in self.drunk_pirates), None)
+                treasure = self.treasure_index.get_first(pirate.location, is_treasure_available)
                 # drunk pirates can't pick up treasures
+                if treasure is not None and pirate.owner.is_drunk(pirate):
+                    treasure = None
+                pirate.treasure = treasure
                 if pirate.treasure is not None:
                     pirate.treasure_history.append(pirate.treasure.value)
                     pirate.treasure.is_available = False
@@ -1319,11 +1455,9 @@ class PiratesGame(Game):
 
         for treasure in self.treasures:
             treasure.is_available_history.append(treasure.is_available)
-            if treasure.spawn_turns > 0:
-                treasure.spawn_turns -= 1
-            if treasure.spawn_turns == 0:
-                treasure.is_available = True
-                treasure.spawn_turns = -1
+        for treasure in self.schedule.pop_respawns(self.turn):
+            treasure.is_available = True
+            treasure.respawn_turn = -1
 
     def do_powerups(self):  # TODO: re-name the function
         """
@@ -1333,8 +1467,7 @@ class PiratesGame(Game):
         spawns and despawns powerups from the map according to their start/end turns.
 
         """
-        available_powerups = [powerup for powerup in self.powerups if
-                              powerup.start_turn <= self.turn < powerup.end_turn]
+        is_on_map = self.is_on_map
         for pirate in self.living_pirates:
             # if powerup already activated
             if pirate.attack_powerup_active_turns > 0:
@@ -1359,7 +1492,7 @@ class PiratesGame(Game):
                 pirate.speed_powerup_history.append(False)
 
             # check if pirate is standing on an powerup
-            powerup = next((powerup for powerup in available_powerups if pirate.location == powerup.location), None)
+            powerup = self.powerup_index.get_first(pirate.location, is_on_map)
             if powerup:
                 powerup.end_turn = self.turn
                 powerup.activate(pirate, self)
@@ -1371,21 +1504,15 @@ class PiratesGame(Game):
         collects scripts and anti scripts if a pirate is standing on top of one
 
         """
-        available_scripts = [script for script in self.scripts if
-                             script.start_turn <= self.turn < script.end_turn]
-
-        available_anti_scripts = [anti_script for anti_script in self.anti_scripts if
-                                  anti_script.start_turn <= self.turn < anti_script.end_turn]
-
+        is_on_map = self.is_on_map
         for pirate in self.living_pirates:
             # check if pirate is standing on a script
-            script = next((script for script in available_scripts if pirate.location == script.location), None)
+            script = self.script_index.get_first(pirate.location, is_on_map)
             if script:
                 script.end_turn = self.turn
                 pirate.owner.num_scripts += 1
 
-            anti_script = next((anti_script for anti_script in available_anti_scripts if
-                                pirate.location == anti_script.location), None)
+            anti_script = self.anti_script_index.get_first(pirate.location, is_on_map)
             if anti_script:
                 anti_script.end_turn = self.turn
                 if pirate.owner.num_scripts > 0:
@@ -1448,8 +1575,43 @@ class PiratesGame(Game):
         if max(self.score) >= self.max_points:
             self.end_of_game_reason = 'Maximum points'
             return True
+        if self.cutoff_turn > 0 and self.cutoff_turns >= self.cutoff_turn:
+            player_id, share = self.cutoff_leader
+            self.end_of_game_reason = 'Cutoff, Bot [%s] held %d%% of the %s for %d turns' % (
+                self.players[player_id].bot_name, int(round(self.cutoff_percent * 100)), share, self.cutoff_turns)
+            return True
         return False
 
+    def get_cutoff_leader(self):
+        """
+        Returns the player that holds the cutoff share of the score, or else of the living pirates.
+
+        :return: the id of the player and what it holds the share of ('score' or 'pirates'), or None if no player does
+        :rtype: (int, str) | None
+        """
+        for share, amounts in (('score', self.score),
+                               ('pirates', [len(player.living_pirates) for player in self.players])):
+            total = sum(amounts)
+            if total > 0:
+                for player_id, amount in enumerate(amounts):
+                    if amount >= self.cutoff_percent * total:
+                        return player_id, share
+        return None
+
+    def update_cutoff(self):
+        """
+        Counts the turns in a row in which the same player held the cutoff share.
+
+        """
+        if self.cutoff_turn <= 0:
+            return
+        cutoff_leader = self.get_cutoff_leader()
+        if cutoff_leader is None or cutoff_leader != self.cutoff_leader:
+            self.cutoff_turns = 0
+        self.cutoff_leader = cutoff_leader
+        if cutoff_leader is not None:
+            self.cutoff_turns += 1
+
     def get_winner(self):
         """
         Returns the winner of the game.
@@ -1487,6 +1649,96 @@ class PiratesGame(Game):
             regression_data[player.id] = player_data
         return regression_data
 
+    def snapshot(self):
+        """
+        Saves the live state of the game, so the game can be brought back to it with restore.
+        Only the values that change during the game are copied. The histories are only appended to, so just their
+        lengths are kept, which keeps the snapshot small and its cost independent of the turn.
+
+        :return: the saved state
+        :rtype: GameSnapshot
+        """
+        snapshot = GameSnapshot()
+        snapshot.game_values = (self.turn, self.end_of_game_reason, list(self.winning_bot), self.winning_turn,
+                                self.ranking_bots and list(self.ranking_bots), self.ranking_turn,
+                                len(self.rejected_moves), self.cutoff_leader, self.cutoff_turns)
+        snapshot.random_state = self.random.getstate()
+        snapshot.map_cells = self.map.cells[:]
+        snapshot.players = [(player.is_killed, player.orders, player.score, len(player.score_history),
+                             player.num_scripts, player.turns_to_cloak, tuple(player.living_pirates),
+                             tuple(player.dead_pirates), tuple(player.drunk_pirates), player.spawns_count)
+                            for player in self.players]
+        snapshot.pirates = [(pirate, get_pirate_state(pirate), tuple(pirate.powerups), len(pirate.incarnations),
+                             tuple([len(history) for history in get_pirate_histories(pirate)]))
+                            for pirate in self.all_pirates]
+        snapshot.treasures = [(treasure.is_available, treasure.respawn_turn, len(treasure.is_available_history))
+                              for treasure in self.treasures]
+        snapshot.end_turns = [map_object.end_turn
+                              for map_objects in (self.powerups, self.scripts, self.anti_scripts)
+                              for map_object in map_objects]
+        snapshot.bermuda_zones = [(bermuda_zone, bermuda_zone.active_turns) for bermuda_zone in self.bermuda_zones]
+        return snapshot
+
+    def restore(self, snapshot):
+        """
+        Brings the game back to a state saved by snapshot. A snapshot can be restored any number of times, as long as
+        the game didn't go back to before the snapshot was taken in between. Pirates that respawned after the snapshot
+        go back to the life they had in the snapshot.
+
+        :param snapshot: the saved state
+        :type snapshot: GameSnapshot
+        """
+        (self.turn, self.end_of_game_reason, winning_bot, self.winning_turn, ranking_bots, self.ranking_turn,
+         rejected_moves_count, self.cutoff_leader, self.cutoff_turns) = snapshot.game_values
+        del self.rejected_moves[rejected_moves_count:]
+        self.winning_bot = list(winning_bot)
+        self.ranking_bots = ranking_bots and list(ranking_bots)
+        self.random.setstate(snapshot.random_state)
+        self.map.cells[:] = snapshot.map_cells
+
+        for player, player_values in zip(self.players, snapshot.players):
+            (player.is_killed, player.orders, player.score, score_history_length, player.num_scripts,
+             player.turns_to_cloak, living_pirates, dead_pirates, drunk_pirates, player.spawns_count) = player_values
+            del player.score_history[score_history_length:]
+            player.set_living_pirates(living_pirates)
+            player.dead_pirates = list(dead_pirates)
+            player.drunk_pirates = list(drunk_pirates)
+            player.drunk_pirates_count = {}
+            for pirate in drunk_pirates:
+                player.drunk_pirates_count[pirate] = player.drunk_pirates_count.get(pirate, 0) + 1
+
+        for pirate, state, powerups, incarnations_count, history_lengths in snapshot.pirates:
+            if len(pirate.incarnations) > incarnations_count:
+                # the life of the snapshot ended since, bring its values back
+                for field, value in zip(PIRATE_LIFE_FIELDS, pirate.incarnations[incarnations_count]):
+                    setattr(pirate, field, value)
+                del pirate.incarnations[incarnations_count:]
+            for field, value in zip(PIRATE_STATE_FIELDS, state):
+                setattr(pirate, field, value)
+            pirate.powerups = list(powerups)
+            for history, length in zip(get_pirate_histories(pirate), history_lengths):
+                del history[length:]
+
+        self.schedule.reset()
+        for treasure, (is_available, respawn_turn, history_length) in zip(self.treasures, snapshot.treasures):
+            treasure.is_available = is_available
+            treasure.respawn_turn = respawn_turn
+            if respawn_turn >= 0:
+                self.schedule.add_respawn(respawn_turn, treasure)
+            del treasure.is_available_history[history_length:]
+
+        end_turns = iter(snapshot.end_turns)
+        for map_objects in (self.powerups, self.scripts, self.anti_scripts):
+            for map_object in map_objects:
+                map_object.end_turn = next(end_turns)
+
+        self.bermuda_zones = [bermuda_zone for bermuda_zone, _ in snapshot.bermuda_zones]
+        for bermuda_zone, active_turns in snapshot.bermuda_zones:
+            bermuda_zone.active_turns = active_turns
+
+        self.pirate_index = SpatialIndex(self.living_pirates)
+        self.turn_state = None
+
     def start_game(self):
         """
         Called by engine at the start of the game
@@ -1515,29 +1767,28 @@ class PiratesGame(Game):
         self.turn += 1
         for player in self.players:
             player.orders = []
+        self.turn_state = None
 
     def finish_turn(self):
         """
         Called by engine at the end of the turn
 
         """
-        self.do_orders()  # moves the pirates on the map
-        self.do_sober()  # handles drunk history and removes drunk pirates who are sober
-        self.do_attack()  # handles attacking pirates
-        self.do_defense()  # handles defending pirates
-        self.do_cloak()  # handles cloaking pirates
-        self.do_bermuda_effect()  # kills all pirates in bermuda zone if they do not belong to the player who summoned
-        #  it, and updates bermuda zone counter
-        self.do_treasures()  # handles treasure - collecting and unloading
-        self.do_powerups()  # handles powerups
-        self.do_scripts()  # handles scripts
-        self.do_spawn()  # spawns new pirates
+        for phase in TURN_PHASES:
+            getattr(self, phase)()
+
+    def record_turn_scores(self):
+        """
+        Records the scores of the turn that ended, and updates the rankings
 
+        """
         # calculate the score for history
         for player in self.players:
             player.score_history.append(player.score)
 
         self.calculate_turn_significance()
+        self.update_cutoff()
+        self.turn_state = None
 
     def calculate_turn_significance(self):
         """
@@ -1546,11 +1797,14 @@ class PiratesGame(Game):
         """
         # The index of the score is the id of the player it belongs to, so this turns the score list into the list
         # player ids ordered by their score
-        ranking_bots = [sorted(self.score, reverse=True).index(score) for score in self.score]
+        scores = self.score
+        sorted_scores = sorted(scores, reverse=True)
+        ranking_bots = [sorted_scores.index(score) for score in scores]
         if self.ranking_bots != ranking_bots:
             self.ranking_turn = self.turn
         self.ranking_bots = ranking_bots
-        winning_bot = [player_id for player_id in range(len(self.score)) if self.score[player_id] == max(self.score)]
+        max_score = max(scores)
+        winning_bot = [player_id for player_id in range(len(scores)) if scores[player_id] == max_score]
         if self.winning_bot != winning_bot:
             self.winning_turn = self.turn
         self.winning_bot = winning_bot
@@ -1585,6 +1839,7 @@ class PiratesGame(Game):
                   'attack_radius2': self.attack_radius,
                   'cloak_duration': self.cloak_duration,
                   'bermuda_zone_active_turns': self.bermuda_zone_active_turns,
+                  'bermuda_zone_radius_2': self.bermuda_zone_radius,
                   'required_scripts_num': self.required_scripts_num,
                   'player_seed': self.player_seed,
                   'cyclic': int(self.cyclic),  # send whether map is cyclic or not
@@ -1608,34 +1863,186 @@ class PiratesGame(Game):
 
         return result
 
+    def get_turn_state(self):
+        """
+        Returns the state of the current turn, without any player's perspective.
+        The state is built once per turn and shared by all of the players' views, so it must not be modified.
+
+        :return: a dict describing the state, as in get_state_changes, with the scores of all of the players
+        :rtype: dict[str, any]
+        """
+        if self.turn_state is None:
+            turn_state = self.get_state_changes()
+            turn_state['game_scores'] = self.score
+            turn_state['last_turn_points'] = self.get_last_turn_points()
+            turn_state['num_of_scripts'] = self.num_scripts
+            self.turn_state = turn_state
+        return self.turn_state
+
     def get_player_state(self, player_id):
         """
         Creates a dict which communicates the updates to the state.
         All visible transient objects are included.
         Used to tell the bots the changes to the game state.
+        The view is derived from the shared turn state, only the objects holding player ids are copied, so the
+        returned objects must not be modified.
 
         :param player_id: the id of the player who's perspective we use
         :type player_id: int
         :return: a dict describing the updates to the state
         :rtype: dict[str, any]
         """
-        render_dict = self.get_state_changes()
-        # next list all transient objects
-        for key, value in render_dict.iteritems():
-            # switch player perspective of player numbers
-            for sub_part in value:
-                # if pirate, hide its location from enemy
-                if sub_part['type'] in ['pirate', 'dead_pirate', 'bermuda_zone']:
-                    sub_part['owner'] = self.perspectives_key[player_id][sub_part['owner']]
-                elif sub_part['type'] == 'player':
-                    sub_part['id'] = self.perspectives_key[player_id][sub_part['id']]
-
-        render_dict['game_scores'] = self.order_for_player(player_id, self.score)
-        render_dict['last_turn_points'] = self.order_for_player(player_id, self.get_last_turn_points())
-        render_dict['num_of_scripts'] = self.order_for_player(player_id, self.num_scripts)
+        turn_state = self.get_turn_state()
+        render_dict = dict(turn_state)
+        # switch player perspective of player numbers, player 0 already sees the turn state from his perspective
+        perspective_key = self.perspectives_key[player_id]
+        if perspective_key != range(len(perspective_key)):
+            for key in ('pirates', 'dead_pirates', 'bermuda_zones'):
+                render_dict[key] = [dict(sub_part, owner=perspective_key[sub_part['owner']])
+                                    for sub_part in turn_state[key]]
+            render_dict['players'] = [dict(sub_part, id=perspective_key[sub_part['id']])
+                                      for sub_part in turn_state['players']]
+
+        render_dict['game_scores'] = self.order_for_player(player_id, turn_state['game_scores'])
+        render_dict['last_turn_points'] = self.order_for_player(player_id, turn_state['last_turn_points'])
+        render_dict['num_of_scripts'] = self.order_for_player(player_id, turn_state['num_of_scripts'])
 
         return render_dict
 
+    @classmethod
+    def from_player_state(cls, settings, state, turn, bermuda_zone_radius):
+        """
+        Creates a game from a player's view of a turn, so the rest of the turn can be played with the game's rules.
+        The player is player 0 of the new game. Values the players aren't sent are guessed: pirates aren't cloaked,
+        powerups run out after the turn, and treasures that are neither on the map nor carried are left out.
+
+        :param settings: the game settings, as returned by get_player_start
+        :type settings: dict[str, any]
+        :param state: the player's view of the turn, as returned by get_player_state
+        :type state: dict[str, any]
+        :param turn: the turn of the view
+        :type turn: int
+        :param bermuda_zone_radius: the squared radius of the bermuda zones
+        :type bermuda_zone_radius: int
+        :return: the new game, on the given turn
+        :rtype: PiratesGame
+        """
+        num_players = settings['num_players']
+        map_lines = ['rows %d' % settings['rows'], 'cols %d' % settings['cols'], 'players %d' % num_players]
+        map_lines += ['m ' + MAP_OBJECTS[LAND] * settings['cols']] * settings['rows']
+        game = cls({'map': '\n'.join(map_lines),
+                    'turns': settings['max_turns'],
+                    'max_points': settings['max_points'],
+                    'load_time': settings['load_time'],
+                    'turn_time': settings['turn_time'],
+                    'recover_errors': settings['recover_errors'],
+                    'cyclic': bool(settings['cyclic']),
+                    'init_turn': 0,
+                    'randomize_sail_options': settings['randomize_sail_options'],
+                    'engine_seed': settings['player_seed'],
+                    'player_seed': settings['player_seed'],
+                    'attack_radius2': settings['attack_radius2'],
+                    'reload_turns': settings['reload_turns'],
+                    'defense_reload_turns': settings['defense_reload_turns'],
+                    'max_defense_turns': settings['max_defense_turns'],
+                    'turns_to_sober': settings['turns_to_sober'],
+                    'bermuda_zone_radius_2': bermuda_zone_radius,
+                    'bermuda_zone_active_turns': settings['bermuda_zone_active_turns'],
+                    'required_scripts_num': settings['required_scripts_num'],
+                    'actions_per_turn': settings['actions_per_turn'],
+                    'spawn_turns': settings['spawn_turns'],
+                    'treasure_spawn_turns': settings['treasure_spawn_turns'],
+                    'bot_names': settings.get('bot_names') or [str(player_id) for player_id in range(num_players)],
+                    'cloak_duration': settings['cloak_duration'],
+                    'cloak_reload_turns': 0})
+        game.turn = turn
+
+        for player, score, last_turn_points, num_scripts in zip(game.players, state['game_scores'],
+                                                                state['last_turn_points'], state['num_of_scripts']):
+            player.score = score
+            player.score_history = [score - last_turn_points, score]
+            player.num_scripts = num_scripts
+
+        # the treasures on the map and the treasures carried by pirates
+        treasures = {}
+        for treasure_data in state['treasures']:
+            treasures[treasure_data['id']] = Treasure(treasure_data['id'], Location(*treasure_data['initial_location']),
+                                                      treasure_data['value'])
+        for pirate_data in state['pirates']:
+            if pirate_data['treasure_id'] != -1:
+                treasure = Treasure(pirate_data['treasure_id'], Location(*pirate_data['treasure_initial_location']),
+                                    pirate_data['treasure_value'])
+                treasure.is_available = False
+                treasures[treasure.id] = treasure
+        game.treasures = [treasures[treasure_id] for treasure_id in sorted(treasures)]
+        game.treasure_index = SpatialIndex(game.treasures)
+
+        for pirate_data in state['pirates']:
+            owner = game.players[pirate_data['owner']]
+            pirate = game.create_pirate(Location(*pirate_data['location']), owner, pirate_data['id'])
+            pirate.initial_location = Location(*pirate_data['initial_location'])
+            pirate.turns_to_sober = pirate_data['turns_to_sober']
+            pirate.reload_turns = pirate_data['reload_turns']
+            pirate.defense_reload_turns = pirate_data['defense_reload_turns']
+            pirate.defense_expiration_turns = pirate_data['defense_expiration_turns']
+            pirate.carry_treasure_speed = pirate_data['carry_treasure_speed']
+            pirate.attack_radius = pirate_data['attack_radius']
+            pirate.powerups = list(pirate_data['powerups'])
+            if pirate.attack_radius != game.attack_radius:
+                pirate.attack_powerup_active_turns = 1
+            if 'rob' in pirate.powerups:
+                pirate.rob_powerup_active_turns = 1
+            if 'speed' in pirate.powerups:
+                pirate.speed_powerup_active_turns = 1
+            if pirate_data['treasure_id'] != -1:
+                pirate.treasure = treasures[pirate_data['treasure_id']]
+            game.map[pirate.location] = owner.id
+            game.pirate_index.add(pirate)
+            owner.add_pirate(pirate)
+            owner.add_living_pirate(pirate)
+            if pirate.turns_to_sober > 0:
+                owner.add_drunk_pirate(pirate)
+
+        for pirate_data in state['dead_pirates']:
+            owner = game.players[pirate_data['owner']]
+            pirate = game.create_pirate(Location(*pirate_data['location']), owner, pirate_data['id'])
+            pirate.initial_location = Location(*pirate_data['initial_location'])
+            pirate.attack_radius = pirate_data['attack_radius']
+            pirate.turns_to_revive = pirate_data['turns_to_revive']
+            pirate.is_lost = True
+            owner.add_pirate(pirate)
+            owner.add_dead_pirate(pirate)
+
+        for powerup_data in state['powerups']:
+            powerup_type = powerup_data['powerup_type']
+            powerup_args = (powerup_data['id'], Location(*powerup_data['location']), turn, powerup_data['end_turn'],
+                            powerup_data['active_turns'])
+            if powerup_type == 'AttackPowerup':
+                powerup = AttackPowerup(*(powerup_args + (powerup_data['value'],)))
+            elif powerup_type == 'RobPowerup':
+                powerup = RobPowerup(*powerup_args)
+            elif powerup_type == 'SpeedPowerup':
+                powerup = SpeedPowerup(*(powerup_args + (powerup_data['value'],)))
+            else:
+                raise TypeError('Unknown powerup type')
+            game.powerups.append(powerup)
+        game.powerup_index = SpatialIndex(game.powerups)
+
+        game.scripts = [Script(script_data['id'], Location(*script_data['location']), turn, script_data['end_turn'])
+                        for script_data in state['scripts']]
+        game.script_index = SpatialIndex(game.scripts)
+        game.anti_scripts = [Script(script_data['id'], Location(*script_data['location']), turn,
+                                    script_data['end_turn'])
+                             for script_data in state['anti_scripts']]
+        game.anti_script_index = SpatialIndex(game.anti_scripts)
+        game.schedule = TurnSchedule({'powerups': game.powerups, 'scripts': game.scripts,
+                                      'anti_scripts': game.anti_scripts})
+
+        game.bermuda_zones = [BermudaZone(zone_data['owner'], zone_data['active_turns'], turn,
+                                          Location(*zone_data['center']), zone_data['radius'])
+                              for zone_data in state['bermuda_zones']]
+        return game
+
     def is_alive(self, player_id):
         """
         Determines if a player is still alive
@@ -1808,29 +2215,35 @@ class PiratesGame(Game):
             'cutoff': self.end_of_game_reason
         }
 
-        for pirate in self.all_pirates:
-            pirate_data = [pirate.initial_location.row, pirate.initial_location.col, pirate.spawn_turn]  # 2
-            if not pirate.die_turn:
-                pirate_data.append(self.turn + 1)  # 3
-            else:
-                pirate_data.append(pirate.die_turn)  # 3
-            pirate_data.append(pirate.owner.id)  # 4
-            pirate_data.append(pirate.orders)  # 5
-            pirate_data.append(pirate.id)  # 6
-            pirate_data.append(pirate.reason_of_death)  # 7
-            pirate_data.append(''.join([str(i) for i in pirate.treasure_history]))  # 8
-            pirate_data.append(pirate.attack_turns)  # 9
-            pirate_data.append(pirate.defense_turns)  # 10
-            pirate_data.append(''.join(['1' if i else '0' for i in pirate.drink_history]))  # 11
-            pirate_data.append(pirate.attack_radius_history)  # 12
-            pirate_data.append(''.join(['1' if i else '0' for i in pirate.rob_powerup_history]))  # 13
-            pirate_data.append(''.join(['1' if i else '0' for i in pirate.speed_powerup_history]))  # 14
-
-            replay['pirates'].append(pirate_data)
+        # a pirate per life, in the order the lives of each player started. life[0] is the spawn index of the life
+        for player in self.players:
+            lives = [(life[0], life, pirate) for pirate in player.all_pirates for life in pirate.get_lives()]
+            lives.sort(key=itemgetter(0))
+            for _, life, pirate in lives:
+                (_, spawn_turn, die_turn, reason_of_death, orders, attack_turns, defense_turns, _, treasure_history,
+                 drink_history, attack_radius_history, rob_powerup_history, speed_powerup_history) = life
+                pirate_data = [pirate.initial_location.row, pirate.initial_location.col, spawn_turn]  # 2
+                if not die_turn:
+                    pirate_data.append(self.turn + 1)  # 3
+                else:
+                    pirate_data.append(die_turn)  # 3
+                pirate_data.append(pirate.owner.id)  # 4
+                pirate_data.append(orders)  # 5
+                pirate_data.append(pirate.id)  # 6
+                pirate_data.append(reason_of_death)  # 7
+                pirate_data.append(treasure_history.to_string())  # 8
+                pirate_data.append(attack_turns)  # 9
+                pirate_data.append(defense_turns)  # 10
+                pirate_data.append(drink_history.to_string())  # 11
+                pirate_data.append(attack_radius_history.to_list())  # 12
+                pirate_data.append(rob_powerup_history.to_string())  # 13
+                pirate_data.append(speed_powerup_history.to_string())  # 14
+
+                replay['pirates'].append(pirate_data)
 
         for treasure in self.treasures:
             replay['treasures'].append([treasure.id, treasure.initial_location.as_tuple, treasure.value,
-                                        ''.join(['1' if i else '0' for i in treasure.is_available_history])])
+                                        treasure.is_available_history.to_string()])
 
         for powerup in self.powerups:
             replay['powerups'].append(
@@ -1854,6 +2267,8 @@ class Powerup(MapObject):
     """
     This class represents the powerup in-game object, a powerup makes the pirate who picks it stronger for a while.
     """
+    __slots__ = ('id', 'location', 'start_turn', 'end_turn', 'active_turns')
+
     def __init__(self, powerup_id, location, start_turn, end_turn, active_turns):
         """
         Initiates the powerup
@@ -1917,6 +2332,8 @@ class AttackPowerup(Powerup):
     The attack powerup increases the attack radius of the pirate who
     picks it up, and allows it to attack without reloading.
     """
+    __slots__ = ('attack_radius',)
+
     def __init__(self, powerup_id, location, start_turn, end_turn, active_turns, attack_radius):
         """
         Initiates the speed powerup
@@ -1967,6 +2384,8 @@ class RobPowerup(Powerup):
     """
     The rob powerup allows the pirate who picks it up to steal a treasure from another pirate when attacking it.
     """
+    __slots__ = ()
+
     def __init__(self, powerup_id, location, start_turn, end_turn, active_turns):
         Powerup.__init__(self, powerup_id, location, start_turn, end_turn, active_turns)
 
@@ -1996,6 +2415,8 @@ class SpeedPowerup(Powerup):
     """
     The speed powerup allows the pirate who picks it to move more steps while carrying a treasure.
     """
+    __slots__ = ('carry_treasure_speed',)
+
     def __init__(self, powerup_id, location, start_turn, end_turn, active_turns, carry_treasure_speed):
         """
         Initiates the speed powerup
@@ -2044,6 +2465,8 @@ class Script(MapObject):
     """
     The script class. Scripts are collected in order to summon a deadly Bermuda Zone.
     """
+    __slots__ = ('id', 'location', 'start_turn', 'end_turn')
+
     def __init__(self, script_id, location, start_turn, end_turn):
         """
         Initiates the script
@@ -2082,6 +2505,9 @@ class Treasure(MapObject):
     """
     The treasure class, treasures are collected for points in order to win the game.
     """
+    __slots__ = ('id', 'location', 'value', 'initial_location', 'is_available', 'is_available_history',
+                 'respawn_turn')
+
     def __init__(self, treasure_id, location, value, initial_location=None):
         """
         Initiates the treasure
@@ -2112,10 +2538,11 @@ class Treasure(MapObject):
         # true if doesnt belong to any pirate
         self.is_available = True
         """:type : bool"""
-        self.is_available_history = []
-        """:type : list[bool]"""
+        self.is_available_history = ChangeHistory()
+        """:type : ChangeHistory"""
 
-        self.spawn_turns = -1
+        # the turn the treasure respawns on after it was unloaded, -1 if it isn't waiting to respawn
+        self.respawn_turn = -1
         """:type : int"""
 
     def __str__(self):
@@ -2168,10 +2595,42 @@ class BermudaZone(object):
         """:type : int"""
 
 
+class GameSnapshot(object):
+    """
+    The live state of a game, as saved by PiratesGame.snapshot. The state is kept in tuples and is only meant to be
+    passed back to PiratesGame.restore of the same game.
+    """
+    def __init__(self):
+        self.game_values = None
+        """:type : tuple"""
+        self.random_state = None
+        """:type : tuple"""
+        self.map_cells = None
+        """:type : array"""
+        # the values and the pirate lists of each player
+        self.players = []
+        """:type : list[tuple]"""
+        # each pirate with its values, its powerups, the amount of its previous lives and the lengths of its histories
+        self.pirates = []
+        """:type : list[(Pirate, tuple, tuple[str], int, tuple[int])]"""
+        self.treasures = []
+        """:type : list[(bool, int, int)]"""
+        # the end turns of the powerups, scripts and anti scripts, in this order
+        self.end_turns = []
+        """:type : list[int]"""
+        self.bermuda_zones = []
+        """:type : list[(BermudaZone, int)]"""
+
+
 class Pirate(BasePirate):
     """
     The Pirate class. The pirates are controlled by the players.
     """
+    __slots__ = ('incarnations', 'spawn_index', 'spawn_turn', 'attack_turns', 'die_turn', 'drink_turns', 'orders',
+                 'reason_of_death', 'treasure_history', 'drink_history', 'defense_turns', 'attack_powerup_active_turns',
+                 'attack_radius_history', 'rob_powerup_active_turns', 'rob_powerup_history',
+                 'speed_powerup_active_turns', 'speed_powerup_history')
+
     def __init__(self, location, owner, pirate_id, attack_radius, max_defense_turns, spawn_turn=None):
         """
         :param location: the initial location of the pirate
@@ -2190,6 +2649,21 @@ class Pirate(BasePirate):
 
         super(Pirate, self).__init__(location, owner, pirate_id, 6, location, attack_radius, max_defense_turns)
 
+        # the values of each previous life of the pirate, in the order of PIRATE_LIFE_FIELDS
+        self.incarnations = []
+        """:type : list[tuple]"""
+        self.start_life(spawn_turn)
+
+    def start_life(self, spawn_turn):
+        """
+        Sets the values that start over on every life of the pirate
+
+        :param spawn_turn: the turn the pirate spawned on
+        :type spawn_turn: int
+        """
+        # the order of this life among the spawns of the owner's pirates, see Player.number_spawn
+        self.spawn_index = 0
+        """:type : int"""
         # the turn this pirate spawned on
         self.spawn_turn = spawn_turn
         """:type : int"""
@@ -2208,13 +2682,13 @@ class Pirate(BasePirate):
         self.reason_of_death = ''
         """:type : str"""
 
-        # list of ints, indicating the value of the treasure the pirate carries. (0 if the pirate didn't carry a
-        # treasure in a certain turn)
-        self.treasure_history = []
-        """:type : list[int]"""
-        # list of booleans, indicates if the pirate was drunk this turn
-        self.drink_history = []
-        """:type : list[bool]"""
+        # the value of the treasure the pirate carries on each turn (0 if the pirate didn't carry a treasure in a
+        # certain turn)
+        self.treasure_history = ChangeHistory()
+        """:type : ChangeHistory"""
+        # indicates if the pirate was drunk on each turn
+        self.drink_history = ChangeHistory()
+        """:type : ChangeHistory"""
 
         # defense
         # list of turns this pirate defended on
@@ -2225,25 +2699,59 @@ class Pirate(BasePirate):
         # the amount of turns until this pirate will no longer have attack powerup
         self.attack_powerup_active_turns = 0
         """:type : int"""
-        # list of the attack_radius this pirate have on each turn
-        self.attack_radius_history = []
-        """:type : list[int]"""
+        # the attack_radius this pirate have on each turn
+        self.attack_radius_history = ChangeHistory()
+        """:type : ChangeHistory"""
 
         # rob powerup
         # the amount of turns until this pirate will no longer have rob powerup
         self.rob_powerup_active_turns = 0
         """:type : int"""
-        # list of booleans, indicates if the pirate had rob powerup or not on each turn
-        self.rob_powerup_history = []
-        """:type : list[bool]"""
+        # indicates if the pirate had rob powerup or not on each turn
+        self.rob_powerup_history = ChangeHistory()
+        """:type : ChangeHistory"""
 
         # speed powerup
         # the amount of turns until this pirate will no longer have speed powerup
         self.speed_powerup_active_turns = 0
         """:type : int"""
-        # list of booleans, indicates if the pirate had speed powerup or not on each turn
-        self.speed_powerup_history = []
-        """:type : list[bool]"""
+        # indicates if the pirate had speed powerup or not on each turn
+        self.speed_powerup_history = ChangeHistory()
+        """:type : ChangeHistory"""
+
+    def reincarnate(self, attack_radius, spawn_turn):
+        """
+        Brings the pirate back to life at its initial location. The values of the life that ended are kept in
+        incarnations, and the pirate starts over with the values of a new pirate.
+
+        :param attack_radius: the pirate's squared attack radius
+        :type attack_radius: int
+        :param spawn_turn: the turn the pirate spawned on
+        :type spawn_turn: int
+        """
+        self.incarnations.append(get_pirate_life(self))
+        self.location = self.initial_location
+        self.is_lost = False
+        self.turns_to_revive = 0
+        self.reload_turns = 0
+        self.defense_reload_turns = 0
+        self.defense_expiration_turns = 0
+        self.turns_to_sober = 0
+        self.cloak_turns = 0
+        self.treasure = None
+        self.attack_radius = attack_radius
+        self.carry_treasure_speed = 1
+        self.powerups = []
+        self.start_life(spawn_turn)
+
+    def get_lives(self):
+        """
+        Returns the values of each life of the pirate, the previous ones and the current one
+
+        :return: the values of each life, in the order of PIRATE_LIFE_FIELDS
+        :rtype: list[tuple]
+        """
+        return self.incarnations + [get_pirate_life(self)]
 
     def __str__(self):
         """
@@ -17,13 +17,17 @@ except ImportError:
 import cPickle
 
 from pirates import PiratesGame
+from vectorized import VectorizedPiratesGame
+from StateDelta import DELTA_PROTOCOL
+from CompactProtocol import COMPACT_PROTOCOL
+from headless import HeadlessEngine
 
 # verify we are running in python 2.7
 if not (sys.version_info[0] == 2 and sys.version_info[1] == 7):
     print("You are running from python %d.%d. Run from Python 2.7 instead!" % list(sys.version_info[0:2]))
     sys.exit(-1)
 try:
-    from engine import run_game
+    from engine import run_game, AsyncEngine, GameScheduler
 except ImportError:
     # this can happen if we're launched with cwd outside our own dir
     # get our full path, then work relative from that
@@ -31,7 +35,7 @@ except ImportError:
     if cmd_folder not in sys.path:
         sys.path.insert(0, cmd_folder)
     # try again
-    from engine import run_game
+    from engine import run_game, AsyncEngine, GameScheduler
 
 # make stderr red text
 try:
@@ -235,6 +239,14 @@ def run_rounds(arguments):
         bot_name = os.path.basename(cmd).split('.')[0]
         return working_dir, filepath, bot_name
 
+    if arguments.headless:
+        # headless games write no logs and no replay
+        arguments.log_dir = None
+        arguments.log_replay = arguments.log_stream = False
+        arguments.log_input = arguments.log_output = arguments.log_error = False
+        arguments.log_stderr = arguments.log_stdout = False
+        arguments.verbose = arguments.debug = False
+
     # this split of options is not needed, but left for documentation
     game_options = {
         "map": arguments.map,
@@ -264,7 +276,7 @@ def run_rounds(arguments):
         game_options['player_seed'] = arguments.player_seed
     if arguments.engine_seed is not None:
         game_options['engine_seed'] = arguments.engine_seed
-    engine_options = {
+    base_engine_options = {
         "show_traceback": arguments.show_traceback,
         "load_time": arguments.load_time,
         "turn_time": arguments.turn_time,
@@ -284,8 +296,23 @@ def run_rounds(arguments):
         "capture_errors": arguments.capture_errors,
         "secure_jail": arguments.secure_jail,
         "end_wait": arguments.end_wait}
+    if arguments.delta_state:
+        base_engine_options['state_protocol'] = DELTA_PROTOCOL
+    if arguments.compact_protocol:
+        base_engine_options['wire_protocol'] = COMPACT_PROTOCOL
+
+    def setup_round(round1):
+        """
+        Sets up a round, creating its game and opening its logs.
+
+        :param round1: the number of the round
+        :type round1: int
+        :return: the game, bots, engine options, game id, zip encapsulator, replay path and replay logs of the round
+        :rtype: dict[str, any]
+        """
+        # every round has its own options, so the logs of concurrent games are kept apart
+        engine_options = dict(base_engine_options)
 
-    for round1 in range(arguments.rounds):
         # initialize bots
         zip_encapsulator_object = ZipEncapsulator()
         bots = [get_bot_paths(bot, zip_encapsulator_object) for bot in arguments.bot]
@@ -305,6 +332,8 @@ def run_rounds(arguments):
             with open(arguments.load_pickled_game, 'r') as f:
                 game = cPickle.load(f)
                 game.init_turn = game.turn
+        elif arguments.engine_backend == 'numpy':
+            game = VectorizedPiratesGame(game_options)
         else:
             game = PiratesGame(game_options)
 
@@ -385,6 +414,8 @@ def run_rounds(arguments):
             print('# playgame round {0}, game id {1}'.format(round1, game_id))
 
         # intercept replay log so we can add player names
+        intcpt_replay_io = None
+        real_replay_io = None
         if arguments.log_replay:
             intcpt_replay_io = StringIO()
             real_replay_io = engine_options['replay_log']
@@ -415,13 +446,31 @@ def run_rounds(arguments):
         if arguments.regression_output_path:
             engine_options['regression_output_path'] = arguments.regression_output_path
 
-        result = run_game(game, bots, engine_options)
+        return {'game': game, 'bots': bots, 'engine_options': engine_options, 'game_id': game_id,
+                'zip_encapsulator': zip_encapsulator_object, 'replay_path': replay_path,
+                'replay_io': intcpt_replay_io, 'real_replay_io': real_replay_io}
+
+    def finish_round(game_round, result):
+        """
+        Writes the replay of a round that is over, closes its logs and launches the visualizer.
+
+        :param game_round: the round, as returned by setup_round
+        :type game_round: dict[str, any]
+        :param result: the replay data of the round
+        :type result: dict
+        """
+        engine_options = game_round['engine_options']
+        bots = game_round['bots']
+        game_id = game_round['game_id']
+        replay_path = game_round['replay_path']
 
         # destroy temporary directories
-        zip_encapsulator_object.close()
+        game_round['zip_encapsulator'].close()
 
         # add player names, write to proper io, reset back to normal
         if arguments.log_replay:
+            intcpt_replay_io = game_round['replay_io']
+            real_replay_io = game_round['real_replay_io']
             replay_json = json.loads(intcpt_replay_io.getvalue())
             replay_json['playernames'] = [b[2] for b in bots]
             real_replay_io.write(json.dumps(replay_json))
@@ -453,3 +502,27 @@ def run_rounds(arguments):
                 else:
                     visualizer.visualize_locally.launch(replay_path,
                                                         generated_path=arguments.html_file)
+
+    if arguments.headless:
+        for round1 in range(arguments.rounds):
+            game_round = setup_round(round1)
+            engine = HeadlessEngine(game_round['bots'], game_round['engine_options'], game_round['game'])
+            finish_round(game_round, engine.run_game())
+    elif arguments.concurrent_games > 1:
+        # run the rounds as concurrent games in this process, a round is only set up once its game can start
+        game_rounds = []
+
+        def create_engines():
+            for round1 in range(arguments.rounds):
+                game_round = setup_round(round1)
+                game_rounds.append(game_round)
+                yield AsyncEngine(game_round['bots'], game_round['engine_options'], game_round['game'])
+
+        scheduler = GameScheduler(arguments.concurrent_games)
+        scheduler.run(create_engines(),
+                      on_game_over=lambda game_number, result: finish_round(game_rounds[game_number], result))
+    else:
+        for round1 in range(arguments.rounds):
+            game_round = setup_round(round1)
+            result = run_game(game_round['game'], game_round['bots'], game_round['engine_options'])
+            finish_round(game_round, result)
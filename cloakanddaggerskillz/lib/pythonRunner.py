@@ -3,6 +3,7 @@
 The runner module. Used to run python bots.
 """
 import sys
+import copy
 import traceback
 import random
 import base64
@@ -12,6 +13,9 @@ import imp
 from PirateClass import BasePirate
 from MapObject import MapObject
 from LocationClass import Location
+import Directions
+from StateDelta import DELTA_PROTOCOL, apply_delta
+from CompactProtocol import COMPACT_PROTOCOL, format_compact, parse_compact, is_compact
 
 import json  # Used for serializing the data communication.
 
@@ -48,7 +52,8 @@ def format_data(data, prettify=False):
 
 def parse_data(data_str):
     """
-    This turns the received data into a dictionary or list using json.
+    This turns the received data into a dictionary or list using json, or using the compact protocol if the data is a
+    compact frame.
     --Warning--
     --Warning--
     Tuples will be turned into lists in the json data.
@@ -60,6 +65,8 @@ def parse_data(data_str):
     """
     # Json data might be incorrect so try and catch is used.
     try:
+        if is_compact(data_str):
+            return parse_compact(data_str)
         return json.loads(data_str)
     except (ValueError, TypeError):
         return dict()
@@ -77,6 +84,21 @@ def sort_by_id(list_to_sort):
     return sorted(list_to_sort, key=lambda x: x.id)
 
 
+def copy_order(order):
+    """
+    Copies an order, so the game can validate it without changing the bot's order.
+
+    :param order: the order to copy
+    :type order: dict[str, any]
+    :return: the copy
+    :rtype: dict[str, any]
+    """
+    order = dict(order)
+    if isinstance(order.get('order_args'), dict):
+        order['order_args'] = dict(order['order_args'])
+    return order
+
+
 class Pirates(object):
     """
     The pirates game class, this holds all of the game data and basic API for the bots.
@@ -109,6 +131,9 @@ class Pirates(object):
         """:type : int"""
         self.randomize_sail_options = False  # don't randomize
         """:type : bool"""
+        # the runner's own random generator, seeded with the player seed
+        self._random = random.Random()
+        """:type : random.Random"""
 
         # map attributes
         self.cols = None
@@ -121,6 +146,12 @@ class Pirates(object):
         """:type : list[Treasure]"""
         self.all_pirates = []
         """:type : list[Pirate]"""
+        # the first pirate in all_pirates standing on each location, living or not
+        self._pirates_by_location = {}
+        """:type : dict[Location, Pirate]"""
+        # the locations of the living pirates
+        self._occupied_locations = set()
+        """:type : set[Location]"""
 
         # cloak
         self.cloak_reload_turns = 0
@@ -147,6 +178,8 @@ class Pirates(object):
         # scripts and bermuda zones settings
         self.bermuda_zone_active_turns = 0
         """:type : int"""
+        self.bermuda_zone_radius_2 = 0
+        """:type : int"""
         self.required_scripts_num = 0
         """:type : int"""
         self._num_scripts = []
@@ -186,6 +219,34 @@ class Pirates(object):
         self.initiated = False
         """:type : bool"""
 
+        # protocols
+        # the state protocol agreed on with the engine, None for the full state protocol
+        self._protocol = None
+        """:type : str"""
+        # the wire protocol agreed on with the engine, None for JSON
+        self._wire_protocol = None
+        """:type : str"""
+        # the protocols accepted during setup, that still have to be sent to the engine
+        self._accepted_protocols = []
+        """:type : list[str]"""
+        # the last state received with the delta protocol, None if there is none
+        self._state = None
+        """:type : dict[str, any]"""
+        # whether a resync has to be asked from the engine
+        self._resync = False
+        """:type : bool"""
+
+        # simulation
+        # the setup data received from the engine
+        self._settings = None
+        """:type : dict[str, any]"""
+        # the state of the current turn received from the engine
+        self._view_state = None
+        """:type : dict[str, any]"""
+        # the game simulate plays the current turn on and a snapshot to reset it with, None until simulate is called
+        self._simulation = None
+        """:type : (PiratesGame, pirates.GameSnapshot)"""
+
     def __setup(self, data):
         """
         This method parses the initial setup starting game consts and data.
@@ -203,7 +264,9 @@ class Pirates(object):
             'turn_time': 'turn_time',
             'load_time': 'load_time',
             'attack_radius2': 'attack_radius2',
+            'cloak_duration': 'cloak_duration',
             'bermuda_zone_active_turns': 'bermuda_zone_active_turns',
+            'bermuda_zone_radius_2': 'bermuda_zone_radius_2',
             'required_scripts_num': 'required_scripts_num',
             'max_turns': 'max_turns',
             'max_points': 'max_points',
@@ -221,6 +284,15 @@ class Pirates(object):
             'bot_names': '_bot_names',
             'recover_errors': '_recover_errors'
         }
+        # agree to the protocols the engine offers
+        offered_protocols = data.pop('protocols', [])
+        if DELTA_PROTOCOL in offered_protocols:
+            self._protocol = DELTA_PROTOCOL
+            self._accepted_protocols.append(DELTA_PROTOCOL)
+        if COMPACT_PROTOCOL in offered_protocols:
+            self._wire_protocol = COMPACT_PROTOCOL
+            self._accepted_protocols.append(COMPACT_PROTOCOL)
+
         # Check that no data is missing from the input data.
         for key, value in conversion_dictionary.iteritems():
             if key not in data.keys():
@@ -228,9 +300,10 @@ class Pirates(object):
             if not hasattr(self, value):
                 raise ValueError('Missing key {key} from self.'.format(key=value))
 
+        self._settings = dict(data)
         for key, value in data.iteritems():
             setattr(self, conversion_dictionary[key], value)
-        random.seed(self.player_seed)
+        self._random.seed(self.player_seed)
 
         # Make sure the runner knows it has been initiated.
         self.initiated = True
@@ -260,7 +333,7 @@ class Pirates(object):
 
         # Check that all expected keys are here.
         for expected_key in expected:
-            if expected_key not in data.keys():
+            if expected_key not in data:
                 raise ValueError('Expected key {key} missing from json data dictionary.'.format(key=expected_key))
 
         self.all_pirates = []
@@ -273,6 +346,8 @@ class Pirates(object):
         self._sorted_enemy_pirates = []
         self._orders = []
         self._debug_messages = []
+        self._view_state = data
+        self._simulation = None
         self.turn += 1
         # update map and create new pirate/treasure lists
         for key, value in data.iteritems():
@@ -340,7 +415,8 @@ class Pirates(object):
                     pirate_object.defense_expiration_turns = pirate['defense_expiration_turns']
                     pirate_object.carry_treasure_speed = pirate['carry_treasure_speed']
                     pirate_object.attack_radius = pirate['attack_radius']
-                    pirate_object.powerups = pirate['powerups']
+                    # the state may be shared with the engine, so the bot gets a list of its own
+                    pirate_object.powerups = list(pirate['powerups'])
 
                     treasure_id = pirate['treasure_id']
                     if treasure_id != -1:
@@ -371,12 +447,44 @@ class Pirates(object):
             else:
                 raise ValueError('Unrecognized key in the json dict.')
 
+        # index the pirates by location
+        self._pirates_by_location = {}
+        self._occupied_locations = set()
+        for pirate in self.all_pirates:
+            self._pirates_by_location.setdefault(pirate.location, pirate)
+            if not pirate.is_lost:
+                self._occupied_locations.add(pirate.location)
+
         # create main helper members which are lists sorted by IDs
         self._sorted_my_pirates = sort_by_id([pirate for pirate in self.all_pirates
                                               if pirate.owner == ME])
         self._sorted_enemy_pirates = sort_by_id([pirate for pirate in self.all_pirates
                                                 if pirate.owner != ME])
 
+    def __update_from_delta(self, delta):
+        """
+        Updates the state of the game objects from the changes since the last turn. If the changes don't fit the last
+        state, the turn is skipped and a resync is asked from the engine.
+
+        :param delta: the changes since the last turn, should be a delta dictionary from the engine.
+        :type delta: dict[str, any]
+        :return: whether the state was updated
+        :rtype: bool
+        """
+        try:
+            if self._state is None:
+                raise KeyError('No state to apply the changes to.')
+            apply_delta(self._state, delta)
+        except (KeyError, ValueError, TypeError):
+            self._state = None
+            self._resync = True
+            self._orders = []
+            self._debug_messages = []
+            self.turn += 1
+            return False
+        self.__update(self._state)
+        return True
+
     def __get_directions(self, loc1, loc2):
         """
         Determines the fastest (closest) directions to reach a destination from a given location
@@ -392,54 +500,9 @@ class Pirates(object):
 
         row1, col1 = self.get_location(loc1).as_tuple
         row2, col2 = self.get_location(loc2).as_tuple
-        half_map_height = self.rows//2
-        half_map_width = self.cols//2
-        distance = self.distance(loc1, loc2)
-
-        if row1 == row2 and col1 == col2:
-            # return a single move of 'do nothing'
-            return ['-']
-
-        directions = []
-        for i in range(distance):
-            if row1 < row2:
-                if row2 - row1 >= half_map_height and self.cyclic:
-                    directions.append('n')
-                    row1 -= 1
-                    continue
-                if row2 - row1 <= half_map_height or not self.cyclic:
-                    directions.append('s')
-                    row1 += 1
-                    continue
-            if row2 < row1:
-                if row1 - row2 >= half_map_height and self.cyclic:
-                    directions.append('s')
-                    row1 += 1
-                    continue
-                if row1 - row2 <= half_map_height or not self.cyclic:
-                    directions.append('n')
-                    row1 -= 1
-                    continue
-            if col1 < col2:
-                if col2 - col1 >= half_map_width and self.cyclic:
-                    directions.append('w')
-                    col1 -= 1
-                    continue
-                if col2 - col1 <= half_map_width or not self.cyclic:
-                    directions.append('e')
-                    col1 += 1
-                    continue
-            if col2 < col1:
-                if col1 - col2 >= half_map_width and self.cyclic:
-                    directions.append('e')
-                    col1 += 1
-                    continue
-                if col1 - col2 <= half_map_width or not self.cyclic:
-                    directions.append('w')
-                    col1 -= 1
-                    continue
+        directions = Directions.get_direction_letters(row1, col1, row2, col2, self.rows, self.cols, self.cyclic)
         if self.randomize_sail_options:
-            random.shuffle(directions)
+            self._random.shuffle(directions)
         return directions
 
     ''' Treasure related API '''
@@ -617,7 +680,7 @@ class Pirates(object):
         """
         # this will return an pirate or None if no pirate in that location
         location = self.get_location(obj)
-        return next((pirate for pirate in self.all_pirates if pirate.location == location), None)
+        return self._pirates_by_location.get(location)
 
     ''' Powerup API '''
 
@@ -744,7 +807,7 @@ class Pirates(object):
                             xrange(len(optional_direction) - moves + 1)]
 
         if self.randomize_sail_options:
-            random.shuffle(sail_options)
+            self._random.shuffle(sail_options)
 
         return sail_options
 
@@ -862,6 +925,49 @@ class Pirates(object):
             return True
         return False
 
+    ''' Simulation API '''
+
+    def simulate(self, my_orders=None, enemy_orders=None):
+        """
+        Plays the current turn with the game's own rules and returns the state the bot would get on the next turn.
+        The turn is played on a copy of the game built from the current state, so the result is exact, except for the
+        values the bots aren't sent: pirates are taken to be uncloaked, powerups to run out after the turn and the
+        treasures that are neither on the map nor carried to be gone.
+        The copy is built once a turn and reset between calls, and the result has the whole API of this object, so it
+        can be simulated again for rollouts.
+
+        :param my_orders: the orders of my pirates, in the format set_sail, attack, defend, cloak and
+        summon_bermuda_zone give them. The orders given so far this turn if None
+        :type my_orders: list[dict[str, any]]
+        :param enemy_orders: the orders of the enemy pirates, in the same format. The enemy does nothing if None
+        :type enemy_orders: list[dict[str, any]]
+        :return: the state of the next turn
+        :rtype: Pirates
+        """
+        if my_orders is None:
+            my_orders = self._orders
+        if self._simulation is None:
+            # the engine is only imported by the bots that simulate, so the others don't pay for loading it
+            from pirates import PiratesGame
+            game = PiratesGame.from_player_state(self._settings, self._view_state, self.turn,
+                                                 self.bermuda_zone_radius_2)
+            self._simulation = (game, game.snapshot())
+        else:
+            game, snapshot = self._simulation
+            game.restore(snapshot)
+
+        game.do_moves(self.ME, [copy_order(order) for order in my_orders])
+        game.do_moves(self.ENEMY, [copy_order(order) for order in enemy_orders or []])
+        game.finish_turn()
+        game.start_turn()
+
+        # the result shares the settings and the random generator of this object
+        result = copy.copy(self)
+        result.__update(game.get_player_state(self.ME))
+        # the result is part of this turn, so it shares its time
+        result.turn_start_time = self.turn_start_time
+        return result
+
     ''' Debug related API '''
 
     def debug(self, *args):
@@ -1055,7 +1161,7 @@ class Pirates(object):
         :return: True if the location is occupied, otherwise false
         :rtype: bool
         """
-        return loc in [pirate.location for pirate in self.all_pirates if not pirate.is_lost]
+        return loc in self._occupied_locations
 
     def get_rows(self):
         """
@@ -1121,13 +1227,84 @@ class Pirates(object):
         the case of an exception.
         :type debug_only: bool
         """
+        data = self._get_reply(debug_only)
+        if self._wire_protocol == COMPACT_PROTOCOL:
+            sys.stdout.write(format_compact({'type': 'bot_orders', 'data': data}))
+        else:
+            sys.stdout.write(format_data({'type': 'bot_orders', 'data': data}))
+        sys.stdout.flush()
+
+    def _get_reply(self, debug_only=False):
+        """
+        Returns the data of the reply to the engine, the wanted orders and debug messages.
+
+        :param debug_only: Whether to send only debug messages or all orders.
+        :type debug_only: bool
+        :return: the data of the bot_orders message
+        :rtype: dict[str, any]
+        """
         orders_to_send = self._orders
         if debug_only:
             orders_to_send = []
         messages_to_send = self._debug_messages
-        sys.stdout.write(format_data({'type': 'bot_orders', 'data': {'orders': orders_to_send,
-                                                                     'debug_messages': messages_to_send}}))
-        sys.stdout.flush()
+        data = {'orders': orders_to_send, 'debug_messages': messages_to_send}
+        if self._accepted_protocols:
+            data['protocols'] = self._accepted_protocols
+            self._accepted_protocols = []
+        if self._resync:
+            data['resync'] = True
+            self._resync = False
+        return data
+
+    def _handle_message(self, received_data, bot):
+        """
+        Handles a message from the engine, calling the bot's do_turn if the message starts a turn.
+
+        :param received_data: the message
+        :type received_data: dict[str, any]
+        :param bot: the bot to call do_turn on
+        :type bot: BotController
+        """
+        if 'type' not in received_data.keys():
+            raise TypeError('Missing type parameter from json dictionary.')
+        if 'data' not in received_data.keys():
+            raise TypeError('Missing data parameter from json dictionary.')
+
+        if received_data['type'] == 'setup':
+            self.__setup(received_data['data'])
+        elif received_data['type'] == 'turn':
+            # Make sure the runner has been initiated correctly.
+            if not self.initiated:
+                raise Exception('Attempt to run runner without initiating it first.')
+
+            if self._protocol == DELTA_PROTOCOL:
+                self._state = received_data['data']
+            self.__update(received_data['data'])
+            self.__do_turn(bot)
+        elif received_data['type'] == 'delta':
+            if not self.initiated:
+                raise Exception('Attempt to run runner without initiating it first.')
+
+            if self.__update_from_delta(received_data['data']):
+                self.__do_turn(bot)
+        else:
+            raise ValueError('Unrecognized json dictionary type, {type}.'.format(type=received_data['type']))
+
+    def __do_turn(self, bot):
+        """
+        Calls the do_turn method of the bot.
+
+        :param bot: the bot to call do_turn on
+        :type bot: BotController
+        """
+        if self._recover_errors:
+            try:
+                bot.do_turn(self)
+            except:
+                error_msg = "Exception occurred during do_turn: \n" + traceback.format_exc()
+                self.debug(error_msg)
+        else:
+            bot.do_turn(self)
 
     @staticmethod
     def create_location(row, col):
@@ -1159,30 +1336,10 @@ class Pirates(object):
             try:
                 if not received_data:
                     break
-                if 'type' not in received_data.keys():
-                    raise TypeError('Missing type parameter from json dictionary.')
-                if 'data' not in received_data.keys():
-                    raise TypeError('Missing data parameter from json dictionary.')
-
+                pirates._handle_message(received_data, bot)
                 if received_data['type'] == 'setup':
-                    pirates.__setup(received_data['data'])
-                elif received_data['type'] == 'turn':
-                    # Make sure the runner has been initiated correctly.
-                    if not pirates.initiated:
-                        raise Exception('Attempt to run runner without initiating it first.')
-
-                    pirates.__update(received_data['data'])
-                    # call the do_turn method of the class passed in
-                    if pirates._recover_errors:
-                        try:
-                            bot.do_turn(pirates)
-                        except:
-                            error_msg = "Exception occurred during do_turn: \n" + traceback.format_exc()
-                            pirates.debug(error_msg)
-                    else:
-                        bot.do_turn(pirates)
-                else:
-                    raise ValueError('Unrecognized json dictionary type, {type}.'.format(type=received_data['type']))
+                    # the bot has this process to itself, so the random module it may use is seeded as well
+                    random.seed(pirates.player_seed)
                 pirates.__finish_turn()
             except KeyboardInterrupt:
                 raise
@@ -1192,17 +1349,24 @@ class Pirate(BasePirate):
     """
     The Pirate class. Pirates are controlled by the players.
     """
+    # bots may keep attributes of their own on the objects, the __dict__ is only created once they do
+    __slots__ = ('__dict__',)
+
     def __repr__(self):
         return "<Pirate ID:%d Owner:%s Loc:%s>" % (self.id, self.owner, self.location.as_tuple)
 
     def __hash__(self):
-        return self.id * 10 + self.owner
+        # Cantor pairing of (id, owner), different pirates never share a hash code
+        key_sum = self.id + self.owner
+        return key_sum * (key_sum + 1) // 2 + self.owner
 
 
 class Powerup(MapObject):
     """
     The Powerup class. Powerups make the pirate who picks them up stronger for a while.
     """
+    __slots__ = ('id', 'type', 'location', 'active_turns', 'end_turn', '__dict__')
+
     def __init__(self, powerup_id, powerup_type, location, active_turns, end_turn):
         super(Powerup, self).__init__()
 
@@ -1234,6 +1398,8 @@ class RobPowerup(Powerup):
     """
     The RobPowerup allows the pirate who picks it to take treasures from other pirates by attacking the.
     """
+    __slots__ = ()
+
     def __init__(self, powerup_id, location, end_turn, active_turns):
         Powerup.__init__(self, powerup_id, "Rob", location, end_turn, active_turns)
 
@@ -1242,6 +1408,8 @@ class SpeedPowerup(Powerup):
     """
     The SpeedPowerup allows a pirate to take more steps while carrying a treasure
     """
+    __slots__ = ('carry_treasure_speed',)
+
     def __init__(self, powerup_id, location, end_turn, active_turns, carry_treasure_speed):
         Powerup.__init__(self, powerup_id, "Speed", location, end_turn, active_turns)
         self.carry_treasure_speed = carry_treasure_speed
@@ -1252,6 +1420,8 @@ class AttackPowerup(Powerup):
     """
     The AttackPowerup allows a pirate to attack without reloading, and increases its attack radius
     """
+    __slots__ = ('attack_radius',)
+
     def __init__(self, powerup_id, location, end_turn, active_turns, attack_radius):
         Powerup.__init__(self, powerup_id, "Attack", location, end_turn, active_turns)
         self.attack_radius = attack_radius
@@ -1262,6 +1432,8 @@ class Script(MapObject):
     """
     The Scripts are collected in order to summon a deadly Bermuda Zone
     """
+    __slots__ = ('id', 'location', 'end_turn', '__dict__')
+
     def __init__(self, script_id, loc, end_turn):
         super(Script, self).__init__()
 
@@ -1289,6 +1461,8 @@ class Treasure(MapObject):
     """
     The Treasures are collected in order to gain points and win the game
     """
+    __slots__ = ('id', 'location', 'value', 'is_taken', '__dict__')
+
     def __init__(self, treasure_id, location, value, is_taken=False):
         """
 
@@ -1313,7 +1487,7 @@ class Treasure(MapObject):
         """:type : bool"""
 
     def __cmp__(self, other):
-        return type(other) is Treasure and self.__dict__ == other.__dict__
+        return type(other) is Treasure and self.__getstate__() == other.__getstate__()
 
     def __eq__(self, other):
         return self.__cmp__(other)
@@ -1348,17 +1522,23 @@ class BermudaZone(object):
 
 class BotController(object):
     """ Wrapper class for bot. May accept either a file or a directory and will add correct folder to path """
-    def __init__(self, runner_bot_path):
+    def __init__(self, runner_bot_path, module_name='bot'):
+        """
+        :param runner_bot_path: the path to the bot's file
+        :type runner_bot_path: str
+        :param module_name: the name to load the bot's module as, bots loaded in the same process need different names
+        :type module_name: str
+        """
         if runner_bot_path.endswith('.py'):
             file_directory, file_name = os.path.split(runner_bot_path)
             name, ext = os.path.splitext(file_name)
 
             module_file, file_name, description = imp.find_module(name, [file_directory])
-            self.bot = imp.load_module('bot', module_file, file_name, description)
+            self.bot = imp.load_module(module_name, module_file, file_name, description)
             """:type : module"""
             module_file.close()
         else:
-            self.bot = imp.load_compiled('bot', runner_bot_path)
+            self.bot = imp.load_compiled(module_name, runner_bot_path)
             """:type : module"""
 
     def do_turn(self, game):
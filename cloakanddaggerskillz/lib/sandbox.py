@@ -11,6 +11,7 @@ import string
 import stat
 from optparse import OptionParser
 from threading import Thread
+from io_loop import get_io_loop
 try:
     from Queue import Queue, Empty
 except ImportError:
@@ -34,31 +35,48 @@ except ImportError:
 class SandboxError(Exception):
     pass
 
+def _notify_ready(sandbox):
+    """Signal the sandbox's ready event, if it has one, that output is available"""
+    event = sandbox.ready_event
+    if event is not None:
+        event.set()
+
+def _guard_closed(jail):
+    end_item = (time.time(), None)
+    jail.resp_queue.put(end_item)
+    jail.stdout_queue.put(end_item)
+    jail.stderr_queue.put(end_item)
+    _notify_ready(jail)
+
+def _guard_line(jail, line):
+    line = line.rstrip("\r\n")
+    words = line.split(None, 2)
+    if len(words) < 2:
+        # not a message of the guard, skip it
+        return
+    msg, ts = words[:2]
+    data = words[2] if len(words) > 2 else ""
+    try:
+        ts = float(ts)
+    except ValueError:
+        return
+    data = unicode(data, errors="replace")
+    if msg == "STDOUT":
+        jail.stdout_queue.put((time, data))
+    elif msg == "STDERR":
+        jail.stderr_queue.put((time, data))
+    elif msg == "SIGNALED":
+        jail.resp_queue.put((time, data))
+    _notify_ready(jail)
+
 def _guard_monitor(jail):
     guard_out = jail.command_process.stdout
     while True:
         line = guard_out.readline()
         if not line:
-            end_item = (time.time(), None)
-            jail.resp_queue.put(end_item)
-            jail.stdout_queue.put(end_item)
-            jail.stderr_queue.put(end_item)
+            _guard_closed(jail)
             break
-        line = line.rstrip("\r\n")
-        words = line.split(None, 2)
-        if len(words) < 3:
-            msg, ts = words
-            data = ""
-        else:
-            msg, ts, data = words
-        ts = float(ts)
-        data = unicode(data, errors="replace")
-        if msg == "STDOUT":
-            jail.stdout_queue.put((time, data))
-        elif msg == "STDERR":
-            jail.stderr_queue.put((time, data))
-        elif msg == "SIGNALED":
-            jail.resp_queue.put((time, data))
+        _guard_line(jail, line)
 
 class Jail(object):
     """ Provide a secure sandbox to run arbitrary commands in.
@@ -104,6 +122,8 @@ class Jail(object):
         self.resp_queue = Queue()
         self.stdout_queue = Queue()
         self.stderr_queue = Queue()
+        # set whenever the child's output becomes available, see set_ready_event
+        self.ready_event = None
         self._prepare_with(working_directory)
 
     def __del__(self):
@@ -193,9 +213,14 @@ class Jail(object):
         except OSError as e:
             raise SandboxError('Failed to start {0} due to {1}'.format(shell_command, str(e)))
         self._is_alive = True
-        monitor = Thread(target=_guard_monitor, args=(self,))
-        monitor.daemon = True
-        monitor.start()
+        io_loop = get_io_loop()
+        if io_loop is not None:
+            io_loop.add_reader(self.command_process.stdout.fileno(),
+                               lambda line: _guard_line(self, line), lambda: _guard_closed(self))
+        else:
+            monitor = Thread(target=_guard_monitor, args=(self,))
+            monitor.daemon = True
+            monitor.start()
 
     def _signal(self, signal):
         if not self.locked:
@@ -319,6 +344,13 @@ class Jail(object):
         except Empty:
             return None
 
+    def set_ready_event(self, event):
+        """Set a threading.Event to be set whenever a line of the child's
+        stdout or stderr becomes available, or the child's output ends
+
+        """
+        self.ready_event = event
+
     def check_path(self, path, errors):
         resolved_path = os.path.join(self.home_dir, path)
         if not os.path.exists(resolved_path):
@@ -328,15 +360,81 @@ class Jail(object):
             return True
 
 
-def _monitor_file(fd, q):
+def _queue_line(sandbox, q, line):
+    if line is not None:
+        line = unicode(line, errors="replace")
+        line = line.rstrip('\r\n')
+    q.put(line)
+    _notify_ready(sandbox)
+
+def _monitor_file(fd, q, sandbox):
     while True:
         line = fd.readline()
         if not line:
-            q.put(None)
+            _queue_line(sandbox, q, None)
             break
-        line = unicode(line, errors="replace")
-        line = line.rstrip('\r\n')
-        q.put(line)
+        _queue_line(sandbox, q, line)
+
+def _start_child_io(sandbox):
+    """Start moving the lines of the sandbox's child process between its
+    pipes and the sandbox's queues
+
+    Uses the process' I/O loop if there is one, otherwise starts reader
+    threads for stdout and stderr and a writer thread for stdin.
+
+    """
+    process = sandbox.command_process
+    sandbox.io_loop = get_io_loop()
+    if sandbox.io_loop is not None:
+        sandbox.child_queue = None
+        sandbox.io_loop.add_writer(process.stdin.fileno(), lambda: _mark_child_io_failed(sandbox))
+        sandbox.io_loop.add_reader(process.stdout.fileno(),
+                                   lambda line: _queue_line(sandbox, sandbox.stdout_queue, line),
+                                   lambda: _queue_line(sandbox, sandbox.stdout_queue, None))
+        sandbox.io_loop.add_reader(process.stderr.fileno(),
+                                   lambda line: _queue_line(sandbox, sandbox.stderr_queue, line),
+                                   lambda: _queue_line(sandbox, sandbox.stderr_queue, None))
+        return
+    sandbox.child_queue = Queue()
+    stdout_monitor = Thread(target=_monitor_file,
+                            args=(process.stdout, sandbox.stdout_queue, sandbox))
+    stdout_monitor.daemon = True
+    stdout_monitor.start()
+    stderr_monitor = Thread(target=_monitor_file,
+                            args=(process.stderr, sandbox.stderr_queue, sandbox))
+    stderr_monitor.daemon = True
+    stderr_monitor.start()
+    Thread(target=sandbox._child_writer).start()
+
+def _mark_child_io_failed(sandbox):
+    """Mark that writing to the stdin of the sandbox's child process failed
+
+    Called on the I/O loop's thread, which serves all the sandboxes and must
+    not block on killing a child, so the child is killed by the engine's
+    thread the next time it checks whether the sandbox is alive.
+
+    """
+    sandbox.child_io_failed = True
+
+def _kill_failed_child(sandbox):
+    """Kill the sandbox's child process if writing to its stdin failed"""
+    if sandbox.child_io_failed:
+        sandbox.child_io_failed = False
+        sandbox.kill()
+
+def _write_child(sandbox, data):
+    """Write data to the stdin of the sandbox's child process without blocking"""
+    if sandbox.io_loop is not None:
+        sandbox.io_loop.write(sandbox.command_process.stdin.fileno(), data)
+    else:
+        sandbox.child_queue.put(data)
+
+def _stop_child_writer(sandbox):
+    """Stop writing to the stdin of the sandbox's child process"""
+    if sandbox.io_loop is not None:
+        sandbox.io_loop.remove(sandbox.command_process.stdin.fileno())
+    else:
+        sandbox.child_queue.put(None)
 
 class IsolatedHouse:
     """Provide an insecure sandbox to run arbitrary commands in.
@@ -353,23 +451,31 @@ class IsolatedHouse:
         working_directory: the directory in which the shell command should
                            be launched.
         """
-        random.seed()
         self._is_alive = False
         self.command_process = None
+        self.child_queue = None
+        self.io_loop = None
+        # set by the I/O loop when writing to the child failed, see _mark_child_io_failed
+        self.child_io_failed = False
         self.stdout_queue = Queue()
         self.stderr_queue = Queue()
         self.working_directory = working_directory
         self.protected_files = protected_files
-        self.username = ''.join(random.choice(string.ascii_uppercase) for i in range(12))
+        # set whenever the child's output becomes available, see set_ready_event
+        self.ready_event = None
+        # a generator of its own, seeding the random module would change the random streams of the games
+        username_random = random.Random()
+        self.username = ''.join(username_random.choice(string.ascii_uppercase) for i in range(12))
 
     @property
     def is_alive(self):
         """Indicates whether a command is currently running in the sandbox"""
         if self._is_alive:
+            _kill_failed_child(self)
             sub_result = self.command_process.poll()
             if sub_result is None:
                 return True
-            self.child_queue.put(None)
+            _stop_child_writer(self)
             self._is_alive = False
         return False
 
@@ -390,7 +496,6 @@ class IsolatedHouse:
             os.chmod(fname, stat.S_IRUSR | stat.S_IRWXU)
 
         working_directory = self.working_directory
-        self.child_queue = Queue()
         shell_command = "unshare -n -- su %s -c \"(umask 077 && %s)\"" % (self.username, shell_command)
         shell_command = shlex.split(shell_command.replace('\\','/'))
         print("Running shell command %s" % shell_command)
@@ -404,15 +509,7 @@ class IsolatedHouse:
         except OSError as e:
             raise SandboxError('Failed to start {0} due to {1}'.format(shell_command, str(e)))
         self._is_alive = True
-        stdout_monitor = Thread(target=_monitor_file,
-                                args=(self.command_process.stdout, self.stdout_queue))
-        stdout_monitor.daemon = True
-        stdout_monitor.start()
-        stderr_monitor = Thread(target=_monitor_file,
-                                args=(self.command_process.stderr, self.stderr_queue))
-        stderr_monitor.daemon = True
-        stderr_monitor.start()
-        Thread(target=self._child_writer).start()
+        _start_child_io(self)
 
     def kill(self):
         """Stops the sandbox.
@@ -428,7 +525,7 @@ class IsolatedHouse:
             except OSError:
                 pass
             self.command_process.wait()
-            self.child_queue.put(None)
+            _stop_child_writer(self)
             os.system("pkill -9 -u %s" % self.username)
             print("Removing user %s" % self.username)
             os.system("/usr/sbin/userdel %s" % self.username)
@@ -492,7 +589,7 @@ class IsolatedHouse:
         """Write str to stdin of the process being run"""
         if not self.is_alive:
             return False
-        self.child_queue.put(str)
+        _write_child(self, str)
 
     def write_line(self, line):
         """Write line to stdin of the process being run
@@ -502,7 +599,7 @@ class IsolatedHouse:
         """
         if not self.is_alive:
             return False
-        self.child_queue.put(line + "\n")
+        _write_child(self, line + "\n")
 
     def read_line(self, timeout=0):
         """Read line from child process
@@ -535,6 +632,13 @@ class IsolatedHouse:
         except Empty:
             return None
 
+    def set_ready_event(self, event):
+        """Set a threading.Event to be set whenever a line of the child's
+        stdout or stderr becomes available, or the child's output ends
+
+        """
+        self.ready_event = event
+
     def check_path(self, path, errors):
         resolved_path = os.path.join(self.working_directory, path)
         if not os.path.exists(resolved_path):
@@ -558,18 +662,25 @@ class House:
         """
         self._is_alive = False
         self.command_process = None
+        self.child_queue = None
+        self.io_loop = None
+        # set by the I/O loop when writing to the child failed, see _mark_child_io_failed
+        self.child_io_failed = False
         self.stdout_queue = Queue()
         self.stderr_queue = Queue()
         self.working_directory = working_directory
+        # set whenever the child's output becomes available, see set_ready_event
+        self.ready_event = None
 
     @property
     def is_alive(self):
         """Indicates whether a command is currently running in the sandbox"""
         if self._is_alive:
+            _kill_failed_child(self)
             sub_result = self.command_process.poll()
             if sub_result is None:
                 return True
-            self.child_queue.put(None)
+            _stop_child_writer(self)
             self._is_alive = False
         return False
 
@@ -578,7 +689,6 @@ class House:
         if self.is_alive:
             raise SandboxError("Tried to run command with one in progress.")
         working_directory = self.working_directory
-        self.child_queue = Queue()
         shell_command = shlex.split(shell_command.replace('\\','/'))
         try:
             self.command_process = subprocess.Popen(shell_command,
@@ -590,15 +700,7 @@ class House:
         except OSError as e:
             raise SandboxError('Failed to start {0} due to {1}'.format(shell_command, str(e)))
         self._is_alive = True
-        stdout_monitor = Thread(target=_monitor_file,
-                                args=(self.command_process.stdout, self.stdout_queue))
-        stdout_monitor.daemon = True
-        stdout_monitor.start()
-        stderr_monitor = Thread(target=_monitor_file,
-                                args=(self.command_process.stderr, self.stderr_queue))
-        stderr_monitor.daemon = True
-        stderr_monitor.start()
-        Thread(target=self._child_writer).start()
+        _start_child_io(self)
 
     def kill(self):
         """Stops the sandbox.
@@ -612,7 +714,7 @@ class House:
             except OSError:
                 pass
             self.command_process.wait()
-            self.child_queue.put(None)
+            _stop_child_writer(self)
 
     def retrieve(self):
         """Copy the working directory back out of the sandbox."""
@@ -668,7 +770,7 @@ class House:
         """Write str to stdin of the process being run"""
         if not self.is_alive:
             return False
-        self.child_queue.put(str)
+        _write_child(self, str)
 
     def write_line(self, line):
         """Write line to stdin of the process being run
@@ -676,7 +778,7 @@ class House:
         """
         if not self.is_alive:
             return False
-        self.child_queue.put(line + "\n")
+        _write_child(self, line + "\n")
 
     def read_line(self, timeout=0):
         """Read line from child process
@@ -706,6 +808,13 @@ class House:
         except Empty:
             return None
 
+    def set_ready_event(self, event):
+        """Set a threading.Event to be set whenever a line of the child's
+        stdout or stderr becomes available, or the child's output ends
+
+        """
+        self.ready_event = event
+
     def check_path(self, path, errors):
         resolved_path = os.path.join(self.working_directory, path)
         if not os.path.exists(resolved_path):
@@ -0,0 +1,1204 @@
+"""
+This is an optional NumPy backend for the game, selected with --engine-backend numpy, and the engine of batches of
+games. It keeps the pirates' state in parallel arrays (a struct of arrays) and plays the per pirate upkeep of the turn
+phases - countdowns, histories, bermuda kills, attack range tests and the search for the treasures, powerups and
+scripts the pirates stand on - as vectorized operations over the pirates of every game in a batch, instead of looping
+over the pirate objects. It gives the same results as the object backend. It pays off on large maps with many pirates,
+on small maps the arrays cost more than they save.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from collections import defaultdict, OrderedDict
+
+from pirates import PiratesGame, Pirate, TURN_PHASES, PIRATE_COUNTER_FIELDS, LAND, is_treasure_available
+
+# the pirate values that are kept in the arrays
+PIRATE_FIELDS = ('row', 'col', 'owner_id', 'game', 'sequence', 'is_alive', 'drunk_count', 'turns_to_sober',
+                 'reload_turns', 'defense_reload_turns', 'defense_expiration_turns', 'max_defense_turns',
+                 'cloak_turns', 'attack_radius', 'carry_treasure_speed', 'attack_powerup_active_turns',
+                 'rob_powerup_active_turns', 'speed_powerup_active_turns', 'last_defense_turn', 'last_attack_turn',
+                 'attack_target')
+
+# the values that ArrayPirate exposes as plain attributes
+PIRATE_ATTRIBUTES = ('turns_to_sober', 'reload_turns', 'defense_reload_turns', 'defense_expiration_turns',
+                     'max_defense_turns', 'cloak_turns', 'attack_radius', 'carry_treasure_speed',
+                     'attack_powerup_active_turns', 'rob_powerup_active_turns', 'speed_powerup_active_turns',
+                     'last_defense_turn', 'last_attack_turn', 'attack_target')
+
+# the rows of PIRATE_COUNTER_FIELDS in the attributes matrix
+COUNTER_ROWS = [PIRATE_ATTRIBUTES.index(field) for field in PIRATE_COUNTER_FIELDS]
+
+# the histories that are recorded by the vectorized phases, see PirateArrays.record_history
+RECORDED_HISTORIES = ('drink_history', 'attack_radius_history', 'treasure_history', 'rob_powerup_history',
+                      'speed_powerup_history')
+DRINK_HISTORY, ATTACK_RADIUS_HISTORY, TREASURE_HISTORY, ROB_POWERUP_HISTORY, SPEED_POWERUP_HISTORY = \
+    range(len(RECORDED_HISTORIES))
+# the last value of a history that has no values, no recorded value equals it
+NO_VALUE = -2 ** 63
+
+# the phases of TURN_PHASES that TurnPass plays as vectorized passes, the others are played by each game
+VECTORIZED_PHASES = ('do_orders', 'do_sober', 'do_attack', 'do_defense', 'do_cloak', 'do_bermuda_effect',
+                     'do_treasures', 'do_powerups', 'do_scripts')
+
+
+class PirateArrays(object):
+    """
+    Parallel arrays holding the state of pirates, one slot per pirate. A slot can hold pirates of several games, see
+    the game array. The kernels get a mask of the slots to work on and leave the rest of the slots untouched.
+    """
+    def __init__(self, capacity=64):
+        """
+        Creates empty arrays.
+
+        :param capacity: the initial amount of slots, the arrays grow when needed
+        :type capacity: int
+        """
+        if numpy is None:
+            raise ImportError('NumPy is required for the numpy engine backend')
+        self.capacity = capacity
+        """:type : int"""
+        self.size = 0
+        """:type : int"""
+        for field in PIRATE_FIELDS:
+            setattr(self, field, numpy.zeros(capacity, dtype=numpy.int64))
+        # the arrays of the pirate attributes are the rows of one matrix, so a slot's attributes are read at once
+        self.attributes = None
+        """:type : numpy.ndarray"""
+        self.bind_attributes(numpy.zeros((len(PIRATE_ATTRIBUTES), capacity), dtype=numpy.int64))
+        # the last value recorded into each of the RECORDED_HISTORIES of each slot, and the amount of times it was
+        # recorded and not yet written into the pirate's history
+        self.history_last = numpy.full((len(RECORDED_HISTORIES), capacity), NO_VALUE, dtype=numpy.int64)
+        """:type : numpy.ndarray"""
+        self.history_pending = numpy.zeros((len(RECORDED_HISTORIES), capacity), dtype=numpy.int64)
+        """:type : numpy.ndarray"""
+        # the pirate object of each slot
+        self.pirates = [None] * capacity
+        """:type : list[ArrayPirate]"""
+        # counts the pirates created, used to keep the creation order of the pirates
+        self.sequence_counter = 0
+        """:type : int"""
+
+    def allocate(self, game_index=0):
+        """
+        Allocates a new slot.
+
+        :param game_index: the index of the game the slot belongs to
+        :type game_index: int
+        :return: the new slot
+        :rtype: int
+        """
+        if self.size == self.capacity:
+            self.grow()
+        slot = self.size
+        self.size += 1
+        self.game[slot] = game_index
+        return slot
+
+    def grow(self):
+        """
+        Doubles the capacity of the arrays.
+
+        """
+        capacity = self.capacity * 2
+        for field in PIRATE_FIELDS:
+            if field not in PIRATE_ATTRIBUTES:
+                array = numpy.zeros(capacity, dtype=numpy.int64)
+                array[:self.capacity] = getattr(self, field)
+                setattr(self, field, array)
+        attributes = numpy.zeros((len(PIRATE_ATTRIBUTES), capacity), dtype=numpy.int64)
+        attributes[:, :self.capacity] = self.attributes
+        self.bind_attributes(attributes)
+        history_last = numpy.full((len(RECORDED_HISTORIES), capacity), NO_VALUE, dtype=numpy.int64)
+        history_last[:, :self.capacity] = self.history_last
+        self.history_last = history_last
+        history_pending = numpy.zeros((len(RECORDED_HISTORIES), capacity), dtype=numpy.int64)
+        history_pending[:, :self.capacity] = self.history_pending
+        self.history_pending = history_pending
+        self.pirates.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    def bind_attributes(self, attributes):
+        """
+        Makes the arrays of the pirate attributes views of the rows of attributes.
+
+        :param attributes: the matrix of the attributes, a row per attribute
+        :type attributes: numpy.ndarray
+        """
+        self.attributes = attributes
+        for field, row in zip(PIRATE_ATTRIBUTES, attributes):
+            setattr(self, field, row)
+
+    def __getstate__(self):
+        """
+        Returns the state without the views of the attributes, pickle would turn them into copies of the rows
+
+        :rtype: dict[str, any]
+        """
+        state = dict(self.__dict__)
+        for field in PIRATE_ATTRIBUTES:
+            del state[field]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Sets the state returned by __getstate__ and binds the views of the attributes again
+
+        :type state: dict[str, any]
+        """
+        self.__dict__.update(state)
+        self.bind_attributes(self.attributes)
+
+    def next_sequence(self):
+        """
+        Returns the next creation sequence number.
+
+        :rtype: int
+        """
+        self.sequence_counter += 1
+        return self.sequence_counter
+
+    def view(self, field):
+        """
+        Returns the used part of an array, changes to the view change the array.
+
+        :param field: the name of the array
+        :type field: str
+        :rtype: numpy.ndarray
+        """
+        return getattr(self, field)[:self.size]
+
+    def alive_mask(self, game_index=None):
+        """
+        Returns a mask of the living pirates.
+
+        :param game_index: only take the pirates of this game, or of all of the games if None
+        :type game_index: int
+        :rtype: numpy.ndarray
+        """
+        alive = self.view('is_alive') != 0
+        if game_index is not None:
+            alive &= self.view('game') == game_index
+        return alive
+
+    def ordered(self, mask):
+        """
+        Returns the slots in mask, ordered like the living pirates lists - by game, owner and creation order.
+
+        :param mask: the slots to order
+        :type mask: numpy.ndarray
+        :rtype: list[int]
+        """
+        slots = numpy.flatnonzero(mask)
+        order = numpy.lexsort((self.sequence[slots], self.owner_id[slots], self.game[slots]))
+        return slots[order].tolist()
+
+    def collisions(self, mask):
+        """
+        Returns a mask of the pirates in mask that share their square with another pirate in mask of their game.
+
+        :param mask: the pirates to test
+        :type mask: numpy.ndarray
+        :rtype: numpy.ndarray
+        """
+        slots = numpy.flatnonzero(mask)
+        slots = slots[numpy.lexsort((self.col[slots], self.row[slots], self.game[slots]))]
+        game, row, col = self.game[slots], self.row[slots], self.col[slots]
+        same_square = (game[1:] == game[:-1]) & (row[1:] == row[:-1]) & (col[1:] == col[:-1])
+        colliding = numpy.zeros_like(mask)
+        colliding[slots[1:][same_square]] = True
+        colliding[slots[:-1][same_square]] = True
+        return colliding
+
+    def on_squares(self, mask, squares):
+        """
+        Returns a mask of the pirates in mask that stand on a square that is set in squares.
+
+        :param mask: the pirates to test
+        :type mask: numpy.ndarray
+        :param squares: a mask of the squares of the map, by row and col
+        :type squares: numpy.ndarray
+        :rtype: numpy.ndarray
+        """
+        slots = numpy.flatnonzero(mask)
+        row, col = self.row[slots], self.col[slots]
+        # a pirate on a cyclic map may have moved to coordinates outside of the map
+        height, width = squares.shape
+        inside = (row >= 0) & (row < height) & (col >= 0) & (col < width)
+        on_squares = numpy.zeros_like(mask)
+        on_squares[slots[inside]] = squares[row[inside], col[inside]]
+        return on_squares
+
+    def record_history(self, history, mask, values):
+        """
+        Records this turn's value of one of the RECORDED_HISTORIES of the pirates in mask. A value that repeats the
+        last one is only counted, the pirate's history is written when the value changes or when it's flushed.
+
+        :param history: the index of the history in RECORDED_HISTORIES
+        :type history: int
+        :param mask: the pirates to record the value of
+        :type mask: numpy.ndarray
+        :param values: the value of each slot, bools are recorded as 1 and 0
+        :type values: numpy.ndarray
+        """
+        last = self.history_last[history, :self.size]
+        pending = self.history_pending[history, :self.size]
+        changed = mask & (values != last)
+        pending[mask & ~changed] += 1
+        changed_slots = numpy.flatnonzero(changed)
+        if not changed_slots.size:
+            return
+        field = RECORDED_HISTORIES[history]
+        pirates = self.pirates
+        for slot, last_value, count in zip(changed_slots.tolist(), last[changed_slots].tolist(),
+                                           pending[changed_slots].tolist()):
+            getattr(pirates[slot], field).append_many(last_value, count)
+        last[changed_slots] = values[changed_slots]
+        pending[changed_slots] = 1
+
+    def flush_histories(self, slots):
+        """
+        Writes the recorded values that wait in the arrays into the histories of pirates.
+
+        :param slots: the slots of the pirates
+        :type slots: list[int]
+        """
+        pending = self.history_pending[:, slots]
+        histories, indexes = numpy.nonzero(pending)
+        if not histories.size:
+            return
+        pirates = self.pirates
+        for history, index, value, count in zip(histories.tolist(), indexes.tolist(),
+                                                self.history_last[:, slots][histories, indexes].tolist(),
+                                                pending[histories, indexes].tolist()):
+            getattr(pirates[slots[index]], RECORDED_HISTORIES[history]).append_many(value, count)
+        self.history_pending[:, slots] = 0
+
+    def reset_histories(self, slots):
+        """
+        Takes the last values of the recorded histories of pirates from their histories, after the histories were
+        replaced or truncated. The histories must not have values that wait in the arrays.
+
+        :param slots: the slots of the pirates
+        :type slots: list[int]
+        """
+        pirates = self.pirates
+        for slot in slots:
+            pirate = pirates[slot]
+            for history, field in enumerate(RECORDED_HISTORIES):
+                values = getattr(pirate, field).values
+                self.history_last[history, slot] = values[-1] if values else NO_VALUE
+        self.history_pending[:, slots] = 0
+
+    def tick_defense(self, mask, turn, defense_reload_turns):
+        """
+        Ticks down the defense durations and reload times.
+
+        :param mask: the pirates to update
+        :type mask: numpy.ndarray
+        :param turn: the current turn, a scalar or an array with a turn per slot
+        :type turn: int | numpy.ndarray
+        :param defense_reload_turns: the reload time of a defense that started this turn
+        :type defense_reload_turns: int
+        """
+        expiration = self.view('defense_expiration_turns')
+        reload_turns = self.view('defense_reload_turns')
+        started = mask & (expiration == self.view('max_defense_turns')) & (self.view('last_defense_turn') == turn)
+        reload_turns[started] = defense_reload_turns
+        reload_turns[mask & ~started & (reload_turns > 0)] -= 1
+        expiration[mask & (expiration > 0)] -= 1
+
+    def tick_cloak(self, mask):
+        """
+        Ticks down the cloak durations.
+
+        :param mask: the pirates to update
+        :type mask: numpy.ndarray
+        """
+        cloak_turns = self.view('cloak_turns')
+        cloak_turns[mask & (cloak_turns > 0)] -= 1
+
+    def tick_sober(self, mask):
+        """
+        Ticks down the turns to sober of the drunk pirates.
+
+        :param mask: the pirates to update
+        :type mask: numpy.ndarray
+        :return: a mask of the drunk pirates and a mask of the pirates that should sober up
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        turns_to_sober = self.view('turns_to_sober')
+        drunk = mask & (self.view('drunk_count') > 0)
+        turns_to_sober[drunk & (turns_to_sober > 0)] -= 1
+        return drunk, drunk & (turns_to_sober == 0)
+
+    def tick_attack_reload(self, mask, turn, reload_turns):
+        """
+        Ticks down the attack reload times, and starts the reload of the pirates that attacked this turn.
+
+        :param mask: the pirates to update
+        :type mask: numpy.ndarray
+        :param turn: the current turn, a scalar or an array with a turn per slot
+        :type turn: int | numpy.ndarray
+        :param reload_turns: the reload time of an attack
+        :type reload_turns: int
+        :return: a mask of the pirates that attacked this turn
+        :rtype: numpy.ndarray
+        """
+        current_reload = self.view('reload_turns')
+        attackers = mask & (self.view('last_attack_turn') == turn)
+        current_reload[mask & ~attackers & (current_reload > 0)] -= 1
+        current_reload[attackers & (self.view('attack_powerup_active_turns') == 0)] = reload_turns
+        return attackers
+
+    def attack_hits(self, attackers, targets, turn):
+        """
+        Tests which attacks hit - the target is in the attack range, sober and did not defend this turn.
+
+        :param attackers: the slots of the attacking pirates
+        :type attackers: numpy.ndarray
+        :param targets: the slots of the targets, one for each attacker
+        :type targets: numpy.ndarray
+        :param turn: the current turn, a scalar or an array with a turn per attacker
+        :type turn: int | numpy.ndarray
+        :return: a mask of the attacks that hit
+        :rtype: numpy.ndarray
+        """
+        d_row = self.row[attackers] - self.row[targets]
+        d_col = self.col[attackers] - self.col[targets]
+        return ((d_row * d_row + d_col * d_col <= self.attack_radius[attackers]) &
+                (self.turns_to_sober[targets] == 0) & (self.last_defense_turn[targets] != turn))
+
+    def tick_powerups(self, mask, attack_radius):
+        """
+        Ticks down the powerup durations, and resets the values of the pirates whose powerups ran out.
+
+        :param mask: the pirates to update
+        :type mask: numpy.ndarray
+        :param attack_radius: the attack radius of a pirate without an attack powerup
+        :type attack_radius: int
+        :return: a mask of the pirates with a rob powerup and a mask of the pirates with a speed powerup
+        :rtype: (numpy.ndarray, numpy.ndarray)
+        """
+        attack_turns = self.view('attack_powerup_active_turns')
+        has_attack = mask & (attack_turns > 0)
+        attack_turns[has_attack] -= 1
+        self.view('attack_radius')[mask & ~has_attack] = attack_radius
+
+        rob_turns = self.view('rob_powerup_active_turns')
+        has_rob = mask & (rob_turns > 0)
+        rob_turns[has_rob] -= 1
+
+        speed_turns = self.view('speed_powerup_active_turns')
+        has_speed = mask & (speed_turns > 0)
+        speed_turns[has_speed] -= 1
+        self.view('carry_treasure_speed')[mask & ~has_speed] = 1
+        return has_rob, has_speed
+
+    def in_zones(self, mask, zones):
+        """
+        Returns a mask of the pirates in mask that are inside a bermuda zone of another player of their game.
+
+        :param mask: the pirates to test
+        :type mask: numpy.ndarray
+        :param zones: the game index, owner, center row, center col and squared radius of each zone
+        :type zones: list[(int, int, int, int, int)]
+        :rtype: numpy.ndarray
+        """
+        if not zones:
+            return numpy.zeros_like(mask)
+        zone_game, zone_owner, zone_row, zone_col, zone_radius = (numpy.array(values, dtype=numpy.int64)[:, None]
+                                                                  for values in zip(*zones))
+        d_row = self.view('row') - zone_row
+        d_col = self.view('col') - zone_col
+        inside = ((d_row * d_row + d_col * d_col <= zone_radius) & (self.view('game') == zone_game) &
+                  (self.view('owner_id') != zone_owner))
+        return mask & inside.any(axis=0)
+
+    def group_by_game(self, slots):
+        """
+        Splits slots into the slots of each game, keeping their order.
+
+        :param slots: the slots to split
+        :type slots: list[int]
+        :return: the slots of each game that has any
+        :rtype: dict[int, list[int]]
+        """
+        groups = defaultdict(list)
+        game = self.game
+        for slot in slots:
+            groups[int(game[slot])].append(slot)
+        return groups
+
+
+def array_attribute(row):
+    """
+    Creates a property that keeps a pirate attribute in the pirate's slot in the arrays.
+
+    :param row: the row of the attribute in the attributes matrix
+    :type row: int
+    :rtype: property
+    """
+    def get_value(self):
+        return self.arrays.attributes.item(row, self.slot)
+
+    def set_value(self, value):
+        self.arrays.attributes[row, self.slot] = value
+
+    return property(get_value, set_value)
+
+
+class MirroredTurns(list):
+    """
+    A list of turns that mirrors its last entries into array attributes of a pirate, so the arrays know the last
+    attack and defense of each pirate.
+    """
+    def __init__(self, pirate, fields, turns):
+        """
+        :param pirate: the pirate the list belongs to
+        :type pirate: ArrayPirate
+        :param fields: the attributes to mirror the last entries into, in the order of the entries
+        :type fields: tuple[str]
+        :param turns: the initial entries
+        :type turns: list[int]
+        """
+        super(MirroredTurns, self).__init__(turns)
+        self.pirate = pirate
+        """:type : ArrayPirate"""
+        self.fields = fields
+        """:type : tuple[str]"""
+        self.mirror()
+
+    def append(self, value):
+        list.append(self, value)
+        self.mirror()
+
+    def extend(self, values):
+        list.extend(self, values)
+        self.mirror()
+
+    def mirror(self):
+        """
+        Copies the last entries into the pirate's attributes.
+
+        """
+        for field, value in zip(self.fields, self[-len(self.fields):]):
+            setattr(self.pirate, field, value)
+
+
+class ArrayPirate(Pirate):
+    """
+    A pirate whose countdowns are kept in a slot of PirateArrays. The arrays also hold the row and col of the pirate,
+    which the game updates when the pirate moves or respawns. The latest values of its recorded histories may wait in
+    the arrays as well, see PirateArrays.record_history, they are written into the histories before the histories are
+    read.
+    """
+    __slots__ = ('arrays', 'slot')
+
+    for _row, _field in enumerate(PIRATE_ATTRIBUTES):
+        locals()[_field] = array_attribute(_row)
+    del _row, _field
+
+    def __init__(self, arrays, slot, location, owner, pirate_id, attack_radius, max_defense_turns, spawn_turn=None):
+        """
+        :param arrays: the arrays holding the pirate's state
+        :type arrays: PirateArrays
+        :param slot: the pirate's slot in the arrays
+        :type slot: int
+        :param location: the initial location of the pirate
+        :type location: Location
+        :param owner: the owner of the pirate
+        :type owner: Player
+        :param pirate_id: the id of the pirate
+        :type pirate_id: int
+        :param attack_radius: the pirate's squared attack radius
+        :type attack_radius: int
+        :param max_defense_turns: the amount of turns this pirate's defense lasts
+        :type max_defense_turns: int
+        :param spawn_turn: the turn the pirate spawned on
+        :type spawn_turn: int
+        """
+        self.arrays = arrays
+        """:type : PirateArrays"""
+        self.slot = slot
+        """:type : int"""
+        super(ArrayPirate, self).__init__(location, owner, pirate_id, attack_radius, max_defense_turns, spawn_turn)
+        arrays.owner_id[slot] = owner.id
+        arrays.row[slot] = location.row
+        arrays.col[slot] = location.col
+
+    def start_life(self, spawn_turn):
+        super(ArrayPirate, self).start_life(spawn_turn)
+        self.attack_turns = MirroredTurns(self, ('last_attack_turn', 'attack_target'), self.attack_turns)
+        self.defense_turns = MirroredTurns(self, ('last_defense_turn',), self.defense_turns)
+
+    def reincarnate(self, attack_radius, spawn_turn):
+        arrays = self.arrays
+        arrays.flush_histories([self.slot])
+        super(ArrayPirate, self).reincarnate(attack_radius, spawn_turn)
+        arrays.history_last[:, self.slot] = NO_VALUE
+        arrays.row[self.slot] = self.location.row
+        arrays.col[self.slot] = self.location.col
+
+    def get_lives(self):
+        self.arrays.flush_histories([self.slot])
+        return super(ArrayPirate, self).get_lives()
+
+
+class VectorizedPiratesGame(PiratesGame):
+    """
+    The game, with the pirates kept in PirateArrays. A pirate keeps its slot when it respawns, so the arrays don't
+    grow during the game.
+    """
+    def __init__(self, options=None, arrays=None, game_index=0):
+        """
+        :param options: the game options
+        :type options: dict
+        :param arrays: the arrays to keep the pirates in, new arrays are created if None
+        :type arrays: PirateArrays
+        :param game_index: the index of the game in the arrays
+        :type game_index: int
+        """
+        self.arrays = arrays if arrays is not None else PirateArrays()
+        """:type : PirateArrays"""
+        self.game_index = game_index
+        """:type : int"""
+        # the slot of each (owner id, pirate id)
+        self.pirate_slots = {}
+        """:type : dict[(int, int), int]"""
+        super(VectorizedPiratesGame, self).__init__(options)
+        # masks of the squares that have a treasure, a powerup, and a script or an anti script on some turn
+        self.treasure_squares = self.get_squares(self.treasure_index)
+        """:type : numpy.ndarray"""
+        self.powerup_squares = self.get_squares(self.powerup_index)
+        """:type : numpy.ndarray"""
+        self.script_squares = self.get_squares(self.script_index) | self.get_squares(self.anti_script_index)
+        """:type : numpy.ndarray"""
+
+    def get_squares(self, index):
+        """
+        Returns a mask of the squares that hold objects in a spatial index.
+
+        :param index: the spatial index
+        :type index: SpatialIndex
+        :rtype: numpy.ndarray
+        """
+        squares = numpy.zeros((self.height, self.width), dtype=bool)
+        for (row, col), objects in index.cells.iteritems():
+            if objects:
+                squares[row, col] = True
+        return squares
+
+    def get_slots(self):
+        """
+        Returns the slots of the pirates of this game.
+
+        :rtype: list[int]
+        """
+        return sorted(self.pirate_slots.itervalues())
+
+    def alive_mask(self):
+        """
+        Returns a mask of the living pirates of this game.
+
+        :rtype: numpy.ndarray
+        """
+        return self.arrays.alive_mask(self.game_index)
+
+    def create_pirate(self, location, owner, pirate_id):
+        arrays = self.arrays
+        slot = self.pirate_slots[(owner.id, pirate_id)] = arrays.allocate(self.game_index)
+        pirate = ArrayPirate(arrays, slot, location, owner, pirate_id, self.attack_radius, self.max_defense_turns,
+                             self.turn)
+        arrays.pirates[slot] = pirate
+        arrays.is_alive[slot] = 1
+        arrays.sequence[slot] = arrays.next_sequence()
+        return pirate
+
+    def revive_pirate(self, pirate):
+        super(VectorizedPiratesGame, self).revive_pirate(pirate)
+        arrays = self.arrays
+        arrays.is_alive[pirate.slot] = 1
+        arrays.sequence[pirate.slot] = arrays.next_sequence()
+
+    def snapshot(self):
+        slots = self.get_slots()
+        self.arrays.flush_histories(slots)
+        snapshot = super(VectorizedPiratesGame, self).snapshot()
+        # the arrays also hold values that the pirate objects don't, e.g. the drunk counts and creation order
+        snapshot.array_slots = slots
+        snapshot.array_values = [getattr(self.arrays, field)[slots] for field in PIRATE_FIELDS]
+        return snapshot
+
+    def restore(self, snapshot):
+        super(VectorizedPiratesGame, self).restore(snapshot)
+        for field, values in zip(PIRATE_FIELDS, snapshot.array_values):
+            getattr(self.arrays, field)[snapshot.array_slots] = values
+        # the values that waited in the arrays belong to turns after the snapshot, which are dropped
+        self.arrays.reset_histories(snapshot.array_slots)
+
+    def kill_pirate(self, pirate, ignore_error=False):
+        killed_pirate = super(VectorizedPiratesGame, self).kill_pirate(pirate, ignore_error)
+        self.arrays.is_alive[pirate.slot] = 0
+        return killed_pirate
+
+    def drunk_pirate(self, pirate):
+        super(VectorizedPiratesGame, self).drunk_pirate(pirate)
+        self.arrays.drunk_count[pirate.slot] += 1
+
+    def get_pirates_counters(self, pirates):
+        slots = [pirate.slot for pirate in pirates]
+        if not slots:
+            return []
+        return zip(*self.arrays.attributes[numpy.ix_(COUNTER_ROWS, slots)].tolist())
+
+    def finish_turn(self):
+        TurnPass([self]).play()
+
+    def do_orders(self):
+        TurnPass([self]).do_orders()
+
+    def do_sober(self):
+        TurnPass([self]).do_sober()
+
+    def do_attack(self):
+        TurnPass([self]).do_attack()
+
+    def do_defense(self):
+        TurnPass([self]).do_defense()
+
+    def do_cloak(self):
+        TurnPass([self]).do_cloak()
+
+    def do_bermuda_effect(self):
+        TurnPass([self]).do_bermuda_effect()
+
+    def do_treasures(self):
+        TurnPass([self]).do_treasures()
+
+    def do_powerups(self):
+        TurnPass([self]).do_powerups()
+
+    def do_scripts(self):
+        TurnPass([self]).do_scripts()
+
+    def apply_orders(self):
+        """
+        Carries out the orders of the turn, like PiratesGame.do_orders, up to the collisions - the pirates that move
+        leave the map until the collisions are resolved, see finish_orders. Only the pirates with orders are visited,
+        the rest stay in place.
+
+        :return: the pirates that changed their location
+        :rtype: list[ArrayPirate]
+        """
+        # the orders of each pirate, by player, a pirate with several orders does the last one
+        pirate_orders = OrderedDict()
+        for player_id in xrange(self.num_players):
+            for order in self.orders[player_id]:
+                pirate = self.get_living_pirate(player_id, order['acting_pirate'])
+                if pirate is None:  # Invalid pirate
+                    break
+
+                pirate_orders[pirate] = (order['order_type'], order['order_args'])
+
+        # pirates without orders stay in place, the direction of the pirates with orders is set below
+        for pirate in self.living_pirates:
+            pirate.orders.append('-')
+
+        arrays = self.arrays
+        moved_pirates = []
+        for pirate, (order_type, order_args) in pirate_orders.iteritems():
+            direction = '-'
+            if order_type == 'attack':
+                # pirate is attacking this turn
+                pirate.attack_turns.extend((self.turn, order_args['target']))
+                direction = 'a'
+            elif order_type == 'defense':
+                # pirate is defending this turn
+                pirate.defense_expiration_turns = pirate.max_defense_turns
+                direction = 'd'
+            elif order_type == 'cloak':
+                # pirate is going invisible this turn
+                pirate.cloak_turns = self.cloak_duration
+                direction = 'c'
+            elif order_type == 'bermuda':
+                self.summon_bermuda_zone(pirate)
+                direction = 'f'
+            elif order_type == 'move':
+                new_location = order_args['destination']
+                direction = self.get_direction_letters(pirate.location, new_location)
+                if new_location != pirate.location:
+                    # set old pirate location to land
+                    self.map[pirate.location] = LAND
+                    self.pirate_index.remove(pirate)
+                    moved_pirates.append(pirate)
+                    pirate.location = new_location
+                    arrays.row[pirate.slot] = new_location.row
+                    arrays.col[pirate.slot] = new_location.col
+            pirate.orders[-1] = direction
+        return moved_pirates
+
+    def finish_orders(self, defense_slots, colliding_slots, moved_pirates):
+        """
+        Records the defenses and resolves the collisions of the turn, the end of PiratesGame.do_orders.
+
+        :param defense_slots: the slots of the living pirates whose defense is on
+        :type defense_slots: list[int]
+        :param colliding_slots: the slots of the pirates that share their square with another pirate, in order
+        :type colliding_slots: list[int]
+        :param moved_pirates: the pirates that changed their location, as returned by apply_orders
+        :type moved_pirates: list[ArrayPirate]
+        """
+        pirates = self.arrays.pirates
+        for slot in defense_slots:
+            pirates[slot].defense_turns.append(self.turn)
+
+        # the pirates that share a square are killed, the others keep their order in the living pirates
+        for slot in colliding_slots:
+            self.kill_pirate(pirates[slot], True)
+
+        # set new locations of the pirates that moved and survived
+        for pirate in moved_pirates:
+            if not pirate.is_lost:
+                self.map[pirate.location] = pirate.owner.id
+                self.pirate_index.add(pirate)
+
+    def finish_sober(self, sober_slots):
+        """
+        Sobers up the pirates whose turns to sober ran out.
+
+        :param sober_slots: the slots of the pirates to sober up, in order
+        :type sober_slots: list[int]
+        """
+        arrays = self.arrays
+        for slot in sober_slots:
+            pirate = arrays.pirates[slot]
+            pirate.owner.remove_drunk_pirate(pirate)
+            arrays.drunk_count[slot] -= 1
+
+    def get_attacks(self, attacker_slots):
+        """
+        Returns the attacks of the turn whose targets are alive.
+
+        :param attacker_slots: the slots of the pirates that attacked this turn, in order
+        :type attacker_slots: list[int]
+        :return: the attacking pirate and the target of each attack
+        :rtype: list[(ArrayPirate, ArrayPirate)]
+        """
+        if self.num_players != 2:
+            # TODO: Attack currently doesn't have enemy owner id and will not work with more then 2 players!
+            raise Exception('Attack is not supported for more then one player!')
+
+        attacks = []
+        for slot in attacker_slots:
+            pirate = self.arrays.pirates[slot]
+            target_pirate = self.get_living_pirate((pirate.owner.id + 1) % 2, pirate.attack_turns[-1])
+            if target_pirate:
+                attacks.append((pirate, target_pirate))
+        return attacks
+
+    def finish_attack(self, attacks, hits):
+        """
+        Makes the targets of the attacks that hit drunk, and takes their treasures.
+
+        :param attacks: the attacking pirate and the target of each attack
+        :type attacks: list[(ArrayPirate, ArrayPirate)]
+        :param hits: whether each attack hit
+        :type hits: list[bool]
+        """
+        pirates_to_drunk = set()
+        for (pirate, target_pirate), hit in zip(attacks, hits):
+            if not hit:
+                continue
+            pirates_to_drunk.add(target_pirate)
+            if target_pirate.treasure:
+                if pirate.rob_powerup_active_turns > 0:
+                    pirate.treasure = target_pirate.treasure
+                else:
+                    target_pirate.treasure.is_available = True
+                target_pirate.treasure = None
+
+        for pirate in pirates_to_drunk:
+            self.drunk_pirate(pirate)
+
+    def get_bermuda_zones(self):
+        """
+        Returns the active bermuda zones, in the format PirateArrays.in_zones takes them.
+
+        :rtype: list[(int, int, int, int, int)]
+        """
+        return [(self.game_index, bermuda_zone.owner, bermuda_zone.center.row, bermuda_zone.center.col,
+                 bermuda_zone.radius) for bermuda_zone in self.bermuda_zones if bermuda_zone.active_turns > 0]
+
+    def finish_bermuda_effect(self, slots):
+        """
+        Kills the pirates inside the enemy bermuda zones, and ticks down the zones.
+
+        :param slots: the slots of the pirates inside the enemy bermuda zones, in order
+        :type slots: list[int]
+        """
+        for slot in slots:
+            pirate = self.arrays.pirates[slot]
+            self.kill_pirate(pirate)
+            pirate.reason_of_death = 'b'
+
+        for bermuda_zone in self.bermuda_zones:
+            if bermuda_zone.active_turns > 0:
+                bermuda_zone.active_turns -= 1
+
+    def finish_treasures(self, pickup_slots, treasure_values):
+        """
+        Unloads the treasures of the pirates that reached their initial location, and loads the treasures the pirates
+        stand on. A pirate unloads and another pirate picks up independently of each other, so the pickups are done
+        first, and the unloading in the order of the living pirates.
+
+        :param pickup_slots: the slots of the sober pirates that stand on a treasure square, in order
+        :type pickup_slots: list[int]
+        :param treasure_values: the value of the treasure the pirate in each slot carries after this turn, by slot,
+        filled in for this game's pirates
+        :type treasure_values: numpy.ndarray
+        """
+        carriers = [pirate for pirate in self.living_pirates if pirate.treasure]
+        pirates = self.arrays.pirates
+        for slot in pickup_slots:
+            pirate = pirates[slot]
+            if pirate.treasure:
+                continue
+            treasure = self.treasure_index.get_first(pirate.location, is_treasure_available)
+            if treasure is not None:
+                pirate.treasure = treasure
+                treasure_values[slot] = treasure.value
+                treasure.is_available = False
+
+        for pirate in carriers:
+            if pirate.location != pirate.initial_location:
+                treasure_values[pirate.slot] = pirate.treasure.value
+            else:
+                # when ship unloads treasure, schedule the treasure's respawn, see PiratesGame.do_treasures
+                if self.treasure_spawn_turns >= 0:
+                    pirate.treasure.respawn_turn = self.turn + max(self.treasure_spawn_turns, 1) - 1
+                    self.schedule.add_respawn(pirate.treasure.respawn_turn, pirate.treasure)
+                pirate.owner.score += pirate.treasure.value
+                pirate.treasure = None
+
+        for treasure in self.treasures:
+            treasure.is_available_history.append(treasure.is_available)
+        for treasure in self.schedule.pop_respawns(self.turn):
+            treasure.is_available = True
+            treasure.respawn_turn = -1
+
+    def finish_powerups(self, has_rob, has_speed, powerup_slots):
+        """
+        Removes the powerups that ran out, and activates the powerups the pirates stand on.
+
+        :param has_rob: whether the pirate in each slot has a rob powerup
+        :type has_rob: list[bool]
+        :param has_speed: whether the pirate in each slot has a speed powerup
+        :type has_speed: list[bool]
+        :param powerup_slots: the slots of the pirates that stand on a powerup square, in order
+        :type powerup_slots: list[int]
+        """
+        for pirate in self.living_pirates:
+            if pirate.powerups:
+                if not has_rob[pirate.slot] and "rob" in pirate.powerups:
+                    pirate.powerups.remove("rob")
+                if not has_speed[pirate.slot] and "speed" in pirate.powerups:
+                    pirate.powerups.remove("speed")
+
+        is_on_map = self.is_on_map
+        pirates = self.arrays.pirates
+        for slot in powerup_slots:
+            pirate = pirates[slot]
+            powerup = self.powerup_index.get_first(pirate.location, is_on_map)
+            if powerup:
+                powerup.end_turn = self.turn
+                powerup.activate(pirate, self)
+
+    def finish_scripts(self, script_slots):
+        """
+        Collects the scripts and anti scripts the pirates stand on.
+
+        :param script_slots: the slots of the pirates that stand on a script or an anti script square, in order
+        :type script_slots: list[int]
+        """
+        is_on_map = self.is_on_map
+        pirates = self.arrays.pirates
+        for slot in script_slots:
+            pirate = pirates[slot]
+            script = self.script_index.get_first(pirate.location, is_on_map)
+            if script:
+                script.end_turn = self.turn
+                pirate.owner.num_scripts += 1
+
+            anti_script = self.anti_script_index.get_first(pirate.location, is_on_map)
+            if anti_script:
+                anti_script.end_turn = self.turn
+                if pirate.owner.num_scripts > 0:
+                    pirate.owner.num_scripts -= 1
+
+
+class TurnPass(object):
+    """
+    Plays the end of a turn of games that share their PirateArrays, their map and their options. The phases of
+    TURN_PHASES that are in VECTORIZED_PHASES run as one pass over the pirates of all of the games, the other phases
+    are played by each game.
+    """
+    def __init__(self, games):
+        """
+        :param games: the games to play, they all started the same turn
+        :type games: list[VectorizedPiratesGame]
+        """
+        self.games = games
+        """:type : list[VectorizedPiratesGame]"""
+        self.arrays = games[0].arrays
+        """:type : PirateArrays"""
+        # the games share their options and their map
+        self.rules = games[0]
+        """:type : VectorizedPiratesGame"""
+        slot_games = self.arrays.view('game')
+        game_count = max(max(game.game_index for game in games), slot_games.max() if slot_games.size else 0) + 1
+        is_playing = numpy.zeros(game_count, dtype=bool)
+        turns = numpy.zeros(game_count, dtype=numpy.int64)
+        for game in games:
+            is_playing[game.game_index] = True
+            turns[game.game_index] = game.turn
+        # whether the game of each slot is played, and its turn
+        self.is_playing = is_playing[slot_games]
+        """:type : numpy.ndarray"""
+        self.slot_turns = turns[slot_games]
+        """:type : numpy.ndarray"""
+
+    def play(self):
+        """
+        Plays the phases of the turn, like PiratesGame.finish_turn.
+
+        """
+        for phase in TURN_PHASES:
+            if phase in VECTORIZED_PHASES:
+                getattr(self, phase)()
+            else:
+                for game in self.games:
+                    getattr(game, phase)()
+
+    def alive_mask(self):
+        """
+        Returns a mask of the living pirates of the games.
+
+        :rtype: numpy.ndarray
+        """
+        return self.arrays.alive_mask() & self.is_playing
+
+    def split(self, mask):
+        """
+        Splits the slots in mask into the slots of each game.
+
+        :param mask: the slots to split
+        :type mask: numpy.ndarray
+        :return: each game and its slots in mask, ordered like its living pirates
+        :rtype: list[(VectorizedPiratesGame, list[int])]
+        """
+        arrays = self.arrays
+        groups = arrays.group_by_game(arrays.ordered(mask))
+        return [(game, groups.get(game.game_index, [])) for game in self.games]
+
+    def do_orders(self):
+        """
+        Carries out the orders of the games and resolves the collisions, like PiratesGame.do_orders.
+
+        """
+        arrays = self.arrays
+        moved_pirates = [game.apply_orders() for game in self.games]
+        alive = self.alive_mask()
+        defense_slots = arrays.group_by_game(
+            numpy.flatnonzero(alive & (arrays.view('defense_expiration_turns') > 0)).tolist())
+        colliding_slots = self.split(arrays.collisions(alive))
+        for (game, slots), moved in zip(colliding_slots, moved_pirates):
+            game.finish_orders(defense_slots.get(game.game_index, []), slots, moved)
+
+    def do_sober(self):
+        """
+        Handles the drunk pirates of the games, like PiratesGame.do_sober.
+
+        """
+        arrays = self.arrays
+        alive = self.alive_mask()
+        drunk, sober = arrays.tick_sober(alive)
+        arrays.record_history(DRINK_HISTORY, alive, drunk)
+        if sober.any():
+            for game, slots in self.split(sober):
+                game.finish_sober(slots)
+
+    def do_attack(self):
+        """
+        Handles the attacks of the games, like PiratesGame.do_attack.
+
+        """
+        arrays = self.arrays
+        alive = self.alive_mask()
+        arrays.record_history(ATTACK_RADIUS_HISTORY, alive, arrays.view('attack_radius'))
+        attackers = arrays.tick_attack_reload(alive, self.slot_turns, self.rules.reload_turns)
+        if not attackers.any():
+            return
+
+        game_attacks = [(game, game.get_attacks(slots)) for game, slots in self.split(attackers) if slots]
+        attacks = [attack for _, attacks in game_attacks for attack in attacks]
+        if not attacks:
+            return
+        attacker_slots = [pirate.slot for pirate, _ in attacks]
+        hits = arrays.attack_hits(numpy.array(attacker_slots),
+                                  numpy.array([target_pirate.slot for _, target_pirate in attacks]),
+                                  self.slot_turns[attacker_slots]).tolist()
+        start = 0
+        for game, attacks in game_attacks:
+            game.finish_attack(attacks, hits[start:start + len(attacks)])
+            start += len(attacks)
+
+    def do_defense(self):
+        """
+        Ticks down the defenses of the games, like PiratesGame.do_defense.
+
+        """
+        self.arrays.tick_defense(self.alive_mask(), self.slot_turns, self.rules.defense_reload_turns)
+
+    def do_cloak(self):
+        """
+        Ticks down the cloaks of the games, like PiratesGame.do_cloak.
+
+        """
+        self.arrays.tick_cloak(self.alive_mask())
+
+    def do_bermuda_effect(self):
+        """
+        Kills the pirates inside enemy bermuda zones, like PiratesGame.do_bermuda_effect.
+
+        """
+        bermuda_zones = [bermuda_zone for game in self.games for bermuda_zone in game.get_bermuda_zones()]
+        if bermuda_zones:
+            game_slots = self.split(self.arrays.in_zones(self.alive_mask(), bermuda_zones))
+        else:
+            game_slots = [(game, []) for game in self.games]
+        for game, slots in game_slots:
+            game.finish_bermuda_effect(slots)
+
+    def do_treasures(self):
+        """
+        Unloads and loads the treasures of the games, like PiratesGame.do_treasures.
+
+        """
+        arrays = self.arrays
+        alive = self.alive_mask()
+        treasure_values = numpy.zeros(arrays.size, dtype=numpy.int64)
+        # drunk pirates can't pick up treasures
+        pickups = arrays.on_squares(alive & (arrays.view('drunk_count') == 0), self.rules.treasure_squares)
+        for game, slots in self.split(pickups):
+            game.finish_treasures(slots, treasure_values)
+        arrays.record_history(TREASURE_HISTORY, alive, treasure_values)
+
+    def do_powerups(self):
+        """
+        Handles the powerups of the games, like PiratesGame.do_powerups.
+
+        """
+        arrays = self.arrays
+        alive = self.alive_mask()
+        has_rob, has_speed = arrays.tick_powerups(alive, self.rules.attack_radius)
+        arrays.record_history(ROB_POWERUP_HISTORY, alive, has_rob)
+        arrays.record_history(SPEED_POWERUP_HISTORY, alive, has_speed)
+        has_rob = has_rob.tolist()
+        has_speed = has_speed.tolist()
+        for game, slots in self.split(arrays.on_squares(alive, self.rules.powerup_squares)):
+            game.finish_powerups(has_rob, has_speed, slots)
+
+    def do_scripts(self):
+        """
+        Collects the scripts and anti scripts of the games, like PiratesGame.do_scripts.
+
+        """
+        on_scripts = self.arrays.on_squares(self.alive_mask(), self.rules.script_squares)
+        if on_scripts.any():
+            for game, slots in self.split(on_scripts):
+                if slots:
+                    game.finish_scripts(slots)
+
+
+class BatchPiratesGame(object):
+    """
+    Plays a batch of games with the same map and options in lockstep. The pirates of all of the games are kept in one
+    PirateArrays, so the phases of the turn run as vectorized passes over the pirates of every game, see TurnPass.
+    Games are restarted by restoring a snapshot of their first turn.
+    """
+    def __init__(self, options, batch_size, auto_reset=True):
+        """
+        :param options: the game options, shared by all of the games
+        :type options: dict
+        :param batch_size: the amount of games
+        :type batch_size: int
+        :param auto_reset: whether games are restarted as soon as they end, otherwise they wait for reset
+        :type auto_reset: bool
+        """
+        self.arrays = PirateArrays()
+        """:type : PirateArrays"""
+        self.games = [VectorizedPiratesGame(dict(options), self.arrays, game_index)
+                      for game_index in xrange(batch_size)]
+        """:type : list[VectorizedPiratesGame]"""
+        for game in self.games:
+            game.start_game()
+        self.initial_snapshots = [game.snapshot() for game in self.games]
+        """:type : list[GameSnapshot]"""
+        self.auto_reset = auto_reset
+        """:type : bool"""
+        # whether each game ended and waits for reset, games are never done with auto reset
+        self.done = numpy.zeros(batch_size, dtype=bool)
+        """:type : numpy.ndarray"""
+        # the result of the last game that ended in each place of the batch, None until a game ends
+        self.results = [None] * batch_size
+        """:type : list[dict[str, any]]"""
+
+    def reset(self, game_indexes=None):
+        """
+        Restarts games.
+
+        :param game_indexes: the games to restart, all of the games if None
+        :type game_indexes: list[int]
+        """
+        if game_indexes is None:
+            game_indexes = xrange(len(self.games))
+        for game_index in game_indexes:
+            self.games[game_index].restore(self.initial_snapshots[game_index])
+            self.done[game_index] = False
+
+    def step(self, orders):
+        """
+        Plays a turn of every game that isn't done. A game ends once it's over or played its last turn, its result is
+        kept in results and it's restarted or marked as done.
+
+        :param orders: the orders of each game, a list holding the orders of each player as PiratesGame.do_moves takes
+        them. The orders of games that are done are ignored
+        :type orders: list[list[list[dict[str, any]]]]
+        :return: whether each game ended on this turn
+        :rtype: numpy.ndarray
+        """
+        games = [game for game in self.games if not self.done[game.game_index]]
+        for game in games:
+            game.start_turn()
+            for player_id, player_orders in enumerate(orders[game.game_index]):
+                game.do_moves(player_id, player_orders)
+        if games:
+            TurnPass(games).play()
+
+        ended = numpy.zeros(len(self.games), dtype=bool)
+        for game in games:
+            if game.game_over() or game.turn >= game.max_turns:
+                game.finish_game()
+                self.results[game.game_index] = {'score': game.score,
+                                                 'winner': game.get_winner(),
+                                                 'turn': game.turn,
+                                                 'end_of_game_reason': game.end_of_game_reason}
+                ended[game.game_index] = True
+        if self.auto_reset:
+            self.reset(numpy.flatnonzero(ended).tolist())
+        else:
+            self.done |= ended
+        return ended
@@ -120,6 +120,12 @@ def parse_args(args, **defaults):
     parser.add_argument('-r', '--rounds',
                         default=1, type=int,
                         help='Number of rounds to play')
+    parser.add_argument('--concurrent-games',
+                        default=1, type=int,
+                        help='Number of rounds to play at the same time in this process')
+    parser.add_argument('--headless',
+                        action='store_true', default=False,
+                        help='Run trusted Python bots inside the engine process, without sandboxes, logs or replays')
     parser.add_argument('--player-seed',
                         default=None, type=int,
                         help='Player seed for the random number generator')
@@ -127,6 +133,12 @@ def parse_args(args, **defaults):
                         default=None, type=int,
                         help='Engine seed for the random number generator')
 
+    parser.add_argument('--delta-state',
+                        action='store_true', default=False,
+                        help='Offer the bots the delta state protocol, sending only the changes of each turn')
+    parser.add_argument('--compact-protocol',
+                        action='store_true', default=False,
+                        help='Offer the bots the compact wire protocol instead of JSON')
     parser.add_argument('--strict',
                         action='store_true', default=False,
                         help='Strict mode enforces valid moves for bots')
@@ -207,6 +219,9 @@ def parse_args(args, **defaults):
     game_group.add_argument('--cloak-reload-turns',
                             type=int,default=15,
                             help='How many turns till player can cloak again')
+    game_group.add_argument('--engine-backend', choices=['objects', 'numpy'], default='objects',
+                            help='How the engine keeps the pirates, numpy keeps them in arrays (requires NumPy). '
+                                 'numpy is faster on large maps with many pirates, but slower on small maps')
     # the log directory must be specified for any logging to occur, except:
     #    bot errors to stderr
     #    verbose levels 1 & 2 to stdout and stderr